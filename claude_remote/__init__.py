@@ -9,6 +9,12 @@ __version__ = "1.0.0"
 __author__ = "Your Name"
 __email__ = "your.email@example.com"
 
-from .main import main
+__all__ = ["main"]
 
-__all__ = ["main"]
\ No newline at end of file
+
+def __getattr__(name):
+    # サブモジュールを読み込むだけで実行系の依存まで読み込まないよう、mainは初回参照時に読み込む
+    if name == "main":
+        from .main import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,195 @@
+import json
+import os
+import time
+import logging
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+PROC_MEMINFO = Path('/proc/meminfo')
+PROC_PRESSURE = Path('/proc/pressure')
+
+
+@dataclass
+class HostSignals:
+    """ホストの負荷（取得できない値は None）"""
+    load_per_cpu: Optional[float] = None  # 1分間のロードアベレージ / CPU数
+    memory_available: Optional[float] = None  # MemAvailable / MemTotal
+    cpu_pressure: Optional[float] = None  # PSI some avg10（%）
+    memory_pressure: Optional[float] = None
+    io_pressure: Optional[float] = None
+
+
+def _read_pressure(resource: str) -> Optional[float]:
+    """/proc/pressure/<resource> の `some avg10=` の値"""
+    try:
+        with open(PROC_PRESSURE / resource, 'r') as f:
+            for line in f:
+                if line.startswith('some '):
+                    fields = dict(item.split('=', 1) for item in line.split()[1:])
+                    return float(fields['avg10'])
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+def _read_memory_available() -> Optional[float]:
+    try:
+        values = {}
+        with open(PROC_MEMINFO, 'r') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in ('MemTotal', 'MemAvailable'):
+                    values[name] = int(rest.split()[0])
+                    if len(values) == 2:
+                        return values['MemAvailable'] / values['MemTotal']
+    except (OSError, ValueError, ZeroDivisionError):
+        pass
+    return None
+
+
+def read_host_signals() -> HostSignals:
+    try:
+        load_per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        load_per_cpu = None
+    return HostSignals(
+        load_per_cpu=load_per_cpu,
+        memory_available=_read_memory_available(),
+        cpu_pressure=_read_pressure('cpu'),
+        memory_pressure=_read_pressure('memory'),
+        io_pressure=_read_pressure('io'),
+    )
+
+
+@dataclass
+class Decision:
+    at: float
+    action: str  # 'lower' / 'raise' / 'hold' / 'defer' / 'admit'
+    limit: int
+    in_use: int
+    reason: str
+    signals: HostSignals
+
+
+class AdmissionController:
+    """ホストの負荷に応じてワーカーの同時実行数を決める
+
+    ADMISSION_INTERVAL 秒ごとにロードアベレージ・空きメモリ・PSI（/proc/pressure）を読み、
+    - いずれかが上限を超えていれば（負荷が高い）同時実行数を1つ下げ、次の判定まで新しい
+      実行を始めない
+    - すべてが下限を下回り（負荷が低い）、枠を使い切っていれば1つ上げる
+    - それ以外は維持する
+    同時実行数は ADMISSION_MIN_CONCURRENT〜ADMISSION_MAX_CONCURRENT の範囲で動く。実行中の
+    ものは止めず、下げた分は完了を待って減らす。何も実行していないまま ADMISSION_MAX_DEFER 秒
+    待たせた場合は、ホスト側の負荷が続いていても1件は始める。判定はすべて ADMISSION_LOG に1行ずつ記録する。
+    取得できない値（Linux以外のPSIなど）は判定に使わない。
+    """
+
+    def __init__(self, initial: int, min_limit: Optional[int] = None, max_limit: Optional[int] = None,
+                 interval: Optional[float] = None, log_file: Optional[Path] = None, read_signals=read_host_signals):
+        self.min_limit = max(1, min_limit or Config.ADMISSION_MIN_CONCURRENT)
+        self.max_limit = max(self.min_limit, max_limit or Config.ADMISSION_MAX_CONCURRENT or initial)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.interval = Config.ADMISSION_INTERVAL if interval is None else interval
+        self.log_file = log_file if log_file is not None else Config.ADMISSION_LOG
+        self.read_signals = read_signals
+        self.deferring = False
+        self.deferred_since: Optional[float] = None
+        self.last_decision: Optional[Decision] = None
+        self._next_check = 0.0
+
+    def _pressure(self, signals: HostSignals) -> Optional[str]:
+        """負荷が高いと判断した理由（なければ None）"""
+        reasons = []
+        if signals.load_per_cpu is not None and signals.load_per_cpu > Config.ADMISSION_LOAD_HIGH:
+            reasons.append(f"load {signals.load_per_cpu:.2f}/cpu > {Config.ADMISSION_LOAD_HIGH}")
+        if signals.memory_available is not None and signals.memory_available < Config.ADMISSION_MEMORY_LOW:
+            reasons.append(f"memory available {signals.memory_available:.0%} < {Config.ADMISSION_MEMORY_LOW:.0%}")
+        for name, value, threshold in (
+            ('cpu', signals.cpu_pressure, Config.ADMISSION_PSI_CPU),
+            ('memory', signals.memory_pressure, Config.ADMISSION_PSI_MEMORY),
+            ('io', signals.io_pressure, Config.ADMISSION_PSI_IO),
+        ):
+            if value is not None and value > threshold:
+                reasons.append(f"{name} pressure {value:.1f}% > {threshold}%")
+        return ', '.join(reasons) or None
+
+    def _idle(self, signals: HostSignals) -> bool:
+        """負荷に余裕があるか（PSIは上限の半分未満、空きメモリは下限の2倍より多いことを基準にする）"""
+        return ((signals.load_per_cpu is None or signals.load_per_cpu < Config.ADMISSION_LOAD_LOW)
+                and (signals.memory_available is None or signals.memory_available > Config.ADMISSION_MEMORY_LOW * 2)
+                and (signals.cpu_pressure is None or signals.cpu_pressure < Config.ADMISSION_PSI_CPU / 2)
+                and (signals.memory_pressure is None or signals.memory_pressure < Config.ADMISSION_PSI_MEMORY / 2)
+                and (signals.io_pressure is None or signals.io_pressure < Config.ADMISSION_PSI_IO / 2))
+
+    def decide(self, signals: HostSignals, in_use: int) -> Decision:
+        pressure = self._pressure(signals)
+        now = time.time()
+        if (pressure and in_use == 0 and self.deferred_since is not None
+                and now - self.deferred_since >= Config.ADMISSION_MAX_DEFER):
+            # このワーカー以外の負荷で実行が止まり続けないようにする
+            action, reason = 'admit', f"{pressure} (deferred {now - self.deferred_since:.0f}s with nothing running)"
+            self.deferring = False
+        elif pressure:
+            if self.limit > self.min_limit:
+                self.limit -= 1
+                action = 'lower'
+            else:
+                action = 'defer'
+            self.deferring = True
+            reason = pressure
+        elif self._idle(signals) and in_use >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            action, reason = 'raise', 'host is idle and all slots are busy'
+            self.deferring = False
+        else:
+            action, reason = 'hold', 'within thresholds'
+            self.deferring = False
+        if not self.deferring:
+            self.deferred_since = None
+        elif self.deferred_since is None:
+            self.deferred_since = now
+        return Decision(now, action, self.limit, in_use, reason, signals)
+
+    def update(self, in_use: int) -> bool:
+        """判定間隔が経っていれば負荷を読み直して同時実行数を決める。新しい実行を始めてよいかを返す"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return not self.deferring
+        self._next_check = now + self.interval
+        previous = self.last_decision
+        decision = self.decide(self.read_signals(), in_use)
+        self.last_decision = decision
+        self._log(decision)
+        if decision.action in ('lower', 'raise', 'admit') or (decision.action == 'defer' and
+                                                     (previous is None or previous.action != 'defer')):
+            print(f"Admission: {decision.action} -> {decision.limit} concurrent runs "
+                  f"({decision.in_use} running): {decision.reason}")
+        return not self.deferring
+
+    def _log(self, decision: Decision):
+        """判定を調整用のJSONLに追記する（上限を超えたら1世代だけ残して切り替える）"""
+        if not self.log_file:
+            return
+        try:
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+            if self.log_file.exists() and self.log_file.stat().st_size > Config.ADMISSION_LOG_MAX_BYTES:
+                os.replace(self.log_file, self.log_file.with_name(self.log_file.name + '.1'))
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(asdict(decision)) + '\n')
+        except OSError as e:
+            logger.warning(f"Failed to write admission log: {e}")
+
+    def status(self) -> Dict:
+        return {
+            'limit': self.limit,
+            'min': self.min_limit,
+            'max': self.max_limit,
+            'deferring': self.deferring,
+            'last_decision': asdict(self.last_decision) if self.last_decision else None,
+        }
@@ -0,0 +1,159 @@
+import fcntl
+import json
+import os
+import shutil
+import tarfile
+import time
+import logging
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Tuple
+
+from .project_metadata import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ArchivedProject:
+    """コールド層に保存したプロジェクトの記録（tarballと同名の `.json` に保存）"""
+    name: str
+    source_file: str
+    original_bytes: int
+    archived_bytes: int
+    archived_at: float
+    info: Dict = field(default_factory=dict)
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.original_bytes - self.archived_bytes
+
+
+@dataclass
+class ArchiveReport:
+    archived: List[ArchivedProject] = field(default_factory=list)
+    skipped: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return sum(p.reclaimed_bytes for p in self.archived)
+
+    def format(self, dry_run: bool = False) -> str:
+        if dry_run:
+            lines = [f"  {p.name}: {format_bytes(p.original_bytes)} ({p.source_file})" for p in self.archived]
+        else:
+            lines = [
+                f"  {p.name}: {format_bytes(p.original_bytes)} -> {format_bytes(p.archived_bytes)} ({p.source_file})"
+                for p in self.archived
+            ]
+        lines += [f"  skipped {name}: {reason}" for name, reason in self.skipped]
+        if dry_run:
+            lines.append(f"Would archive {len(self.archived)} project(s), up to {format_bytes(self.reclaimed_bytes)} reclaimable")
+        else:
+            lines.append(f"Archived {len(self.archived)} project(s), reclaimed {format_bytes(self.reclaimed_bytes)}")
+        return '\n'.join(lines)
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.1f}{unit}" if unit != 'B' else f"{int(size)}B"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def directory_size(path: Path) -> int:
+    """シンボリックリンクをたどらずに合計サイズを求める"""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files + dirs:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def tarball_path(archive_dir: Path, name: str) -> Path:
+    return archive_dir / f'{name}.tar.gz'
+
+
+def sidecar_path(archive_dir: Path, name: str) -> Path:
+    return archive_dir / f'{name}.json'
+
+
+def try_lock_archiver(archive_dir: Path) -> Optional[IO]:
+    """自動退避を担当するプロセスのロックを取る（他のプロセスが持っていれば None）
+
+    返したファイルを閉じるまで（プロセスが終わるまで）ロックを持ち続ける。
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    lock_file = open(archive_dir / '.archiver.lock', 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def pack(project_dir: Path, archive_dir: Path, info: Dict) -> ArchivedProject:
+    """プロジェクトをtar.gzに圧縮してコールド層に置く（元のディレクトリは呼び出し側で削除）"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    tarball = tarball_path(archive_dir, project_dir.name)
+    tmp_tarball = tarball.with_name(f'.{tarball.name}.tmp')
+    original_bytes = directory_size(project_dir)
+
+    with tarfile.open(tmp_tarball, 'w:gz', compresslevel=6) as tar:
+        tar.add(project_dir, arcname=project_dir.name)
+    with open(tmp_tarball, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_tarball, tarball)
+
+    record = ArchivedProject(
+        name=project_dir.name,
+        source_file=info.get('source_file', ''),
+        original_bytes=original_bytes,
+        archived_bytes=tarball.stat().st_size,
+        archived_at=time.time(),
+        info=info,
+    )
+    write_json_atomic(sidecar_path(archive_dir, project_dir.name), asdict(record))
+    return record
+
+
+def unpack(archive_dir: Path, name: str, projects_dir: Path) -> Path:
+    """tarballを展開してプロジェクトディレクトリに戻し、コールド層から削除する"""
+    tarball = tarball_path(archive_dir, name)
+    staging = projects_dir / f'.restoring-{name}'
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+
+    with tarfile.open(tarball, 'r:gz') as tar:
+        if hasattr(tarfile, 'data_filter'):
+            tar.extractall(staging, filter='data')
+        else:
+            tar.extractall(staging)
+    project_dir = projects_dir / name
+    os.replace(staging / name, project_dir)
+    staging.rmdir()
+
+    tarball.unlink()
+    sidecar_path(archive_dir, name).unlink(missing_ok=True)
+    return project_dir
+
+
+def list_archived(archive_dir: Path) -> List[ArchivedProject]:
+    """コールド層のプロジェクト一覧"""
+    records = []
+    if not archive_dir.exists():
+        return records
+    for path in sorted(archive_dir.glob('*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                records.append(ArchivedProject(**json.load(f)))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Skipping unreadable archive record {path}: {e}")
+    return records
+
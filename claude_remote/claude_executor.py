@@ -1,40 +1,207 @@
 import asyncio
+import collections
+import difflib
+import signal
+import statistics
 import subprocess
 import json
 import time
 import os
 import shlex
+import tempfile
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-import docker
 from .slack_notifier import SlackNotifier
+from .result_cache import ResultCache
+from .stream_json import StreamJsonParser
+from .question_detector import QuestionDetector
+from .log_store import LogStore
+from .task_splitter import TaskPlan, apply_statuses, split_tasks
+from .metrics import count, record_prompt_tokens, record_stage, span
+from .prompt_compactor import compact_prompt
+from .diagnostics import profile_region
+from .workspace_manifest import ManifestDiff, WorkspaceManifest
 from .config import Config
 
+# stream-jsonの1行（ツール結果を含む）は大きくなりうるため読み取り上限を引き上げる
+STREAM_LINE_LIMIT = 16 * 1024 * 1024
+
+# プロンプトはこの文字数ずつエンコードしてstdin（Dockerでは一時ファイル）に書き込む
+PROMPT_CHUNK_CHARS = 64 * 1024
+
+# Dockerコンテナ内でプロンプトファイルを置く場所
+CONTAINER_PROMPT_PATH = '/tmp/claude-remote-prompt.md'
+
+
+class RunHandle:
+    """実行中のランの状態（プリエンプション判定・キャンセル用）"""
+    
+    def __init__(self, content: str, project_path: Path):
+        self.content = content
+        self.project_path = project_path
+        self.started_at = time.monotonic()
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.container = None
+        self.finishing = False  # Claudeの処理が終わり後処理中
+        self.cancelled = False
+    
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
 class ClaudeExecutor:
     def __init__(self, project_manager, slack_notifier: SlackNotifier, file_watcher=None):
         self.project_manager = project_manager
         self.slack_notifier = slack_notifier
-        self.docker_client = docker.from_env()
+        self._docker_client = None
         self.file_watcher = file_watcher
+        self.result_cache = ResultCache() if Config.RESULT_CACHE_ENABLED else None
+        self.active_runs: Dict[str, RunHandle] = {}
+    
+    @property
+    def docker_client(self):
+        """Docker実行時に初めて接続する（Dockerデーモンのない環境でも直接実行できるように）"""
+        if self._docker_client is None:
+            import docker
+            self._docker_client = docker.from_env()
+        return self._docker_client
         
-    async def execute(self, markdown_file: Path, content: str, diff: Optional[str] = None) -> Tuple[bool, str]:
+    async def execute(self, markdown_file: Path, content: str, diff: Optional[str] = None,
+                      detected_at: Optional[float] = None, slots=None) -> Tuple[bool, str]:
+        """ノートを実行する（slots はノート内のタスクを並列実行するときに追加で使う同時実行枠）"""
+        with span('execute'), profile_region('execute'):
+            return await self._execute(markdown_file, content, diff, detected_at, slots)
+    
+    @staticmethod
+    def compare_prompts(old_content: str, new_content: str) -> Tuple[str, str]:
+        """実行中の内容と新しい内容を比較
+
+        'preempt'（キャンセル候補）・'defer'（完了後に再実行）・
+        'ignore'（実質的な変更なし）のいずれかと理由を返す。
+        """
+        old_prompt = ResultCache.normalize_prompt(old_content)
+        new_prompt = ResultCache.normalize_prompt(new_content)
+        if old_prompt == new_prompt:
+            return 'ignore', "content unchanged after normalization"
+
+        matcher = difflib.SequenceMatcher(None, old_prompt, new_prompt)
+        change_ratio = 1.0 - matcher.ratio()
+        if change_ratio < Config.PREEMPT_MIN_CHANGE_RATIO:
+            return 'defer', f"change too small ({change_ratio:.1%})"
+        return 'preempt', f"content changed by {change_ratio:.1%}"
+
+    def protection_reason(self, markdown_file: Path) -> Optional[str]:
+        """完了間近でキャンセルすべきでないランならその理由を返す"""
+        handle = self.active_runs.get(str(markdown_file))
+        if handle is None:
+            return None
+        if handle.finishing:
+            return "run is already finishing"
+        expected = self._expected_duration(handle.project_path)
+        if expected is not None and expected - handle.elapsed < Config.PREEMPT_GRACE_PERIOD:
+            return f"run is expected to finish soon ({handle.elapsed:.0f}s of ~{expected:.0f}s)"
+        return None
+
+    def _expected_duration(self, project_path: Path) -> Optional[float]:
+        """直近の成功した実行時間の中央値から所要時間を推定"""
+        durations = [
+            run['finished_at'] - run['started_at']
+            for run in LogStore(project_path / 'logs').list_runs(limit=10)
+            if run['status'] == 'success' and run.get('finished_at')
+        ]
+        return statistics.median(durations) if durations else None
+    
+    async def cancel_run(self, markdown_file: Path) -> bool:
+        """実行中のランのプロセスツリー（またはコンテナ）を停止"""
+        handle = self.active_runs.get(str(markdown_file))
+        if handle is None:
+            return False
+        handle.cancelled = True
+        if handle.process is not None:
+            await self._kill_process_tree(handle.process)
+        if handle.container is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, handle.container.kill)
+            except Exception as e:
+                print(f"Failed to kill container for {markdown_file}: {e}")
+        return True
+    
+    async def _kill_process_tree(self, process: asyncio.subprocess.Process):
+        """プロセスグループ全体にSIGTERMを送り、猶予後にSIGKILL"""
+        if process.returncode is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            await asyncio.wait_for(process.wait(), timeout=Config.PREEMPT_KILL_TIMEOUT)
+        except asyncio.TimeoutError:
+            os.killpg(process.pid, signal.SIGKILL)
+            await process.wait()
+        except ProcessLookupError:
+            pass
+    
+    async def _execute(self, markdown_file: Path, content: str, diff: Optional[str],
+                       detected_at: Optional[float], slots=None) -> Tuple[bool, str]:
         # プロジェクトを取得または作成
-        project_path = self.project_manager.get_project_by_source(markdown_file)
+        # 退避済みプロジェクトの展開や自動退避の完了待ちでイベントループを止めないようスレッドで行う
+        project_path = await asyncio.to_thread(self.project_manager.get_project_by_source, markdown_file, content)
         if not project_path:
             print(f"Creating new project for: {markdown_file}")
-            project_path = self.project_manager.create_project(markdown_file)
+            project_path = await asyncio.to_thread(self.project_manager.create_project, markdown_file, content)
         else:
             print(f"Using existing project: {project_path}")
         
-        project_name = self.project_manager.get_project_name(project_path)
         project_info = self.project_manager.get_project_info(project_path)
+        project_name = project_info.name
         
         print(f"Project info: {project_info}")
         
+        # 作業ディレクトリ（絶対パスに変換）
+        working_dir = Path(project_info.working_directory)
+        if not working_dir.is_absolute():
+            working_dir = Path.cwd() / working_dir
+        working_dir = working_dir.resolve()
+        
+        # 実行前のワークスペースを記録（前回の実行後に手で変更された分は実行の変更に含めない）
+        manifest = None
+        if Config.WORKSPACE_MANIFEST_ENABLED:
+            manifest = WorkspaceManifest(working_dir, project_path / 'manifest.json')
+            with span('workspace_manifest'):
+                outside = await asyncio.to_thread(manifest.refresh)
+            if not outside.empty:
+                print(f"Workspace changed since the last run: {outside.describe()}")
+        
+        # 同じ指示・同じワークスペース状態の実行済み結果があればスキップ
+        use_cache = self.result_cache is not None and not ResultCache.is_opted_out(content)
+        if use_cache:
+            cached = self.result_cache.get(self.result_cache.make_key(
+                content, working_dir, manifest.fingerprint() if manifest else None
+            ))
+            if cached:
+                print(f"Cache hit for {markdown_file}, skipping execution")
+                count('run', status='cached')
+                try:
+                    self.slack_notifier.notify_cached(project_name, cached['summary'], str(markdown_file))
+                except Exception as e:
+                    print(f"Failed to send Slack cache notification: {e}")
+                return True, cached['summary']
+        
         # タスクサマリーを作成
         task_summary = content[:200] if len(content) > 200 else content
         
+        # 並列実行が指定されたノートは独立したタスクに分ける
+        plan = split_tasks(content)
+        if plan:
+            print(f"Splitting {markdown_file} into {len(plan.tasks)} parallel tasks")
+        
+        # 過去の質問ブロックやfrontmatterなど、指示でない部分を削ってから送る
+        compacted = compact_prompt(content)
+        prompt_stats = compacted.stats()
+        record_prompt_tokens(compacted.original_tokens, compacted.compacted_tokens)
+        print(f"Prompt tokens (estimated): {compacted.original_tokens} -> {compacted.compacted_tokens}"
+              + (f" (removed {compacted.removed})" if compacted.removed else ""))
+        
         # 実行開始通知
         print(f"Starting Claude Code execution for project: {project_name}")
         try:
@@ -42,135 +209,365 @@ class ClaudeExecutor:
         except Exception as e:
             print(f"Failed to send Slack notification: {e}")
         
-        # 実行ログファイル
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        log_file = project_path / 'logs' / f'execution_{timestamp}.log'
+        # 実行ログ（実行ごとに圧縮・インデックス登録）
+        log_store = LogStore(project_path / 'logs')
         
-        try:
-            # Claude Codeコマンドを構築（必要なツールを許可）
-            # プロンプトは一つの引数として渡すため、引用符は不要（リストで適切に分割される）
-            cmd_parts = ['claude', '--allowedTools', 'Write,Edit,MultiEdit,Read,Bash,Glob,Grep', '--print', content]
+        # Claude Codeコマンドを構築（必要なツールを許可）
+        # プロンプトは引数に含めずstdinで渡す（ARG_MAXやシェルの引用符処理に影響されない）
+        # 出力はstream-json形式で受け取り、イベント単位で逐次解析する
+        # CLAUDE_COMMANDで負荷試験用の代替実装（fake_claude）に差し替えられる
+        cmd_parts = shlex.split(Config.CLAUDE_COMMAND) + [
+            '--allowedTools', 'Write,Edit,MultiEdit,Read,Bash,Glob,Grep',
+            '--output-format', 'stream-json', '--verbose',
+            '--print'
+        ]
+        prompt = compacted.text
+        
+        print(f"Claude command: {' '.join(cmd_parts)} < [prompt content]")
+        print(f"Prompt preview: {prompt[:100]}...")
+        print(f"Content length: {len(content)} chars ({len(compacted.text)} after compaction)")
+        print(f"Working directory: {working_dir}")
+        
+        # トークン制限で失敗した場合は、待機してから新しい実行として再試行する
+        # 分割したノートは、制限にかかったタスクだけを再実行する
+        record_stage('run_started', detected_at)
+        succeeded_tasks: List[Dict] = []
+        for retry_count in range(Config.MAX_TOKEN_RETRIES + 1):
+            if retry_count:
+                print(f"Token limit reached, retrying in {Config.TOKEN_RETRY_INTERVAL}s "
+                      f"({retry_count}/{Config.MAX_TOKEN_RETRIES})")
+                try:
+                    self.slack_notifier.notify_token_retry(project_name, retry_count)
+                except Exception as e:
+                    print(f"Failed to send Slack retry notification: {e}")
+                await asyncio.sleep(Config.TOKEN_RETRY_INTERVAL)
+                if plan:
+                    succeeded_tasks += [o for o in result['tasks'] if o['success']]
+                    plan = TaskPlan(plan.context, [o['task'] for o in result['tasks'] if not o['success']])
+            result = await self._run_attempt(markdown_file, content, project_path, log_store, plan,
+                                             cmd_parts, prompt, working_dir, manifest, prompt_stats, slots)
+            if result.get('error') != 'token_limit':
+                break
+        record_stage('run_finished', detected_at)
+        
+        if 'tasks' in result:
+            if succeeded_tasks:
+                # 以前の試行で成功したタスクも含めて結果をまとめ直す
+                changes = result.get('changes')
+                result = self._merge_task_outcomes(
+                    sorted(succeeded_tasks + result['tasks'], key=lambda o: o['task'].number)
+                )
+                result['changes'] = changes
+                if result.get('stats'):
+                    result['stats'].update(prompt_stats)
+            self._write_task_statuses(markdown_file, result['tasks'])
+        
+        if result.get('unexpected'):
+            self.slack_notifier.notify_error(
+                project_name,
+                "critical",
+                "Claude Code実行中に予期しないエラーが発生しました",
+                result['error'],
+                "システム管理者に連絡してください"
+            )
+            return False, result['error']
+        
+        if result['success']:
+            print(f"Execution completed successfully: {result['summary']}")
             
-            print(f"Claude command: {' '.join(cmd_parts[:-1])} [prompt content]")
-            print(f"Prompt preview: {content[:100]}...")
-            print(f"Full command args: {cmd_parts}")
-            print(f"Content length: {len(content)} chars")
+            # 実行後のワークスペース状態で結果をキャッシュ
+            if use_cache:
+                self.result_cache.put(
+                    self.result_cache.make_key(content, working_dir, manifest.fingerprint() if manifest else None),
+                    result['summary'],
+                    project_name
+                )
             
-            # 作業ディレクトリで実行（絶対パスに変換）
-            working_dir = Path(project_info['working_directory'])
-            if not working_dir.is_absolute():
-                working_dir = Path.cwd() / working_dir
-            working_dir = working_dir.resolve()
-            print(f"Working directory: {working_dir}")
+            # 質問や追加情報が必要かチェック
+            with span('question_check'):
+                await self._check_and_append_questions(markdown_file, result['questions'])
             
-            # 直接実行（シェル経由）
-            result = await self._run_direct(cmd_parts, working_dir, log_file)
+            try:
+                self.slack_notifier.notify_complete(
+                    project_name, result['summary'], str(markdown_file),
+                    stats=self._format_stats(result.get('stats')),
+                    changes=self._format_changes(result.get('changes'))
+                )
+            except Exception as e:
+                print(f"Failed to send Slack completion notification: {e}")
+            record_stage('notified', detected_at)
+            return True, result['summary']
+        
+        print(f"Execution failed: {result['error']}")
+        await self._handle_error(project_name, result, markdown_file)
+        record_stage('notified', detected_at)
+        return False, result['error']
+    
+    async def _run_attempt(self, markdown_file: Path, content: str, project_path: Path, log_store: LogStore,
+                           plan: Optional[TaskPlan], cmd_parts: list, prompt: str, working_dir: Path,
+                           manifest: Optional[WorkspaceManifest], prompt_stats: Dict, slots=None) -> Dict:
+        """1回分の実行（再試行も実行ログ・実行中の状態・ワークスペースの差分を新しく記録する）
+        
+        予期しない例外は `unexpected` 付きの失敗として返す。キャンセルはそのまま送出する。
+        """
+        run_id, log_file = log_store.start_run()
+        handle = RunHandle(content, project_path)
+        self.active_runs[str(markdown_file)] = handle
+        
+        try:
+            with span('run_direct'):
+                if plan:
+                    result = await self._run_split(plan, cmd_parts, working_dir, log_file, slots)
+                else:
+                    result = await self._run_direct(cmd_parts, prompt, working_dir, log_file, handle)
+            if handle.cancelled:
+                # 停止されたプロセスの終了コードはエラーとして扱わない
+                raise asyncio.CancelledError()
+            count('run', status=self._run_status(result))
+            if result.get('stats'):
+                result['stats'].update(prompt_stats)
+            extra = dict(result.get('stats') or prompt_stats)
+            
+            # 実行で追加・変更・削除されたファイル
+            if manifest is not None:
+                with span('workspace_manifest'):
+                    result['changes'] = await asyncio.to_thread(manifest.refresh)
+                print(f"Workspace changes: {result['changes'].describe()} "
+                      f"({manifest.hashed} of {len(manifest.files)} files hashed)")
+                extra.update(result['changes'].stats())
+            
+            log_store.finish_run(
+                run_id,
+                self._run_status(result),
+                exit_code=result.get('exit_code'),
+                summary=result['summary'] if result['success'] else result.get('logs', ''),
+                extra=extra
+            )
+            self.project_manager.record_run(project_path, self._run_status(result), handle.elapsed)
             
             print(f"Claude Code execution result: success={result['success']}")
             if 'logs' in result and result['logs']:
                 print(f"Execution logs: {result['logs'][:500]}...")
-            
-            if result['success']:
-                print(f"Execution completed successfully: {result['summary']}")
-                
-                # 質問や追加情報が必要かチェック
-                await self._check_and_append_questions(markdown_file, result['logs'], result['summary'])
-                
-                try:
-                    self.slack_notifier.notify_complete(project_name, result['summary'], str(markdown_file))
-                except Exception as e:
-                    print(f"Failed to send Slack completion notification: {e}")
-                return True, result['summary']
-            else:
-                print(f"Execution failed: {result['error']}")
-                # エラー処理
-                await self._handle_error(project_name, result, markdown_file)
-                return False, result['error']
+            return result
                 
+        except asyncio.CancelledError:
+            # 新しい内容によるプリエンプションまたはシャットダウン
+            log_store.finish_run(run_id, 'cancelled', summary='Cancelled before completion', extra=prompt_stats)
+            self.project_manager.record_run(project_path, 'cancelled', handle.elapsed)
+            count('run', status='cancelled')
+            raise
         except Exception as e:
             error_msg = str(e)
-            self.slack_notifier.notify_error(
-                project_name,
-                "critical",
-                "Claude Code実行中に予期しないエラーが発生しました",
-                error_msg,
-                "システム管理者に連絡してください"
-            )
-            return False, error_msg
+            log_store.finish_run(run_id, 'error', summary=error_msg, extra=prompt_stats)
+            self.project_manager.record_run(project_path, 'error', handle.elapsed)
+            return {'success': False, 'error': error_msg, 'unexpected': True}
+        finally:
+            if self.active_runs.get(str(markdown_file)) is handle:
+                del self.active_runs[str(markdown_file)]
     
-    async def _run_direct(self, cmd_parts: list, working_dir: Path, log_file: Path) -> Dict:
+    @staticmethod
+    def _prompt_chunks(prompt: str):
+        """プロンプトを少しずつエンコードする（全体のバイト列のコピーを作らない）"""
+        for start in range(0, len(prompt), PROMPT_CHUNK_CHARS):
+            yield prompt[start:start + PROMPT_CHUNK_CHARS].encode('utf-8')
+    
+    async def _feed_prompt(self, stdin: asyncio.StreamWriter, prompt: str):
+        """出力の読み取りと並行してプロンプトをstdinに書き込む"""
+        try:
+            for chunk in self._prompt_chunks(prompt):
+                stdin.write(chunk)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # プロンプトを読み切らずに終了した（結果は終了コードで判定する）
+            pass
+        finally:
+            stdin.close()
+    
+    def _write_prompt_file(self, prompt: str) -> Path:
+        """Dockerコンテナに渡すプロンプトを一時ファイルに書き出す"""
+        fd, path = tempfile.mkstemp(prefix='claude-remote-prompt-', suffix='.md')
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in self._prompt_chunks(prompt):
+                f.write(chunk)
+        return Path(path)
+    
+    async def _run_direct(self, cmd_parts: list, prompt: str, working_dir: Path, log_file: Path,
+                          handle: Optional[RunHandle] = None) -> Dict:
         """直接実行（テスト用）"""
+        process = None
         try:
             # 作業ディレクトリを作成
             working_dir.mkdir(parents=True, exist_ok=True)
             
-            # プロンプトをダブルクォーテーションで囲んでシェルコマンドとして構築
-            prompt = cmd_parts[-1]
-            # 確実にダブルクォーテーションで囲む
-            quoted_prompt = f'"{prompt}"'
-            shell_cmd_parts = cmd_parts[:-1] + [quoted_prompt]
-            shell_cmd = ' '.join(shell_cmd_parts)
-            
-            print(f"Shell command: {shell_cmd}")
-            
-            # Claude Codeをシェル経由で実行
-            process = await asyncio.create_subprocess_shell(
-                shell_cmd,
+            # シェルを介さずに起動し、プロンプトはstdinで渡す
+            # （プロセスツリーごと停止できるよう新しいセッションで起動）
+            process = await asyncio.create_subprocess_exec(
+                *cmd_parts,
                 cwd=str(working_dir),
+                stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True,
+                limit=STREAM_LINE_LIMIT
             )
+            if handle:
+                handle.process = process
             
-            # タイムアウト付きで実行を待機
-            try:
-                stdout, _ = await asyncio.wait_for(
-                    process.communicate(), 
-                    timeout=Config.CLAUDE_TIMEOUT
-                )
-                logs = stdout.decode('utf-8')
-            except asyncio.TimeoutError:
-                process.kill()
-                logs = "Claude Code execution timed out"
-                return {
-                    'success': False,
-                    'error': 'timeout',
-                    'logs': logs
-                }
-            
-            # ログファイルに保存
+            # 出力を到着順に解析しながらログファイルへ書き出す
+            parser = self._create_parser()
             log_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(log_file, 'w') as f:
-                f.write(logs)
+            with open(log_file, 'w', encoding='utf-8') as f:
+                async def read_output():
+                    async for raw_line in process.stdout:
+                        line = raw_line.decode('utf-8', errors='replace')
+                        f.write(line)
+                        parser.feed(line)
+                        if handle and parser.has_result:
+                            handle.finishing = True
+                    if handle:
+                        handle.finishing = True
+                    await process.wait()
+                
+                async def consume():
+                    await asyncio.gather(self._feed_prompt(process.stdin, prompt), read_output())
+                
+                # タイムアウト付きで実行を待機
+                try:
+                    await asyncio.wait_for(consume(), timeout=Config.CLAUDE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await self._kill_process_tree(process)
+                    return {
+                        'success': False,
+                        'error': 'timeout',
+                        'logs': "Claude Code execution timed out"
+                    }
             
-            # 実行結果を解析
-            if process.returncode == 0:
-                return {
-                    'success': True,
-                    'summary': self._extract_summary(logs),
-                    'logs': logs
-                }
-            elif process.returncode == 129:  # トークン制限
-                return {
-                    'success': False,
-                    'error': 'token_limit',
-                    'logs': logs
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'Exit code: {process.returncode}',
-                    'logs': logs
-                }
+            return self._build_result(process.returncode, parser)
                 
+        except asyncio.CancelledError:
+            if process is not None:
+                await self._kill_process_tree(process)
+            raise
         except Exception as e:
+            # STREAM_LINE_LIMIT を超える行などで読み取りが失敗した場合もプロセスを残さない
+            if process is not None:
+                await self._kill_process_tree(process)
             return {
                 'success': False,
                 'error': str(e),
                 'logs': ''
             }
     
-    async def _run_in_docker(self, cmd_parts: list, working_dir: Path, log_file: Path) -> Dict:
+    async def _run_split(self, plan: TaskPlan, cmd_parts: list, working_dir: Path, log_file: Path,
+                         slots=None) -> Dict:
+        """ノート内の独立したタスクをそれぞれの作業ディレクトリで並列実行し、結果をまとめる
+
+        ジョブ自身の枠で順にタスクを実行しつつ、空いた枠（slots）を借りられた分だけ
+        並列に実行する。各タスクは `<作業ディレクトリ>/tasks/<タスク名>` で実行される。
+        """
+        results: Dict[int, Dict] = {}
+        pending = collections.deque(plan.tasks)
+        task_logs = {task.number: log_file.with_name(f'{log_file.stem}.{task.workspace}.log') for task in plan.tasks}
+        
+        async def run_pending():
+            while pending:
+                task = pending.popleft()
+                print(f"Running task {task.number}: {task.title}")
+                task_prompt = compact_prompt(plan.prompt(task)).text
+                task_dir = working_dir / 'tasks' / task.workspace
+                results[task.number] = await self._run_direct(cmd_parts, task_prompt, task_dir, task_logs[task.number])
+        
+        borrowed = set()
+        
+        async def run_with_borrowed_slot(lane: int):
+            await slots.acquire()
+            borrowed.add(lane)
+            try:
+                await run_pending()
+            finally:
+                slots.release()
+        
+        helpers = [asyncio.create_task(run_with_borrowed_slot(lane))
+                   for lane in range(len(plan.tasks) - 1)] if slots is not None else []
+        try:
+            await run_pending()
+            # 残りのタスクがなくなったので、枠を待っているだけのものは取り消す
+            for lane, helper in enumerate(helpers):
+                if lane not in borrowed:
+                    helper.cancel()
+            await asyncio.gather(*helpers, return_exceptions=True)
+        finally:
+            for helper in helpers:
+                helper.cancel()
+            await asyncio.gather(*helpers, return_exceptions=True)
+        
+        # タスクごとのログを1つの実行ログにまとめる
+        with open(log_file, 'w', encoding='utf-8') as f:
+            for task in plan.tasks:
+                f.write(f"=== Task {task.number}: {task.title} ===\n")
+                task_log = task_logs[task.number]
+                if task_log.exists():
+                    f.write(task_log.read_text(encoding='utf-8', errors='replace'))
+                    task_log.unlink()
+        
+        outcomes = []
+        for task in plan.tasks:
+            result = results.get(task.number, {'success': False, 'error': 'not run', 'logs': ''})
+            message = result['summary'] if result['success'] else result['error']
+            outcomes.append({'task': task, 'success': result['success'], 'message': message, 'result': result})
+        return self._merge_task_outcomes(outcomes)
+    
+    @staticmethod
+    def _merge_task_outcomes(outcomes: List[Dict]) -> Dict:
+        """タスクごとの結果を1回の実行結果にまとめる（失敗がすべてトークン制限なら error は token_limit）"""
+        stats = {}
+        for outcome in outcomes:
+            for key, value in (outcome['result'].get('stats') or {}).items():
+                if isinstance(value, (int, float)):
+                    stats[key] = stats.get(key, 0) + value
+        questions = []
+        for outcome in outcomes:
+            questions += [q for q in outcome['result'].get('questions', []) if q not in questions]
+        
+        failed = [o for o in outcomes if not o['success']]
+        summary = '\n'.join(
+            f"{'✅' if o['success'] else '❌'} {o['task'].title}: {o['message']}" for o in outcomes
+        )
+        merged = {
+            'success': not failed,
+            'summary': summary,
+            'exit_code': next((o['result'].get('exit_code') for o in failed), 0),
+            'logs': '\n\n'.join(o['result'].get('logs', '') for o in outcomes),
+            'questions': questions,
+            'stats': stats or None,
+            'tasks': outcomes,
+        }
+        if failed:
+            if all(o['result'].get('error') == 'token_limit' for o in failed):
+                merged['error'] = 'token_limit'
+            else:
+                merged['error'] = f"{len(failed)}/{len(outcomes)} tasks failed"
+            merged['logs'] = summary
+        return merged
+    
+    def _write_task_statuses(self, markdown_file: Path, outcomes: List[Dict]):
+        """タスクごとの結果をノートに書き戻す"""
+        try:
+            content = markdown_file.read_text(encoding='utf-8')
+            markdown_file.write_text(apply_statuses(content, outcomes), encoding='utf-8')
+            print(f"Wrote status of {len(outcomes)} tasks back to {markdown_file}")
+            if self.file_watcher and hasattr(self.file_watcher, 'mark_file_as_system_modified'):
+                self.file_watcher.mark_file_as_system_modified(markdown_file)
+        except Exception as e:
+            print(f"Failed to write task statuses to {markdown_file}: {e}")
+    
+    async def _run_in_docker(self, cmd_parts: list, prompt: str, working_dir: Path, log_file: Path,
+                             handle: Optional[RunHandle] = None) -> Dict:
+        prompt_file = None
         try:
+            # プロンプトは一時ファイルをマウントし、コンテナ内でstdinにリダイレクトする
+            prompt_file = self._write_prompt_file(prompt)
+            
             # ホームディレクトリのClaude設定をマウント
             home_dir = os.path.expanduser("~")
             claude_config_dir = os.path.join(home_dir, ".claude")
@@ -178,6 +575,7 @@ class ClaudeExecutor:
             
             volumes = {
                 str(working_dir): {'bind': '/workspace', 'mode': 'rw'},
+                str(prompt_file): {'bind': CONTAINER_PROMPT_PATH, 'mode': 'ro'},
             }
             
             # Claude設定ファイルをマウント（書き込み可能）
@@ -189,10 +587,12 @@ class ClaudeExecutor:
             # Dockerコンテナ設定
             container_config = {
                 'image': Config.DOCKER_IMAGE_NAME,
+                # 引数は "$@" でそのまま渡すため、シェルによる展開は起きない
+                'entrypoint': ['/bin/sh', '-c', f'exec "$@" < {CONTAINER_PROMPT_PATH}', 'sh'],
                 'command': cmd_parts,
                 'working_dir': '/workspace',
                 'volumes': volumes,
-                'detach': False,  # 同期実行に変更
+                'detach': True,  # キャンセル可能にするためデタッチして完了を待つ
                 'remove': False,  # 一時的に残す
                 'network_mode': Config.DOCKER_NETWORK_NAME,
                 'mem_limit': '4g',
@@ -201,44 +601,52 @@ class ClaudeExecutor:
             }
             
             # コンテナ実行
+            loop = asyncio.get_running_loop()
+            container = None
             try:
-                # detach=Falseで同期実行 - 戻り値はbytes
-                logs_bytes = self.docker_client.containers.run(**container_config)
-                logs = logs_bytes.decode('utf-8')
-                exit_code = 0  # 正常終了
+                container = await loop.run_in_executor(
+                    None, lambda: self.docker_client.containers.run(**container_config)
+                )
+                if handle:
+                    handle.container = container
+                
+                # イベントループを止めないよう別スレッドで終了を待機
+                try:
+                    wait_result = await asyncio.wait_for(
+                        loop.run_in_executor(None, container.wait),
+                        timeout=Config.CLAUDE_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    await loop.run_in_executor(None, container.kill)
+                    return {
+                        'success': False,
+                        'error': 'timeout',
+                        'logs': "Claude Code execution timed out"
+                    }
+                if handle:
+                    handle.finishing = True
+                exit_code = wait_result.get('StatusCode', 1)
+                logs_bytes = await loop.run_in_executor(None, container.logs)
+                logs = logs_bytes.decode('utf-8', errors='replace')
                 
-            except docker.errors.ContainerError as e:
-                # コンテナが非0で終了
-                logs = e.stderr.decode('utf-8') if e.stderr else str(e)
-                exit_code = e.exit_status
+            except asyncio.CancelledError:
+                if container is not None:
+                    await loop.run_in_executor(None, container.kill)
+                raise
                 
             except Exception as e:
                 logs = f"Docker execution failed: {str(e)}"
                 exit_code = 1
             
-            # ログファイルに保存
+            # ログファイルに保存しつつ1パスで解析
+            parser = self._create_parser()
             log_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(log_file, 'w') as f:
+            with open(log_file, 'w', encoding='utf-8') as f:
                 f.write(logs)
+            for line in logs.splitlines():
+                parser.feed(line)
             
-            if exit_code == 0:
-                return {
-                    'success': True,
-                    'summary': self._extract_summary(logs),
-                    'logs': logs
-                }
-            elif exit_code == 129:  # トークン制限
-                return {
-                    'success': False,
-                    'error': 'token_limit',
-                    'logs': logs
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'Exit code: {exit_code}',
-                    'logs': logs
-                }
+            return self._build_result(exit_code, parser)
                 
         except Exception as e:
             return {
@@ -246,24 +654,72 @@ class ClaudeExecutor:
                 'error': str(e),
                 'logs': ''
             }
+        finally:
+            if prompt_file is not None:
+                prompt_file.unlink(missing_ok=True)
+    
+    def _run_status(self, result: Dict) -> str:
+        """実行結果をログインデックス用のステータスに変換"""
+        if result['success']:
+            return 'success'
+        if result['error'] in ('token_limit', 'timeout'):
+            return result['error']
+        return 'failed'
+    
+    def _create_parser(self) -> StreamJsonParser:
+        """質問をメッセージ到着時点で検出するパーサーを作成"""
+        detector = QuestionDetector()
+        
+        def detect(text: str) -> List[str]:
+            found = detector.feed_text(text)
+            if found:
+                print(f"Question detected during execution: {found[0][:100]}")
+            return found
+        
+        return StreamJsonParser(question_detector=detect)
+    
+    def _build_result(self, exit_code: int, parser: StreamJsonParser) -> Dict:
+        """終了コードと解析済みイベントから実行結果を構築"""
+        stats = parser.stats()
+        print(f"Run stats: turns={stats['num_turns']}, tool_calls={stats['tool_calls']}, "
+              f"tokens in/out={stats['input_tokens']}/{stats['output_tokens']}, cost=${stats['cost_usd']:.4f}")
+        
+        if exit_code == 0 and not parser.is_error:
+            return {
+                'success': True,
+                'summary': parser.result_text if parser.has_result else self._extract_summary(parser.text),
+                'exit_code': exit_code,
+                'logs': parser.text,
+                'questions': parser.questions,
+                'stats': stats
+            }
+        elif exit_code == 129:  # トークン制限
+            return {
+                'success': False,
+                'error': 'token_limit',
+                'exit_code': exit_code,
+                'logs': parser.text,
+                'stats': stats
+            }
+        else:
+            return {
+                'success': False,
+                'error': parser.result_text if parser.is_error and parser.result_text else f'Exit code: {exit_code}',
+                'exit_code': exit_code,
+                'logs': parser.text,
+                'stats': stats
+            }
     
     async def _handle_error(self, project_name: str, result: Dict, markdown_file: Path):
         if result['error'] == 'token_limit':
-            # トークン制限の場合は再試行
-            for retry_count in range(1, Config.MAX_TOKEN_RETRIES + 1):
-                self.slack_notifier.notify_token_retry(project_name, retry_count)
-                await asyncio.sleep(Config.TOKEN_RETRY_INTERVAL)
-                
-                # 再実行
-                retry_result = await self._run_in_docker(
-                    result.get('cmd_parts', []),
-                    result.get('working_dir', Path('.')),
-                    result.get('log_file', Path('./retry.log'))
-                )
-                
-                if retry_result['success']:
-                    self.slack_notifier.notify_complete(project_name, retry_result['summary'])
-                    return
+            # 再試行（_execute）でも制限が解除されなかった
+            self.slack_notifier.notify_error(
+                project_name,
+                "major",
+                f"トークン制限により{Config.MAX_TOKEN_RETRIES}回再試行しましたが実行できませんでした",
+                result.get('logs', '')[:500],
+                "時間をおいてからノートを更新してください"
+            )
         else:
             # その他のエラー
             self.slack_notifier.notify_error(
@@ -281,45 +737,30 @@ class ClaudeExecutor:
             return '\n'.join(lines[-10:])
         return logs[:500]
     
-    async def _check_and_append_questions(self, markdown_file: Path, logs: str, summary: str):
+    def _format_stats(self, stats: Optional[Dict]) -> Optional[str]:
+        """Slack通知用にトークン・コスト集計を整形"""
+        if not stats:
+            return None
+        text = (f"ターン: {stats['num_turns']} / ツール呼び出し: {stats['tool_calls']} / "
+                f"トークン: {stats['input_tokens']}→{stats['output_tokens']} / "
+                f"コスト: ${stats['cost_usd']:.4f}")
+        if stats.get('prompt_tokens_compacted', 0) < stats.get('prompt_tokens_original', 0):
+            text += f" / プロンプト圧縮: {stats['prompt_tokens_original']}→{stats['prompt_tokens_compacted']}（推定）"
+        return text
+    
+    def _format_changes(self, changes: Optional[ManifestDiff]) -> Optional[str]:
+        """Slack通知用に変更したファイルの一覧を整形"""
+        if changes is None:
+            return None
+        if changes.empty:
+            return "変更なし"
+        return changes.summary()
+    
+    async def _check_and_append_questions(self, markdown_file: Path, questions: List[str]):
         """Claudeからの質問や追加情報要求をマークダウンファイルに追記"""
         try:
-            # Claudeの応答から質問を検出するパターン
-            question_patterns = [
-                r'(?:質問|Question|クエスチョン)[:：]?\s*(.+)',
-                r'(?:確認|Confirm|コンファーム)[:：]?\s*(.+)', 
-                r'(?:詳細|Details|詳しく)[:：]?\s*(.+)',
-                r'(?:どの|Which|どちら).*[？?]',
-                r'(?:何|What|なに).*[？?]',
-                r'(?:いつ|When|どこ|Where|なぜ|Why|どうやって|How).*[？?]',
-                r'(?:してください|お聞かせください|教えてください|please|Please).*[？?]?',
-                r'(?:必要です|required|需要|ください).*(?:情報|information|詳細|details)',
-            ]
-            
-            import re
-            questions = []
-            
-            # ログと要約から質問を抽出
-            for text in [logs, summary]:
-                for pattern in question_patterns:
-                    matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
-                    questions.extend(matches)
-            
-            # 質問らしい行を直接検出
-            for line in logs.split('\n'):
-                line = line.strip()
-                if line and (line.endswith('?') or line.endswith('？')):
-                    if len(line) > 10 and len(line) < 200:  # 適度な長さの質問
-                        questions.append(line)
-            
-            # 重複を除去し、有効な質問のみを保持
-            unique_questions = []
-            for q in questions:
-                q = q.strip()
-                if q and len(q) > 5 and q not in unique_questions:
-                    unique_questions.append(q)
-            
-            if unique_questions:
+            # 質問は検出時に正規化・重複除去済み
+            if questions:
                 # マークダウンファイルに質問を追記
                 timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 
@@ -327,12 +768,12 @@ class ClaudeExecutor:
                     f.write('\n\n---\n')
                     f.write(f'## Claude からの質問 ({timestamp})\n\n')
                     
-                    for i, question in enumerate(unique_questions, 1):
+                    for i, question in enumerate(questions, 1):
                         f.write(f'{i}. {question}\n')
                     
                     f.write('\n*上記の質問に回答してファイルを更新してください*\n')
                 
-                print(f"Claudeからの質問をマークダウンファイルに追記しました: {len(unique_questions)}件")
+                print(f"Claudeからの質問をマークダウンファイルに追記しました: {len(questions)}件")
                 
                 # ファイル監視にシステム変更を通知
                 if self.file_watcher and hasattr(self.file_watcher, 'mark_file_as_system_modified'):
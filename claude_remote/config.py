@@ -11,17 +11,132 @@ class Config:
     
     # Slack
     SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL')
+    SLACK_CONNECT_TIMEOUT = float(os.getenv('SLACK_CONNECT_TIMEOUT', 5))
+    SLACK_TIMEOUT = float(os.getenv('SLACK_TIMEOUT', 10))
+    SLACK_MAX_RETRIES = int(os.getenv('SLACK_MAX_RETRIES', 3))
+    SLACK_QUEUE_SIZE = int(os.getenv('SLACK_QUEUE_SIZE', 200))
+    SLACK_SHUTDOWN_TIMEOUT = float(os.getenv('SLACK_SHUTDOWN_TIMEOUT', 10))
+    SLACK_RATE_LIMIT = float(os.getenv('SLACK_RATE_LIMIT', 1))
+    SLACK_RATE_BURST = int(os.getenv('SLACK_RATE_BURST', 3))
+    SLACK_DIGEST_MIN = int(os.getenv('SLACK_DIGEST_MIN', 3))
+    SLACK_START_HOLD = float(os.getenv('SLACK_START_HOLD', 15))
+    SLACK_OUTBOX_ENABLED = os.getenv('SLACK_OUTBOX_ENABLED', 'true').lower() == 'true'
+    SLACK_OUTBOX_PATH = Path(os.getenv('SLACK_OUTBOX_PATH', str(Path.home() / '.claude-remote' / 'outbox.jsonl'))).expanduser()
+    SLACK_OUTBOX_MAX_AGE = int(os.getenv('SLACK_OUTBOX_MAX_AGE', 86400))
+    SLACK_OFFLINE_RETRY_MAX = float(os.getenv('SLACK_OFFLINE_RETRY_MAX', 300))
     
     # Claude Code settings
+    CLAUDE_COMMAND = os.getenv('CLAUDE_COMMAND', 'claude')
     CLAUDE_TIMEOUT = int(os.getenv('CLAUDE_TIMEOUT', 1800))
     MAX_CONCURRENT_EXECUTIONS = int(os.getenv('MAX_CONCURRENT_EXECUTIONS', 3))
     TOKEN_RETRY_INTERVAL = int(os.getenv('TOKEN_RETRY_INTERVAL', 300))
     MAX_TOKEN_RETRIES = int(os.getenv('MAX_TOKEN_RETRIES', 10))
     
+    # Parallel tasks within a note: notes marked `claude-remote: parallel` run their
+    # top-level tasks concurrently (up to this many)
+    TASK_SPLIT_MAX_TASKS = int(os.getenv('TASK_SPLIT_MAX_TASKS', 8))
+    
     # Docker settings
     DOCKER_IMAGE_NAME = os.getenv('DOCKER_IMAGE_NAME', 'claude-remote')
     DOCKER_NETWORK_NAME = os.getenv('DOCKER_NETWORK_NAME', 'claude-remote-net')
     
+    # Result cache settings
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 500))
+    RESULT_CACHE_MAX_AGE = int(os.getenv('RESULT_CACHE_MAX_AGE', 604800))
+
+    # Per-project workspace manifest (path, size, mtime, hash) used to report what each run changed
+    WORKSPACE_MANIFEST_ENABLED = os.getenv('WORKSPACE_MANIFEST_ENABLED', 'true').lower() == 'true'
+    WORKSPACE_MANIFEST_IGNORE = [pattern.strip() for pattern in os.getenv(
+        'WORKSPACE_MANIFEST_IGNORE',
+        '.git,node_modules,__pycache__,.venv,venv,.mypy_cache,.pytest_cache,.tox,*.pyc,.DS_Store'
+    ).split(',') if pattern.strip()]
+    WORKSPACE_MANIFEST_MAX_HASH_BYTES = int(os.getenv('WORKSPACE_MANIFEST_MAX_HASH_BYTES', 64 * 1024 * 1024))
+    
+    # Question detection
+    MAX_QUESTIONS = int(os.getenv('MAX_QUESTIONS', 10))
+    
+    # Prompt compaction rules applied before a note is sent to Claude (comma-separated, empty disables)
+    PROMPT_COMPACTION_RULES = [rule.strip() for rule in os.getenv(
+        'PROMPT_COMPACTION_RULES', 'frontmatter,comments,embeds,questions,task_results'
+    ).split(',') if rule.strip()]
+    
+    # Execution log retention (per project)
+    LOG_COMPRESSION = os.getenv('LOG_COMPRESSION', 'gzip')
+    LOG_RETENTION_COUNT = int(os.getenv('LOG_RETENTION_COUNT', 100))
+    LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 30))
+    LOG_RETENTION_BYTES = int(os.getenv('LOG_RETENTION_BYTES', 500 * 1024 * 1024))
+    
+    # Durable job queue
+    JOB_DB_PATH = Path(os.getenv('JOB_DB_PATH', str(Path.home() / '.claude-remote' / 'jobs.db'))).expanduser()
+    MAX_JOB_ATTEMPTS = int(os.getenv('MAX_JOB_ATTEMPTS', 3))
+    JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+
+    # Distributed workers (shared queue backend and leases)
+    QUEUE_BACKEND = os.getenv('QUEUE_BACKEND', 'sqlite')
+    QUEUE_PATH = Path(os.getenv('QUEUE_PATH', str(Path.home() / '.claude-remote' / 'queue'))).expanduser()
+    WORKER_ID = os.getenv('WORKER_ID')
+    LEASE_SECONDS = int(os.getenv('LEASE_SECONDS', 90))
+    HEARTBEAT_INTERVAL = int(os.getenv('HEARTBEAT_INTERVAL', 20))
+    QUEUE_POLL_INTERVAL = float(os.getenv('QUEUE_POLL_INTERVAL', 2))
+
+    # Admission control: adjust concurrent runs per worker between the bounds from host load,
+    # available memory and PSI (/proc/pressure), deferring new launches under pressure
+    ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'false').lower() == 'true'
+    ADMISSION_MIN_CONCURRENT = int(os.getenv('ADMISSION_MIN_CONCURRENT', 1))
+    ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', 0))  # 0 = MAX_CONCURRENT_EXECUTIONS
+    ADMISSION_INTERVAL = float(os.getenv('ADMISSION_INTERVAL', 10))
+    ADMISSION_MAX_DEFER = float(os.getenv('ADMISSION_MAX_DEFER', 300))
+    ADMISSION_LOAD_HIGH = float(os.getenv('ADMISSION_LOAD_HIGH', 1.5))
+    ADMISSION_LOAD_LOW = float(os.getenv('ADMISSION_LOAD_LOW', 0.7))
+    ADMISSION_MEMORY_LOW = float(os.getenv('ADMISSION_MEMORY_LOW', 0.1))
+    ADMISSION_PSI_CPU = float(os.getenv('ADMISSION_PSI_CPU', 40))
+    ADMISSION_PSI_MEMORY = float(os.getenv('ADMISSION_PSI_MEMORY', 10))
+    ADMISSION_PSI_IO = float(os.getenv('ADMISSION_PSI_IO', 30))
+    ADMISSION_LOG = Path(os.getenv('ADMISSION_LOG', str(Path.home() / '.claude-remote' / 'admission.jsonl'))).expanduser()
+    ADMISSION_LOG_MAX_BYTES = int(os.getenv('ADMISSION_LOG_MAX_BYTES', 10 * 1024 * 1024))
+
+    # Cold-tier archival of idle projects
+    ARCHIVE_DIR = Path(os.getenv('ARCHIVE_DIR', str(PROJECTS_DIR / '.archive'))).expanduser()
+    ARCHIVE_IDLE_DAYS = float(os.getenv('ARCHIVE_IDLE_DAYS', 30))
+    ARCHIVE_AUTO = os.getenv('ARCHIVE_AUTO', 'false').lower() == 'true'
+    ARCHIVE_CHECK_INTERVAL = int(os.getenv('ARCHIVE_CHECK_INTERVAL', 86400))
+
+    # Process isolation: 'single' runs everything on one event loop, 'multi' runs the
+    # watcher, PROCESS_WORKERS executor processes and the notifier as supervised processes
+    PROCESS_MODE = os.getenv('PROCESS_MODE', 'single')
+    PROCESS_WORKERS = int(os.getenv('PROCESS_WORKERS', 1))
+    PROCESS_RESTART_BACKOFF_MAX = float(os.getenv('PROCESS_RESTART_BACKOFF_MAX', 60))
+
+    # Preemption of runs whose note changed mid-run
+    PREEMPT_ENABLED = os.getenv('PREEMPT_ENABLED', 'false').lower() == 'true'
+    PREEMPT_MIN_CHANGE_RATIO = float(os.getenv('PREEMPT_MIN_CHANGE_RATIO', 0.02))
+    PREEMPT_GRACE_PERIOD = int(os.getenv('PREEMPT_GRACE_PERIOD', 60))
+    PREEMPT_KILL_TIMEOUT = int(os.getenv('PREEMPT_KILL_TIMEOUT', 10))
+    
+    # Local status endpoint (/status, /health, /metrics)
+    STATUS_ENABLED = os.getenv('STATUS_ENABLED', 'false').lower() == 'true'
+    STATUS_HOST = os.getenv('STATUS_HOST', '127.0.0.1')
+    STATUS_PORT = int(os.getenv('STATUS_PORT', 8787))
+    STATUS_SOCKET = Path(os.getenv('STATUS_SOCKET')).expanduser() if os.getenv('STATUS_SOCKET') else None
+    STATUS_REFRESH_INTERVAL = float(os.getenv('STATUS_REFRESH_INTERVAL', 5))
+
+    # Startup time budget checked by `claude-remote startup-time`
+    STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 1000))
+
+    # Metrics (Prometheus text format)
+    METRICS_FILE = Path(os.getenv('METRICS_FILE', str(Path.home() / '.claude-remote' / 'metrics.prom'))).expanduser()
+    METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 15))
+
+    # Opt-in profiling (sampling CPU profiler + tracemalloc) and diagnostics dumps (SIGUSR1)
+    PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'false').lower() == 'true'
+    DIAGNOSTICS_DIR = Path(os.getenv('DIAGNOSTICS_DIR', str(Path.home() / '.claude-remote' / 'diagnostics'))).expanduser()
+    DIAGNOSTICS_MAX_FILES = int(os.getenv('DIAGNOSTICS_MAX_FILES', 200))
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.01))
+    PROFILE_DUMP_INTERVAL = float(os.getenv('PROFILE_DUMP_INTERVAL', 300))
+    PROFILE_MEMORY_FRAMES = int(os.getenv('PROFILE_MEMORY_FRAMES', 10))  # 0 disables tracemalloc
+    PROFILE_TOP = int(os.getenv('PROFILE_TOP', 25))
+    
     @classmethod
     def validate(cls):
         if not cls.SLACK_WEBHOOK_URL:
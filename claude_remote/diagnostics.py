@@ -0,0 +1,269 @@
+import asyncio
+import collections
+import contextlib
+import os
+import resource
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+import logging
+from pathlib import Path
+from typing import Counter, Dict, List, Optional, Tuple
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# 有効なプロファイラ（無効なら None で、profile_region は何もしない）
+PROFILER: Optional['Profiler'] = None
+
+_NULL_REGION = contextlib.nullcontext()
+
+# この区間では前後のtracemallocスナップショットを比較して増えた割り当てを書き出す
+SNAPSHOT_REGIONS = ('execute',)
+
+# スタックの先頭がここにあるスレッドは待機中とみなしてサンプルに含めない
+IDLE_FILES = ('selectors.py', 'threading.py', 'queue.py')
+
+
+def profile_region(name: str):
+    """プロファイリングの対象区間（無効なときは共有のnullcontextを返すだけ）"""
+    if PROFILER is None:
+        return _NULL_REGION
+    return PROFILER.region(name)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """サンプリング方式のCPUプロファイラとtracemallocによる割り当ての記録
+
+    対象区間（ノートの走査・実行）が1つでも動いている間、別スレッドから一定間隔で
+    全スレッドのスタックを採取する。一定間隔（と SIGUSR1 受信時）に、前回からの
+    サンプルを折りたたみ形式（flamegraph.pl / speedscope で読める）と関数ごとの
+    集計レポートとして diagnostics ディレクトリに書き出す。
+    """
+
+    def __init__(self, directory: Path, label: str, sample_interval: Optional[float] = None,
+                 dump_interval: Optional[float] = None, memory_frames: Optional[int] = None,
+                 top: Optional[int] = None):
+        self.directory = directory
+        self.label = label
+        self.sample_interval = sample_interval or Config.PROFILE_SAMPLE_INTERVAL
+        self.dump_interval = dump_interval or Config.PROFILE_DUMP_INTERVAL
+        self.memory_frames = Config.PROFILE_MEMORY_FRAMES if memory_frames is None else memory_frames
+        self.top = top or Config.PROFILE_TOP
+        self.stacks: Counter[Tuple[str, ...]] = collections.Counter()
+        self.idle_samples = 0
+        self.active: Counter[str] = collections.Counter()
+        # 区間ごとの呼び出し回数・合計時間・最大時間
+        self.region_stats: Dict[str, List[float]] = {}
+        self.period_started = time.time()
+        self._last_snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.memory_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.memory_frames)
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        print(f"Profiling enabled: {self.directory}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump('final')
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def region(self, name: str):
+        before = None
+        if name in SNAPSHOT_REGIONS and tracemalloc.is_tracing():
+            before = tracemalloc.take_snapshot()
+        with self._lock:
+            self.active[name] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.active[name] -= 1
+                stats = self.region_stats.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+            if before is not None:
+                self._write_allocation_diff(name, before, elapsed)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        last_dump = time.monotonic()
+        while not self._stop.wait(self.sample_interval):
+            self._sample(own_id)
+            if time.monotonic() - last_dump >= self.dump_interval:
+                last_dump = time.monotonic()
+                try:
+                    self.dump('periodic')
+                except Exception as e:
+                    logger.warning(f"Failed to write profile: {e}")
+
+    def _sample(self, own_id: int):
+        with self._lock:
+            regions = [name for name, active in self.active.items() if active > 0]
+        if not regions:
+            return
+        region_label = '+'.join(sorted(regions))
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            if os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                with self._lock:
+                    self.idle_samples += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(region_label)
+            with self._lock:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def _write_allocation_diff(self, region: str, before, elapsed: float):
+        """区間の前後で増えた割り当てを書き出す"""
+        try:
+            after = tracemalloc.take_snapshot()
+            lines = [f"Allocation growth during {region} ({elapsed:.1f}s)", '']
+            for stat in after.compare_to(before, 'lineno')[:self.top]:
+                lines.append(str(stat))
+            path = self._path(f'alloc-{region}', 'txt')
+            path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+            prune(self.directory)
+        except Exception as e:
+            logger.warning(f"Failed to write allocation report: {e}")
+
+    def _path(self, kind: str, suffix: str) -> Path:
+        timestamp = time.strftime('%Y%m%d-%H%M%S')
+        return self.directory / f"{kind}-{self.label}-{os.getpid()}-{timestamp}.{suffix}"
+
+    def report(self) -> List[str]:
+        """前回の書き出し以降のCPUサンプルと割り当ての集計"""
+        with self._lock:
+            stacks = dict(self.stacks)
+            idle = self.idle_samples
+            region_stats = {name: list(stats) for name, stats in self.region_stats.items()}
+        total = sum(stacks.values())
+        lines = [f"Samples: {total} busy, {idle} idle (every {self.sample_interval * 1000:.0f}ms "
+                 f"since {time.strftime('%H:%M:%S', time.localtime(self.period_started))})", '']
+        lines.append('Regions (calls / total / max):')
+        for name, (calls, elapsed, longest) in sorted(region_stats.items()):
+            lines.append(f"  {name:10} {calls:6d}  {elapsed:9.2f}s  {longest:8.2f}s")
+
+        own: Counter[str] = collections.Counter()
+        inclusive: Counter[str] = collections.Counter()
+        for stack, samples in stacks.items():
+            own[stack[-1]] += samples
+            for label in set(stack[1:]):
+                inclusive[label] += samples
+        for title, counter in (('Top functions (self)', own), ('Top functions (inclusive)', inclusive)):
+            lines += ['', f'{title}:']
+            for label, samples in counter.most_common(self.top):
+                lines.append(f"  {samples / total:6.1%}  {samples:6d}  {label}")
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            lines += ['', f"Traced memory: {current / 1024 / 1024:.1f}MB (peak {peak / 1024 / 1024:.1f}MB)",
+                      '', 'Top allocations:']
+            lines += [f"  {stat}" for stat in snapshot.statistics('lineno')[:self.top]]
+            if self._last_snapshot is not None:
+                lines += ['', 'Growth since previous dump:']
+                lines += [f"  {stat}" for stat in snapshot.compare_to(self._last_snapshot, 'lineno')[:self.top]]
+            self._last_snapshot = snapshot
+        return lines
+
+    def dump(self, reason: str) -> Optional[Path]:
+        """前回からのプロファイルを書き出してカウンタを戻す"""
+        lines = self.report()
+        with self._lock:
+            stacks = dict(self.stacks)
+            self.stacks.clear()
+            self.idle_samples = 0
+            self.region_stats.clear()
+            self.period_started = time.time()
+        self._path(f'profile-{reason}', 'folded').write_text(
+            ''.join(f"{';'.join(stack)} {samples}\n" for stack, samples in stacks.items()), encoding='utf-8'
+        )
+        path = self._path(f'profile-{reason}', 'txt')
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        prune(self.directory)
+        return path
+
+
+def prune(directory: Path, max_files: Optional[int] = None):
+    """古い診断ファイルを削除する"""
+    max_files = max_files or Config.DIAGNOSTICS_MAX_FILES
+    files = sorted(directory.glob('*-*'), key=lambda p: p.stat().st_mtime)
+    for path in files[:-max_files]:
+        path.unlink(missing_ok=True)
+
+
+def start_profiling(label: str) -> Optional[Profiler]:
+    global PROFILER
+    if not Config.PROFILE_ENABLED or PROFILER is not None:
+        return PROFILER
+    PROFILER = Profiler(Config.DIAGNOSTICS_DIR, label)
+    PROFILER.start()
+    return PROFILER
+
+
+def stop_profiling():
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    if profiler is not None:
+        profiler.stop()
+
+
+def dump_diagnostics(label: str) -> Path:
+    """SIGUSR1 で呼ばれる。スレッドとasyncioタスクのスタック、メモリ使用量、
+    （有効なら）ここまでのプロファイルを書き出す"""
+    directory = Config.DIAGNOSTICS_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    path = directory / f"dump-{label}-{os.getpid()}-{timestamp}.txt"
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    lines = [f"Diagnostics dump ({label}, pid {os.getpid()}) at {time.strftime('%Y-%m-%d %H:%M:%S')}",
+             f"Max RSS: {max_rss:.1f}MB", '']
+
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for thread_id, frame in sys._current_frames().items():
+        lines.append(f"Thread {names.get(thread_id, thread_id)}:")
+        lines += [line.rstrip() for line in traceback.format_stack(frame)]
+        lines.append('')
+
+    try:
+        tasks = asyncio.all_tasks()
+    except RuntimeError:
+        tasks = set()
+    for task in sorted(tasks, key=lambda t: t.get_name()):
+        lines.append(f"Task {task.get_name()}: {task.get_coro()}")
+        for frame in task.get_stack(limit=10):
+            lines.append(f"  {_frame_label(frame)} line {frame.f_lineno}")
+    if PROFILER is not None:
+        profile_path = PROFILER.dump('signal')
+        lines += ['', f"Profile: {profile_path}"]
+
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    prune(directory)
+    print(f"Diagnostics written to {path}")
+    return path
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""負荷試験用の `claude` CLI 代替
+
+本物のCLIと同じ stream-json を出力するが、トークンは消費しない。
+`CLAUDE_COMMAND="python -m claude_remote.fake_claude"` と設定すると実行系がこちらを呼び出す。
+
+挙動は FAKE_CLAUDE_* 環境変数（SETTINGS 参照）で指定し、プロンプト中の
+`fake-claude: latency=0.5 exit=129 questions=2` のような指定でノートごとに上書きできる。
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+TOKEN_LIMIT_EXIT_CODE = 129
+
+SETTINGS = {
+    # 指定名: (環境変数, 既定値)
+    'latency': ('FAKE_CLAUDE_LATENCY', 1.0),  # 実行時間（秒）
+    'output': ('FAKE_CLAUDE_OUTPUT_BYTES', 2048),  # ツール結果として出力するバイト数
+    'exit': ('FAKE_CLAUDE_EXIT_CODE', 0),  # 終了コード（129はトークン制限）
+    'questions': ('FAKE_CLAUDE_QUESTIONS', 0),  # 出力する質問の数
+    'tools': ('FAKE_CLAUDE_TOOL_CALLS', 3),  # ツール呼び出し（ターン）数
+    'files': ('FAKE_CLAUDE_WRITE_FILES', 1),  # 作業ディレクトリに書き込むファイル数
+}
+
+DIRECTIVE_PATTERN = re.compile(r'fake-claude\s*:\s*([^\n>]*)')
+
+QUESTION_TEMPLATES = [
+    "Which framework should I use for module {n}?",
+    "What should happen when input {n} is invalid?",
+    "質問: 設定項目{n}の既定値はどうしますか？",
+]
+
+
+def parse_settings(prompt: str, environ: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+    """環境変数とプロンプト中の指定から挙動を決める（プロンプトの指定が優先）"""
+    environ = os.environ if environ is None else environ
+    settings = {}
+    for name, (env_name, default) in SETTINGS.items():
+        settings[name] = type(default)(environ.get(env_name, default))
+
+    for directive in DIRECTIVE_PATTERN.findall(prompt):
+        for item in directive.split():
+            name, _, value = item.partition('=')
+            if name in SETTINGS and value:
+                settings[name] = type(SETTINGS[name][1])(value)
+    return settings
+
+
+def read_prompt(argv: List[str]) -> str:
+    """`--print <prompt>` / `-p <prompt>` またはstdinからプロンプトを取得"""
+    for flag in ('--print', '-p'):
+        if flag in argv:
+            index = argv.index(flag)
+            if index + 1 < len(argv) and not argv[index + 1].startswith('--'):
+                return argv[index + 1]
+    if not sys.stdin.isatty():
+        return sys.stdin.read()
+    return ''
+
+
+def emit(event: Dict):
+    sys.stdout.write(json.dumps(event, ensure_ascii=False) + '\n')
+    sys.stdout.flush()
+
+
+def run(prompt: str, settings: Dict[str, float], cwd: Path) -> int:
+    """stream-jsonイベントを出力し、終了コードを返す"""
+    digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+    session_id = f'fake-{digest[:12]}'
+    tool_calls = max(0, int(settings['tools']))
+    step_delay = max(0.0, settings['latency']) / (tool_calls + 1)
+    chunk = max(0, int(settings['output'])) // max(1, tool_calls)
+    started = time.monotonic()
+
+    emit({'type': 'system', 'subtype': 'init', 'session_id': session_id, 'model': 'fake-claude'})
+
+    for i in range(tool_calls):
+        time.sleep(step_delay)
+        tool_id = f'toolu_{digest[:8]}_{i}'
+        emit({'type': 'assistant', 'message': {'content': [
+            {'type': 'text', 'text': f'Working on step {i + 1} of {tool_calls}.'},
+            {'type': 'tool_use', 'id': tool_id, 'name': 'Bash', 'input': {'command': f'echo step {i + 1}'}},
+        ]}})
+        emit({'type': 'user', 'message': {'content': [
+            {'type': 'tool_result', 'tool_use_id': tool_id, 'content': ('x' * 79 + '\n') * (chunk // 80) + 'x' * (chunk % 80)},
+        ]}})
+
+    for i in range(int(settings['files'])):
+        (cwd / f'fake_output_{i}.txt').write_text(f'{digest}\n{prompt}', encoding='utf-8')
+
+    questions = [
+        QUESTION_TEMPLATES[i % len(QUESTION_TEMPLATES)].format(n=i + 1)
+        for i in range(int(settings['questions']))
+    ]
+    if questions:
+        emit({'type': 'assistant', 'message': {'content': [
+            {'type': 'text', 'text': 'I need some clarification:\n' + '\n'.join(questions)},
+        ]}})
+
+    time.sleep(step_delay)
+    exit_code = int(settings['exit'])
+    if exit_code == TOKEN_LIMIT_EXIT_CODE:
+        result, is_error = 'Claude usage limit reached', True
+    elif exit_code != 0:
+        result, is_error = f'Simulated failure (exit code {exit_code})', True
+    else:
+        result, is_error = f'Completed {tool_calls} step(s) for {session_id}', False
+
+    emit({
+        'type': 'result',
+        'subtype': 'error_during_execution' if is_error else 'success',
+        'is_error': is_error,
+        'result': result,
+        'session_id': session_id,
+        'num_turns': tool_calls + 1,
+        'duration_ms': int((time.monotonic() - started) * 1000),
+        'total_cost_usd': round(0.0001 * (tool_calls + 1), 6),
+        'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': int(settings['output']) // 4},
+    })
+    return exit_code
+
+
+def main():
+    prompt = read_prompt(sys.argv[1:])
+    sys.exit(run(prompt, parse_settings(prompt), Path.cwd()))
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,12 @@ class GitDiffFileWatcher:
         self.git_repo: Optional[git.Repo] = None
         self.file_hashes: Dict[str, str] = {}
         self.recently_modified_by_system: Set[str] = set()  # システムが変更したファイル
+        
+        # 状態取得用のカウンタ（走査・コミットのたびに更新する）
+        self.tracked_files = 0
+        self.commits_created = 0
+        self.last_scan_duration: Optional[float] = None
+        self.last_scan_at: Optional[float] = None
     
         
     def _init_git_repo(self) -> bool:
@@ -72,6 +78,7 @@ class GitDiffFileWatcher:
             
             # コミット実行
             commit = self.git_repo.index.commit(message)
+            self.commits_created += 1
             logger.debug(f"Created commit: {commit.hexsha[:8]} - {message}")
             return True
             
@@ -183,6 +190,10 @@ class GitDiffFileWatcher:
             logger.error(f"Failed to track file {file_path} in Git: {e}")
             return False
     
+    def acknowledge(self, change: Dict):
+        """変更を処理済みとして記録（Gitでの追跡は検知時に行われる）"""
+        self.file_hashes[str(change['file_path'])] = self._get_file_hash(change['file_path'])
+    
     def mark_file_as_system_modified(self, file_path: Path):
         """ファイルがシステムによって変更されたことをマーク"""
         file_path_str = str(file_path)
@@ -233,6 +244,8 @@ class GitDiffFileWatcher:
     async def watch_files(self) -> Optional[Dict]:
         """Git差分ベースのファイル監視"""
         try:
+            started = time.monotonic()
+            seen = 0
             
             # .mdファイルを検索
             for md_file in self.watch_path.rglob("*.md"):
@@ -240,6 +253,7 @@ class GitDiffFileWatcher:
                     return None
                     
                 if md_file.is_file():
+                    seen += 1
                     file_path_str = str(md_file)
                     
                     # システムが最近変更したファイルはスキップ
@@ -265,6 +279,7 @@ class GitDiffFileWatcher:
                             self._track_file_in_git(md_file)
                             
                             logger.info(f"Detected content change in {md_file}")
+                            self._record_scan(started, max(self.tracked_files, seen))
                             
                             return {
                                 'file_path': md_file,
@@ -277,6 +292,8 @@ class GitDiffFileWatcher:
                             logger.error(f"Failed to read file {md_file}: {e}")
                             continue
             
+            self._record_scan(started, seen)
+            
             # 1秒待機
             await asyncio.sleep(1)
             
@@ -286,6 +303,11 @@ class GitDiffFileWatcher:
         
         return None
     
+    def _record_scan(self, started: float, tracked_files: int):
+        self.tracked_files = tracked_files
+        self.last_scan_duration = time.monotonic() - started
+        self.last_scan_at = time.time()
+    
     def start(self) -> bool:
         """監視を開始"""
         if not self._init_git_repo():
@@ -301,28 +323,16 @@ class GitDiffFileWatcher:
         logger.info("Stopped Git diff-based file watching")
     
     def get_status(self) -> Dict:
-        """監視システムの状態を取得"""
-        try:
-            status = {
-                "watch_path": str(self.watch_path),
-                "running": self.running,
-                "git_initialized": self.git_repo is not None,
-                "tracked_files": len([f for f in self.watch_path.rglob("*.md") if f.is_file()]),
-            }
-            
-            if self.git_repo:
-                try:
-                    status.update({
-                        "total_commits": len(list(self.git_repo.iter_commits())) if self.git_repo.heads else 0,
-                        "dirty_files": self.git_repo.is_dirty(untracked_files=True),
-                    })
-                except Exception as e:
-                    status["git_error"] = str(e)
-            else:
-                status["fallback_mode"] = "Using hash-based change detection"
-            
-            return status
-            
-        except Exception as e:
-            logger.error(f"Failed to get status: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+        """監視システムの状態を取得（走査・コミット時に更新したカウンタを返すだけで、Gitには問い合わせない）"""
+        status = {
+            "watch_path": str(self.watch_path),
+            "running": self.running,
+            "git_initialized": self.git_repo is not None,
+            "tracked_files": self.tracked_files,
+            "commits_created": self.commits_created,
+            "last_scan_duration": self.last_scan_duration,
+            "last_scan_at": self.last_scan_at,
+        }
+        if not self.git_repo:
+            status["fallback_mode"] = "Using hash-based change detection"
+        return status
\ No newline at end of file
@@ -8,6 +8,9 @@ from datetime import datetime
 import hashlib
 import logging
 
+from .metrics import count, span
+from .diagnostics import profile_region
+
 # ロガーを設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,6 +24,13 @@ class HashFileWatcher:
         self.file_hashes: Dict[str, str] = {}
         self.recently_modified_by_system: Set[str] = set()  # システムが変更したファイル
         
+        # 状態取得用のカウンタ（走査のたびに更新し、get_statusではファイルシステムに触れない）
+        self.tracked_files = 0
+        self.scan_count = 0
+        self.last_scan_duration: Optional[float] = None
+        self.last_scan_at: Optional[float] = None
+        self.changes_detected = 0
+        
         # キャッシュファイルのパス
         self.cache_dir = Path.home() / '.claude-remote' / 'cache'
         self.cache_file = self.cache_dir / 'file_hashes.json'
@@ -86,21 +96,13 @@ class HashFileWatcher:
             return ""
     
     def _has_content_changed(self, file_path: Path) -> bool:
-        """ファイル内容が実際に変更されたかをチェック"""
-        current_hash = self._get_file_hash(file_path)
-        file_path_str = str(file_path)
-        
-        if file_path_str not in self.file_hashes:
-            self.file_hashes[file_path_str] = current_hash
-            self._save_cache()  # キャッシュを保存
-            return True
-            
-        if current_hash != self.file_hashes[file_path_str]:
-            self.file_hashes[file_path_str] = current_hash
-            self._save_cache()  # キャッシュを保存
-            return True
-            
-        return False
+        """ファイル内容が実際に変更されたかをチェック（キャッシュは更新しない）"""
+        return self._get_file_hash(file_path) != self.file_hashes.get(str(file_path))
+    
+    def acknowledge(self, change: Dict):
+        """変更を処理済みとしてキャッシュに記録（ジョブの永続化後に呼び出す）"""
+        self.file_hashes[str(change['file_path'])] = change['content_hash']
+        self._save_cache()  # キャッシュを保存
     
     def mark_file_as_system_modified(self, file_path: Path):
         """ファイルがシステムによって変更されたことをマーク"""
@@ -120,43 +122,14 @@ class HashFileWatcher:
     async def watch_files(self) -> Optional[Dict]:
         """ハッシュベースのファイル監視"""
         try:
-            # .mdファイルを検索
-            for md_file in self.watch_path.rglob("*.md"):
-                if not self.running:
-                    return None
-                    
-                if md_file.is_file():
-                    file_path_str = str(md_file)
-                    
-                    # システムが最近変更したファイルはスキップ
-                    if file_path_str in self.recently_modified_by_system:
-                        self.recently_modified_by_system.discard(file_path_str)
-                        continue
-                    
-                    # 内容が実際に変更されたかチェック
-                    if self._has_content_changed(md_file):
-                        # ファイル内容を読み込み
-                        try:
-                            with open(md_file, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                            
-                            # 質問追記による変更かチェック
-                            if self._is_question_append_change(md_file, content):
-                                logger.info(f"Skipping question append change in {md_file}")
-                                continue
-                            
-                            logger.info(f"Detected content change in {md_file}")
-                            
-                            return {
-                                'file_path': md_file,
-                                'content': content,
-                                'diff': None,
-                                'change_type': 'content_modified',
-                                'timestamp': datetime.now()
-                            }
-                        except Exception as e:
-                            logger.error(f"Failed to read file {md_file}: {e}")
-                            continue
+            started = time.monotonic()
+            with span('watch_scan'), profile_region('scan'):
+                change = self._scan_for_change()
+            self.scan_count += 1
+            self.last_scan_duration = time.monotonic() - started
+            self.last_scan_at = time.time()
+            if change is not None or not self.running:
+                return change
             
             # 1秒待機
             await asyncio.sleep(1)
@@ -167,6 +140,66 @@ class HashFileWatcher:
         
         return None
     
+    def _scan_for_change(self) -> Optional[Dict]:
+        """監視ディレクトリを走査し、最初に見つかった変更を返す"""
+        # .mdファイルを検索
+        seen = 0
+        for md_file in self.watch_path.rglob("*.md"):
+            if not self.running:
+                return None
+                
+            if md_file.is_file():
+                seen += 1
+                file_path_str = str(md_file)
+                
+                # システムが最近変更したファイルはスキップ
+                if file_path_str in self.recently_modified_by_system:
+                    self.recently_modified_by_system.discard(file_path_str)
+                    continue
+                
+                # 内容が実際に変更されたかチェック
+                if self._has_content_changed(md_file):
+                    # ファイル内容を読み込み（ハッシュは実際に渡す内容から計算する）
+                    try:
+                        with open(md_file, 'rb') as f:
+                            data = f.read()
+                        content_hash = hashlib.md5(data).hexdigest()
+                        try:
+                            content = data.decode('utf-8')
+                        except UnicodeDecodeError as e:
+                            # 読めない内容は記録して、内容が変わるまで読み直さない
+                            logger.error(f"Failed to decode {md_file} as UTF-8, ignoring until it changes: {e}")
+                            self.acknowledge({'file_path': md_file, 'content_hash': content_hash})
+                            continue
+                        change = {
+                            'file_path': md_file,
+                            'content': content,
+                            'content_hash': content_hash,
+                            'diff': None,
+                            'change_type': 'content_modified',
+                            'timestamp': datetime.now()
+                        }
+                        
+                        # 質問追記による変更かチェック
+                        if self._is_question_append_change(md_file, content):
+                            logger.info(f"Skipping question append change in {md_file}")
+                            self.acknowledge(change)
+                            continue
+                        
+                        logger.info(f"Detected content change in {md_file}")
+                        count('change_detected')
+                        self.changes_detected += 1
+                        # 途中で打ち切った走査では前回の件数を下回らない
+                        self.tracked_files = max(self.tracked_files, seen)
+                        
+                        return change
+                    except Exception as e:
+                        logger.error(f"Failed to read file {md_file}: {e}")
+                        continue
+        
+        self.tracked_files = seen
+        return None
+    
     def start(self) -> bool:
         """監視を開始"""
         self.running = True
@@ -183,6 +216,8 @@ class HashFileWatcher:
             if count > 0:
                 self._save_cache()
                 logger.info(f"Built cache for {count} files")
+        # 最初の走査が終わるまではキャッシュの件数を使う
+        self.tracked_files = len(self.file_hashes)
         
         logger.info(f"Started hash-based file watching on {self.watch_path}")
         return True
@@ -195,17 +230,16 @@ class HashFileWatcher:
         logger.info("Stopped hash-based file watching")
     
     def get_status(self) -> Dict:
-        """監視システムの状態を取得"""
-        try:
-            return {
-                "watch_path": str(self.watch_path),
-                "running": self.running,
-                "tracked_files": len([f for f in self.watch_path.rglob("*.md") if f.is_file()]),
-                "cached_hashes": len(self.file_hashes),
-                "detection_method": "hash-based",
-                "cache_file": str(self.cache_file),
-                "cache_exists": self.cache_file.exists()
-            }
-        except Exception as e:
-            logger.error(f"Failed to get status: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+        """監視システムの状態を取得（走査時に更新したカウンタを返すだけで、ファイルシステムには触れない）"""
+        return {
+            "watch_path": str(self.watch_path),
+            "running": self.running,
+            "tracked_files": self.tracked_files,
+            "cached_hashes": len(self.file_hashes),
+            "detection_method": "hash-based",
+            "cache_file": str(self.cache_file),
+            "scan_count": self.scan_count,
+            "last_scan_duration": self.last_scan_duration,
+            "last_scan_at": self.last_scan_at,
+            "changes_detected": self.changes_detected,
+        }
\ No newline at end of file
@@ -0,0 +1,571 @@
+import fcntl
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# 完了状態（保持期間を過ぎたら削除される）
+TERMINAL_STATES = ('finished', 'failed', 'cancelled', 'superseded')
+
+
+def default_worker_id() -> str:
+    """ワーカーIDの既定値（同じホストで再起動したときに前回のリースを回収できるよう固定）"""
+    return Config.WORKER_ID or socket.gethostname()
+
+
+class QueueBackend(ABC):
+    """ジョブキューのバックエンド
+
+    ジョブは enqueued → running → finished / failed / cancelled と遷移する。
+    同じノートの未実行ジョブは新しいジョブで superseded になり、常に最新の内容だけが実行される。
+    ワーカーはジョブをリースして実行し、ハートビートでリースを延長する。
+    リースが切れたジョブ（ワーカーの停止）は enqueued に戻り、他のワーカーが実行する。
+    """
+
+    @abstractmethod
+    def enqueue(self, file_path: Path, content: str, content_hash: Optional[str] = None,
+                detected_at: Optional[float] = None) -> int:
+        """ジョブを永続化し、同じノートの古い未実行ジョブを置き換える"""
+
+    @abstractmethod
+    def supersede_pending(self, file_path: Path):
+        """ノートの未実行ジョブを取り消す（実行中の内容に戻された場合など）"""
+
+    @abstractmethod
+    def running_job(self, file_path: Path) -> Optional[Dict]:
+        """ノートの実行中ジョブを返す（どのワーカーで実行中でもよい）"""
+
+    @abstractmethod
+    def lease(self, worker_id: str) -> Optional[Dict]:
+        """どのワーカーでも実行中でないノートの最も古い未実行ジョブをリースする"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: int, worker_id: str) -> str:
+        """リースを延長し 'ok' / 'cancel'（キャンセル要求あり） / 'lost'（リース喪失）を返す"""
+
+    @abstractmethod
+    def complete(self, job_id: int, worker_id: str, success: bool, summary: Optional[str] = None):
+        """実行結果を報告してジョブを完了させる"""
+
+    @abstractmethod
+    def cancel(self, job_id: int):
+        """ジョブをキャンセル済みにする（プリエンプション）"""
+
+    @abstractmethod
+    def release(self, job_id: int, worker_id: str):
+        """シャットダウンで中断したジョブを未実行に戻す"""
+
+    @abstractmethod
+    def request_cancel(self, job_id: int):
+        """実行中のジョブにキャンセルを要求する（次のハートビートでワーカーに伝わる）"""
+
+    @abstractmethod
+    def clear_cancel(self, job_id: int):
+        """キャンセル要求を取り下げる（完了間近で保護された場合）"""
+
+    @abstractmethod
+    def reclaim_expired(self) -> int:
+        """リースが切れたジョブを再投入（試行回数超過は failed）"""
+
+    @abstractmethod
+    def recover(self, worker_id: str) -> int:
+        """同じワーカーIDで前回異常終了したジョブを再投入し、古い完了済みジョブを削除"""
+
+    @abstractmethod
+    def finished_since(self, timestamp: float) -> List[Dict]:
+        """指定時刻より後に完了したジョブ（ワーカーからの結果報告）を返す"""
+
+    @abstractmethod
+    def list_jobs(self, since: float = 0) -> List[Dict]:
+        """指定時刻以降に登録されたジョブを内容を除いて返す（負荷試験の集計用）"""
+
+    @abstractmethod
+    def record_system_write(self, file_path: Path, content_hash: str):
+        """ワーカーがノートに書き込んだ内容を記録（ディスパッチャーが再実行しないように）"""
+
+    @abstractmethod
+    def is_system_write(self, file_path: Path, content_hash: str) -> bool:
+        """ワーカーが書き込んだ内容と一致するか"""
+
+    @abstractmethod
+    def pending_count(self) -> int:
+        """未実行のジョブ数"""
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    content TEXT NOT NULL,
+    content_hash TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    detected_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_file ON jobs (file_path, state);
+CREATE TABLE IF NOT EXISTS system_writes (
+    file_path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+"""
+
+# 既存のジャーナルに後から追加した列
+LEASE_COLUMNS = {
+    'lease_owner': 'TEXT',
+    'lease_expires_at': 'REAL',
+    'cancel_requested': 'INTEGER NOT NULL DEFAULT 0',
+    'started_at': 'REAL',
+}
+
+# 一覧取得で返す列（ノート内容は含めない）
+SUMMARY_COLUMNS = ('id', 'file_path', 'state', 'attempts', 'detected_at', 'created_at',
+                   'started_at', 'updated_at', 'lease_owner', 'summary')
+
+
+class SQLiteJobQueue(QueueBackend):
+    """SQLite（WALモード）による永続ジョブキュー
+
+    複数プロセスから同じデータベースを開けるため、同一ホスト上のワーカーや
+    ローカルでの分散構成の検証に使える。
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or Config.JOB_DB_PATH
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None,
+                                    timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # コミット済みのジョブが電源断でも失われないようにする
+        self.conn.execute('PRAGMA synchronous=FULL')
+        self.conn.executescript(SCHEMA)
+        existing = {row['name'] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+        for column, definition in LEASE_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {definition}')
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def enqueue(self, file_path: Path, content: str, content_hash: Optional[str] = None,
+                detected_at: Optional[float] = None) -> int:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'superseded', updated_at = ? "
+                "WHERE file_path = ? AND state = 'enqueued'",
+                (now, str(file_path))
+            )
+            cursor = conn.execute(
+                "INSERT INTO jobs (file_path, content, content_hash, state, detected_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'enqueued', ?, ?, ?)",
+                (str(file_path), content, content_hash, detected_at or now, now, now)
+            )
+        logger.debug(f"Enqueued job {cursor.lastrowid} for {file_path}")
+        return cursor.lastrowid
+
+    def supersede_pending(self, file_path: Path):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'superseded', updated_at = ? "
+                "WHERE file_path = ? AND state = 'enqueued'",
+                (time.time(), str(file_path))
+            )
+
+    def running_job(self, file_path: Path) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE file_path = ? AND state = 'running' ORDER BY id DESC LIMIT 1",
+                (str(file_path),)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def lease(self, worker_id: str) -> Optional[Dict]:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'enqueued' AND file_path NOT IN "
+                "(SELECT file_path FROM jobs WHERE state = 'running') ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'running', lease_owner = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1, cancel_requested = 0, started_at = ?, updated_at = ? WHERE id = ?",
+                (worker_id, now + Config.LEASE_SECONDS, now, now, row['id'])
+            )
+            # 更新後の状態（リースの所有者・試行回数）を返す
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        return dict(row)
+
+    def heartbeat(self, job_id: int, worker_id: str) -> str:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT state, lease_owner, cancel_requested FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None or row['state'] != 'running' or row['lease_owner'] != worker_id:
+                return 'lost'
+            conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ?",
+                (time.time() + Config.LEASE_SECONDS, job_id)
+            )
+        return 'cancel' if row['cancel_requested'] else 'ok'
+
+    def _finish(self, job_id: int, state: str, summary: Optional[str] = None,
+                worker_id: Optional[str] = None):
+        query = ("UPDATE jobs SET state = ?, updated_at = ?, summary = COALESCE(?, summary), "
+                 "lease_expires_at = NULL WHERE id = ? AND state = 'running'")
+        params: list = [state, time.time(), summary, job_id]
+        if worker_id is not None:
+            # リースを失ったワーカーの報告は無視する（他のワーカーが再実行中）
+            query += " AND lease_owner = ?"
+            params.append(worker_id)
+        with self._transaction() as conn:
+            conn.execute(query, params)
+
+    def complete(self, job_id: int, worker_id: str, success: bool, summary: Optional[str] = None):
+        self._finish(job_id, 'finished' if success else 'failed', (summary or '')[:500], worker_id)
+
+    def cancel(self, job_id: int):
+        self._finish(job_id, 'cancelled')
+
+    def release(self, job_id: int, worker_id: str):
+        self._finish(job_id, 'enqueued', worker_id=worker_id)
+
+    def request_cancel(self, job_id: int):
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND state = 'running'", (job_id,))
+
+    def clear_cancel(self, job_id: int):
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 0 WHERE id = ?", (job_id,))
+
+    def _requeue_running(self, conn: sqlite3.Connection, condition: str, params: tuple) -> int:
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', updated_at = ?, summary = 'Too many interrupted attempts' "
+            f"WHERE state = 'running' AND attempts >= ? AND {condition}",
+            (now, Config.MAX_JOB_ATTEMPTS) + params
+        )
+        cursor = conn.execute(
+            f"UPDATE jobs SET state = 'enqueued', updated_at = ? WHERE state = 'running' AND {condition}",
+            (now,) + params
+        )
+        return cursor.rowcount
+
+    def reclaim_expired(self) -> int:
+        with self._transaction() as conn:
+            # 以前のバージョンから移行したDBにはリース期限のない実行中ジョブがある
+            # （ファイルシステム版と同じく期限切れとして扱う）
+            return self._requeue_running(conn, 'COALESCE(lease_expires_at, 0) < ?', (time.time(),))
+
+    def recover(self, worker_id: str) -> int:
+        with self._transaction() as conn:
+            recovered = self._requeue_running(conn, '(lease_owner = ? OR lease_owner IS NULL)', (worker_id,))
+            # 完了済みジョブは保持期間を過ぎたら削除
+            placeholders = ', '.join('?' for _ in TERMINAL_STATES)
+            conn.execute(
+                f"DELETE FROM jobs WHERE state IN ({placeholders}) AND updated_at < ?",
+                TERMINAL_STATES + (time.time() - Config.JOB_RETENTION_DAYS * 86400,)
+            )
+        return recovered
+
+    def finished_since(self, timestamp: float) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, file_path, state, summary, lease_owner, updated_at FROM jobs "
+                "WHERE state IN ('finished', 'failed') AND updated_at > ? ORDER BY updated_at",
+                (timestamp,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_jobs(self, since: float = 0) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM jobs WHERE created_at >= ? ORDER BY id",
+                (since,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_system_write(self, file_path: Path, content_hash: str):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO system_writes (file_path, content_hash) VALUES (?, ?)",
+                (str(file_path), content_hash)
+            )
+
+    def is_system_write(self, file_path: Path, content_hash: str) -> bool:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM system_writes WHERE file_path = ? AND content_hash = ?",
+                (str(file_path), content_hash)
+            ).fetchone()
+        return row is not None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'enqueued'").fetchone()[0]
+
+
+class FileSystemJobQueue(QueueBackend):
+    """共有ディレクトリ上のJSONファイルによるジョブキュー
+
+    ジョブごとに `jobs/<id>.json` を置き、操作はロックファイル（flock）で排他する。
+    書き込みは一時ファイルからのrenameでアトミックに行う。
+    """
+
+    def __init__(self, queue_path: Optional[Path] = None):
+        self.queue_path = queue_path or Config.QUEUE_PATH
+        self.jobs_dir = self.queue_path / 'jobs'
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_file = self.queue_path / '.lock'
+        self.counter_file = self.queue_path / 'next_id'
+        self.system_writes_file = self.queue_path / 'system_writes.json'
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._thread_lock, open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_json(self, path: Path, data):
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _job_path(self, job_id: int) -> Path:
+        return self.jobs_dir / f'{job_id:010d}.json'
+
+    def _load(self, job_id: int) -> Optional[Dict]:
+        try:
+            with open(self._job_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, job: Dict):
+        job['updated_at'] = time.time()
+        self._write_json(self._job_path(job['id']), job)
+
+    def _all_jobs(self) -> List[Dict]:
+        jobs = []
+        for path in sorted(self.jobs_dir.glob('*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable job file {path}: {e}")
+        return jobs
+
+    def _supersede(self, file_path: str):
+        for job in self._all_jobs():
+            if job['file_path'] == file_path and job['state'] == 'enqueued':
+                job['state'] = 'superseded'
+                self._save(job)
+
+    def enqueue(self, file_path: Path, content: str, content_hash: Optional[str] = None,
+                detected_at: Optional[float] = None) -> int:
+        now = time.time()
+        with self._locked():
+            self._supersede(str(file_path))
+            job_id = int(self.counter_file.read_text()) if self.counter_file.exists() else 1
+            self._write_json(self.counter_file, job_id + 1)
+            self._save({
+                'id': job_id,
+                'file_path': str(file_path),
+                'content': content,
+                'content_hash': content_hash,
+                'state': 'enqueued',
+                'attempts': 0,
+                'detected_at': detected_at or now,
+                'created_at': now,
+                'summary': None,
+                'lease_owner': None,
+                'lease_expires_at': None,
+                'cancel_requested': 0,
+                'started_at': None,
+            })
+        logger.debug(f"Enqueued job {job_id} for {file_path}")
+        return job_id
+
+    def supersede_pending(self, file_path: Path):
+        with self._locked():
+            self._supersede(str(file_path))
+
+    def running_job(self, file_path: Path) -> Optional[Dict]:
+        with self._locked():
+            running = [j for j in self._all_jobs() if j['file_path'] == str(file_path) and j['state'] == 'running']
+        return running[-1] if running else None
+
+    def lease(self, worker_id: str) -> Optional[Dict]:
+        with self._locked():
+            jobs = self._all_jobs()
+            busy = {j['file_path'] for j in jobs if j['state'] == 'running'}
+            for job in jobs:
+                if job['state'] == 'enqueued' and job['file_path'] not in busy:
+                    now = time.time()
+                    job.update({
+                        'state': 'running',
+                        'lease_owner': worker_id,
+                        'lease_expires_at': now + Config.LEASE_SECONDS,
+                        'attempts': job['attempts'] + 1,
+                        'cancel_requested': 0,
+                        'started_at': now,
+                    })
+                    self._save(job)
+                    return job
+        return None
+
+    def heartbeat(self, job_id: int, worker_id: str) -> str:
+        with self._locked():
+            job = self._load(job_id)
+            if job is None or job['state'] != 'running' or job['lease_owner'] != worker_id:
+                return 'lost'
+            job['lease_expires_at'] = time.time() + Config.LEASE_SECONDS
+            self._save(job)
+        return 'cancel' if job['cancel_requested'] else 'ok'
+
+    def _finish(self, job_id: int, state: str, summary: Optional[str] = None,
+                worker_id: Optional[str] = None):
+        with self._locked():
+            job = self._load(job_id)
+            if job is None or job['state'] != 'running':
+                return
+            # リースを失ったワーカーの報告は無視する（他のワーカーが再実行中）
+            if worker_id is not None and job['lease_owner'] != worker_id:
+                return
+            job['state'] = state
+            job['lease_expires_at'] = None
+            if summary is not None:
+                job['summary'] = summary
+            self._save(job)
+
+    def complete(self, job_id: int, worker_id: str, success: bool, summary: Optional[str] = None):
+        self._finish(job_id, 'finished' if success else 'failed', (summary or '')[:500], worker_id)
+
+    def cancel(self, job_id: int):
+        self._finish(job_id, 'cancelled')
+
+    def release(self, job_id: int, worker_id: str):
+        self._finish(job_id, 'enqueued', worker_id=worker_id)
+
+    def _set_cancel_requested(self, job_id: int, value: int):
+        with self._locked():
+            job = self._load(job_id)
+            if job is not None and (job['state'] == 'running' or not value):
+                job['cancel_requested'] = value
+                self._save(job)
+
+    def request_cancel(self, job_id: int):
+        self._set_cancel_requested(job_id, 1)
+
+    def clear_cancel(self, job_id: int):
+        self._set_cancel_requested(job_id, 0)
+
+    def _requeue_running(self, predicate: Callable[[Dict], bool]) -> int:
+        recovered = 0
+        for job in self._all_jobs():
+            if job['state'] != 'running' or not predicate(job):
+                continue
+            if job['attempts'] >= Config.MAX_JOB_ATTEMPTS:
+                job['state'] = 'failed'
+                job['summary'] = 'Too many interrupted attempts'
+            else:
+                job['state'] = 'enqueued'
+                recovered += 1
+            self._save(job)
+        return recovered
+
+    def reclaim_expired(self) -> int:
+        now = time.time()
+        with self._locked():
+            return self._requeue_running(lambda j: (j['lease_expires_at'] or 0) < now)
+
+    def recover(self, worker_id: str) -> int:
+        cutoff = time.time() - Config.JOB_RETENTION_DAYS * 86400
+        with self._locked():
+            recovered = self._requeue_running(lambda j: j['lease_owner'] in (worker_id, None))
+            # 完了済みジョブは保持期間を過ぎたら削除
+            for job in self._all_jobs():
+                if job['state'] in TERMINAL_STATES and job['updated_at'] < cutoff:
+                    self._job_path(job['id']).unlink(missing_ok=True)
+        return recovered
+
+    def finished_since(self, timestamp: float) -> List[Dict]:
+        with self._locked():
+            jobs = [j for j in self._all_jobs()
+                    if j['state'] in ('finished', 'failed') and j['updated_at'] > timestamp]
+        return sorted(jobs, key=lambda j: j['updated_at'])
+
+    def list_jobs(self, since: float = 0) -> List[Dict]:
+        with self._locked():
+            return [{column: job.get(column) for column in SUMMARY_COLUMNS}
+                    for job in self._all_jobs() if job['created_at'] >= since]
+
+    def _load_system_writes(self) -> Dict[str, str]:
+        try:
+            with open(self.system_writes_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def record_system_write(self, file_path: Path, content_hash: str):
+        with self._locked():
+            writes = self._load_system_writes()
+            writes[str(file_path)] = content_hash
+            self._write_json(self.system_writes_file, writes)
+
+    def is_system_write(self, file_path: Path, content_hash: str) -> bool:
+        with self._locked():
+            return self._load_system_writes().get(str(file_path)) == content_hash
+
+    def pending_count(self) -> int:
+        with self._locked():
+            return sum(1 for j in self._all_jobs() if j['state'] == 'enqueued')
+
+
+def create_job_queue() -> QueueBackend:
+    """設定（QUEUE_BACKEND）に応じたキューバックエンドを作成"""
+    if Config.QUEUE_BACKEND == 'sqlite':
+        return SQLiteJobQueue()
+    if Config.QUEUE_BACKEND == 'filesystem':
+        return FileSystemJobQueue()
+    raise ValueError(f"Unknown QUEUE_BACKEND: {Config.QUEUE_BACKEND}")
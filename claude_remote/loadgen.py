@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""合成Vaultのノートを一定レートで書き換え、監視→キュー→実行→通知のパイプライン全体を計測する負荷生成ツール
+
+Claude CLIの代わりに fake_claude を、Slackの代わりにローカルのWebhookスタブを使うため
+トークンは消費しない。
+
+    python -m claude_remote.loadgen --notes 20 --rate 2 --duration 60 --latency 1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import resource
+import shlex
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import fake_claude
+from .config import Config
+from .main import ClaudeRemote
+
+
+class _WebhookStub(BaseHTTPRequestHandler):
+    """Slack Webhookの代わりに通知を受け取って数える"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            self.server.received += 1
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_webhook_stub() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _WebhookStub)
+    server.received = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure(workdir: Path, webhook_url: str, args: argparse.Namespace):
+    """全ての保存先を作業ディレクトリに向け、実行系を fake_claude に差し替える"""
+    os.environ['HOME'] = str(workdir / 'home')  # ハッシュキャッシュ・結果キャッシュの保存先
+    os.environ['FAKE_CLAUDE_LATENCY'] = str(args.latency)
+    os.environ['FAKE_CLAUDE_OUTPUT_BYTES'] = str(args.output_bytes)
+
+    Config.GDRIVE_MOUNT_PATH = workdir / 'vault'
+    Config.PROJECTS_DIR = workdir / 'projects'
+    Config.SLACK_WEBHOOK_URL = webhook_url
+    Config.JOB_DB_PATH = workdir / 'jobs.db'
+    Config.QUEUE_PATH = workdir / 'queue'
+    Config.METRICS_FILE = workdir / 'metrics.prom'
+    Config.SLACK_OUTBOX_PATH = workdir / 'outbox.jsonl'
+    Config.CLAUDE_COMMAND = shlex.join([sys.executable, fake_claude.__file__])
+    Config.MAX_CONCURRENT_EXECUTIONS = args.slots
+    # ホストの負荷で同時実行数が変わると計測結果を比較できないため固定する
+    Config.ADMISSION_CONTROL_ENABLED = False
+    Config.TOKEN_RETRY_INTERVAL = 1
+    Config.MAX_TOKEN_RETRIES = 1
+    Config.GDRIVE_MOUNT_PATH.mkdir(parents=True, exist_ok=True)
+
+
+def render_note(index: int, revision: int, rng: random.Random, args: argparse.Namespace) -> str:
+    """ノートの内容を生成（一定の割合で失敗・トークン制限・質問を指定）"""
+    directives = []
+    roll = rng.random()
+    if roll < args.error_rate:
+        directives.append('exit=1')
+    elif roll < args.error_rate + args.token_limit_rate:
+        directives.append(f'exit={fake_claude.TOKEN_LIMIT_EXIT_CODE}')
+    if rng.random() < args.question_rate:
+        directives.append('questions=2')
+    lines = [f'# Load test note {index}', '', f'Revision {revision}: implement feature {index}-{revision}.']
+    if directives:
+        lines.append(f'fake-claude: {" ".join(directives)}')
+    return '\n'.join(lines) + '\n'
+
+
+async def mutate_vault(vault: Path, args: argparse.Namespace, rng: random.Random) -> int:
+    """指定レートでランダムなノートを書き換え、書き換え回数を返す"""
+    revisions: Dict[int, int] = {}
+    interval = 1.0 / args.rate
+    deadline = time.monotonic() + args.duration
+    writes = 0
+    while time.monotonic() < deadline:
+        index = rng.randrange(args.notes)
+        revisions[index] = revisions.get(index, 0) + 1
+        note = vault / f'note_{index:03d}.md'
+        note.write_text(render_note(index, revisions[index], rng, args), encoding='utf-8')
+        writes += 1
+        await asyncio.sleep(interval)
+    return writes
+
+
+def rss_mb() -> float:
+    """現在の常駐メモリ（MB）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def sample_usage(app, samples: List[Dict], stop: asyncio.Event, interval: float = 0.5):
+    """実行スロットの使用数・キュー長・メモリを定期的に記録"""
+    while not stop.is_set():
+        samples.append({
+            'running': len(app.worker.running),
+            'pending': app.job_queue.pending_count(),
+            'rss_mb': rss_mb(),
+        })
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近傍順位法によるパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(jobs: List[Dict], samples: List[Dict], writes: int, notifications: int,
+              elapsed: float, slots: int) -> Dict:
+    states: Dict[str, int] = {}
+    for job in jobs:
+        states[job['state']] = states.get(job['state'], 0) + 1
+    completed = [j for j in jobs if j['state'] in ('finished', 'failed')]
+    queue_wait = [j['started_at'] - j['detected_at'] for j in jobs if j['started_at']]
+    end_to_end = [j['updated_at'] - j['detected_at'] for j in completed]
+    running = [s['running'] for s in samples]
+
+    def latency(values: List[float]) -> Dict:
+        return {
+            'mean': statistics.mean(values) if values else None,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'max': max(values) if values else None,
+        }
+
+    return {
+        'elapsed_s': elapsed,
+        'note_writes': writes,
+        'jobs': len(jobs),
+        'states': states,
+        'throughput_jobs_per_min': len(completed) / elapsed * 60 if elapsed else 0,
+        'queue_wait_s': latency(queue_wait),
+        'end_to_end_s': latency(end_to_end),
+        'slot_usage': {
+            'slots': slots,
+            'mean': statistics.mean(running) / slots if running else 0,
+            'peak': max(running) if running else 0,
+            'max_pending': max((s['pending'] for s in samples), default=0),
+        },
+        'notifications': notifications,
+        'memory_mb': {
+            'rss_peak': max((s['rss_mb'] for s in samples), default=rss_mb()),
+            'max_rss_self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'max_rss_children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        },
+    }
+
+
+async def run_load(args: argparse.Namespace) -> Dict:
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='claude-remote-loadgen-'))
+    webhook = start_webhook_stub()
+    configure(workdir, f'http://127.0.0.1:{webhook.server_address[1]}/', args)
+
+    app = ClaudeRemote()
+    rng = random.Random(args.seed)
+    samples: List[Dict] = []
+    sampling_done = asyncio.Event()
+
+    log = sys.stdout if args.verbose else io.StringIO()
+    if not args.verbose:
+        logging.getLogger('claude_remote').setLevel(logging.WARNING)
+    with contextlib.redirect_stdout(log):
+        started = time.time()
+        app_task = asyncio.create_task(app.run())
+        sampler = asyncio.create_task(sample_usage(app, samples, sampling_done))
+        await asyncio.sleep(1.5)  # 監視の開始を待つ
+        writes = await mutate_vault(Config.GDRIVE_MOUNT_PATH, args, rng)
+
+        # 最後の書き換えが検知・実行されるまで待つ
+        deadline = time.monotonic() + args.drain_timeout
+        idle_checks = 0
+        while time.monotonic() < deadline and idle_checks < 3:
+            await asyncio.sleep(1)
+            idle = not app.worker.running and app.job_queue.pending_count() == 0
+            idle_checks = idle_checks + 1 if idle else 0
+        elapsed = time.time() - started
+
+        sampling_done.set()
+        await sampler
+        jobs = app.job_queue.list_jobs(since=started)
+        app.shutdown_event.set()
+        await app_task
+
+    webhook.shutdown()
+    report = summarize(jobs, samples, writes, webhook.received, elapsed, args.slots)
+    report['workdir'] = str(workdir)
+    return report
+
+
+def print_report(report: Dict):
+    def fmt(value: Optional[float]) -> str:
+        return '-' if value is None else f'{value:.2f}'
+
+    print(f"Elapsed:        {report['elapsed_s']:.1f}s (work dir: {report['workdir']})")
+    print(f"Note writes:    {report['note_writes']}")
+    print(f"Jobs:           {report['jobs']} "
+          + ' '.join(f"{state}={n}" for state, n in sorted(report['states'].items())))
+    print(f"Throughput:     {report['throughput_jobs_per_min']:.1f} jobs/min")
+    for key, label in (('queue_wait_s', 'Queue wait'), ('end_to_end_s', 'End to end')):
+        stats = report[key]
+        print(f"{label + ':':<16}mean {fmt(stats['mean'])}s  p50 {fmt(stats['p50'])}s  "
+              f"p95 {fmt(stats['p95'])}s  max {fmt(stats['max'])}s")
+    slots = report['slot_usage']
+    print(f"Slot usage:     mean {slots['mean']:.0%} of {slots['slots']}, peak {slots['peak']}, "
+          f"max pending {slots['max_pending']}")
+    print(f"Notifications:  {report['notifications']}")
+    memory = report['memory_mb']
+    print(f"Memory:         RSS peak {memory['rss_peak']:.1f}MB, "
+          f"max RSS children {memory['max_rss_children']:.1f}MB")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='claude-remote-loadgen', description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=10, help='合成Vaultのノート数')
+    parser.add_argument('--rate', type=float, default=1.0, help='1秒あたりのノート書き換え回数')
+    parser.add_argument('--duration', type=float, default=30, help='書き換えを続ける秒数')
+    parser.add_argument('--slots', type=int, default=Config.MAX_CONCURRENT_EXECUTIONS, help='同時実行数')
+    parser.add_argument('--latency', type=float, default=1.0, help='fake_claudeの実行時間（秒）')
+    parser.add_argument('--output-bytes', type=int, default=2048, help='fake_claudeの出力量')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='失敗（exit 1）させる割合')
+    parser.add_argument('--token-limit-rate', type=float, default=0.0, help='トークン制限（exit 129）にする割合')
+    parser.add_argument('--question-rate', type=float, default=0.0, help='質問を出力させる割合')
+    parser.add_argument('--drain-timeout', type=float, default=60, help='書き換え終了後に完了を待つ最大秒数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--workdir', help='作業ディレクトリ（既定は一時ディレクトリ）')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    parser.add_argument('--verbose', action='store_true', help='パイプラインのログを表示')
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    report = asyncio.run(run_load(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
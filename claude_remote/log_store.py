@@ -0,0 +1,218 @@
+import fcntl
+import gzip
+import json
+import os
+import shutil
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LogStore:
+    """プロジェクトごとの実行ログ保存
+
+    実行中は `execution_<run_id>.log` に書き込み、完了後にgzip圧縮する。
+    件数・経過日数・合計サイズで古いログを削除し、各実行の概要を
+    `index.json` に保持するため、ログファイルを開かずに最近の実行を一覧できる。
+    インデックスの更新はロックファイル（flock）で排他する（分割タスクや複数のワーカーが
+    同じプロジェクトに書き込むため）。
+    """
+
+    def __init__(self, logs_dir: Path):
+        self.logs_dir = logs_dir
+        self.index_file = logs_dir / 'index.json'
+        self.lock_file = logs_dir / 'index.lock'
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_index(self) -> List[Dict]:
+        try:
+            if self.index_file.exists():
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to load log index {self.index_file}: {e}")
+        return []
+
+    def _save_index(self, entries: List[Dict]):
+        """インデックスをアトミックに保存"""
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.index_file)
+
+    def start_run(self) -> Tuple[str, Path]:
+        """新しい実行を登録し、実行IDと書き込み先のログファイルを返す"""
+        with self._locked():
+            entries = self._load_index()
+            if self._interrupt_stale(entries):
+                entries = self._apply_retention(entries)
+            run_id, log_file = self._new_run(entries)
+            self._save_index(entries)
+        return run_id, log_file
+
+    def _new_run(self, entries: List[Dict]) -> Tuple[str, Path]:
+        known_ids = {e['run_id'] for e in entries}
+
+        base_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        run_id = base_id
+        suffix = 1
+        while run_id in known_ids or (self.logs_dir / f'execution_{run_id}.log').exists():
+            run_id = f'{base_id}_{suffix}'
+            suffix += 1
+
+        log_file = self.logs_dir / f'execution_{run_id}.log'
+        log_file.touch()
+
+        entries.append({
+            'run_id': run_id,
+            'started_at': time.time(),
+            'finished_at': None,
+            'status': 'running',
+            'exit_code': None,
+            'file': log_file.name,
+            'size': 0,
+            'summary': None,
+        })
+        return run_id, log_file
+
+    def _interrupt_stale(self, entries: List[Dict]) -> int:
+        """異常終了で 'running' のまま残った実行を 'interrupted' にしてログを圧縮する
+
+        開始とログの最終更新がどちらも CLAUDE_TIMEOUT より前のものを対象にする
+        （実行中ならタイムアウトで終わっているはずの時間）。
+        """
+        now = time.time()
+        interrupted = 0
+        for entry in entries:
+            if entry['status'] != 'running' or now - entry['started_at'] < Config.CLAUDE_TIMEOUT:
+                continue
+            log_file = self.logs_dir / entry['file']
+            try:
+                if now - log_file.stat().st_mtime < Config.CLAUDE_TIMEOUT:
+                    continue
+                if Config.LOG_COMPRESSION == 'gzip' and log_file.suffix != '.gz':
+                    log_file = self._compress(log_file)
+                size = log_file.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            except Exception as e:
+                logger.error(f"Failed to compress {log_file}: {e}")
+                size = log_file.stat().st_size if log_file.exists() else 0
+            entry.update({
+                'finished_at': now,
+                'status': 'interrupted',
+                'file': log_file.name,
+                'size': size,
+                'summary': 'Interrupted (process stopped before the run finished)',
+            })
+            interrupted += 1
+        if interrupted:
+            logger.info(f"Marked {interrupted} stale run(s) as interrupted in {self.index_file}")
+        return interrupted
+
+    def finish_run(self, run_id: str, status: str, exit_code: Optional[int] = None,
+                   summary: Optional[str] = None, extra: Optional[Dict] = None):
+        """実行完了を記録し、ログを圧縮して保持ポリシーを適用"""
+        # 圧縮はこの実行のログだけが対象なので、インデックスのロックの外で行う
+        log_file = self.logs_dir / f'execution_{run_id}.log'
+        if Config.LOG_COMPRESSION == 'gzip' and log_file.exists():
+            try:
+                log_file = self._compress(log_file)
+            except Exception as e:
+                logger.error(f"Failed to compress {log_file}: {e}")
+        elif not log_file.exists():
+            log_file = log_file.with_name(log_file.name + '.gz')
+
+        with self._locked():
+            entries = self._load_index()
+            entry = next((e for e in entries if e['run_id'] == run_id), None)
+            if entry is None:
+                logger.warning(f"Run {run_id} not found in log index")
+                return
+
+            entry.update({
+                'finished_at': time.time(),
+                'status': status,
+                'exit_code': exit_code,
+                'file': log_file.name,
+                'size': log_file.stat().st_size if log_file.exists() else 0,
+                'summary': (summary or '')[:500],
+            })
+            if extra:
+                entry.update(extra)
+
+            self._save_index(self._apply_retention(entries))
+
+    def _compress(self, log_file: Path) -> Path:
+        """ログファイルをgzip圧縮して元ファイルを削除"""
+        compressed = log_file.with_name(log_file.name + '.gz')
+        with open(log_file, 'rb') as src, gzip.open(compressed, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        log_file.unlink()
+        return compressed
+
+    def _apply_retention(self, entries: List[Dict]) -> List[Dict]:
+        """件数・経過日数・合計サイズの上限を超えた完了済みログを古い順に削除"""
+        now = time.time()
+        max_age = Config.LOG_RETENTION_DAYS * 86400
+        kept: List[Dict] = []
+        total_bytes = 0
+
+        # 新しい順に走査し、上限内に収まるものだけ残す
+        for entry in reversed(entries):
+            if entry['status'] == 'running':
+                kept.append(entry)
+                continue
+            expired = (
+                len(kept) >= Config.LOG_RETENTION_COUNT
+                or now - (entry.get('finished_at') or now) > max_age
+                or total_bytes + entry.get('size', 0) > Config.LOG_RETENTION_BYTES
+            )
+            if expired:
+                try:
+                    (self.logs_dir / entry['file']).unlink()
+                except FileNotFoundError:
+                    pass
+                logger.debug(f"Pruned log {entry['file']}")
+                continue
+            total_bytes += entry.get('size', 0)
+            kept.append(entry)
+
+        kept.reverse()
+        return kept
+
+    def list_runs(self, limit: Optional[int] = None) -> List[Dict]:
+        """最近の実行を新しい順に返す（ログファイルは開かない）"""
+        entries = list(reversed(self._load_index()))
+        return entries[:limit] if limit else entries
+
+    def last_failure(self) -> Optional[Dict]:
+        """直近の失敗した実行を返す"""
+        return next((e for e in self.list_runs() if e['status'] not in ('running', 'success')), None)
+
+    def read_log(self, run_id: str) -> str:
+        """実行ログの内容を読み込む（圧縮済みでも可）"""
+        entry = next((e for e in self._load_index() if e['run_id'] == run_id), None)
+        if entry is None:
+            raise KeyError(run_id)
+        log_file = self.logs_dir / entry['file']
+        opener = gzip.open if log_file.suffix == '.gz' else open
+        with opener(log_file, 'rt', encoding='utf-8') as f:
+            return f.read()
@@ -1,36 +1,74 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
+import json
+import os
 import signal
+import subprocess
 import sys
+import tempfile
+import time
 from pathlib import Path
-from typing import Dict
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 
 from .config import Config
 from .hash_file_watcher import HashFileWatcher
 from .project_manager import ProjectManager
 from .claude_executor import ClaudeExecutor
 from .slack_notifier import SlackNotifier
+from .notification_dispatcher import QueueForwarder
+from .job_queue import create_job_queue
+from .worker import SystemWriteRecorder, Worker
+from .metrics import count, flush_periodically
+from .diagnostics import dump_diagnostics, start_profiling, stop_profiling
+from .archive import format_bytes, try_lock_archiver
+from .status import StatusServer, record_error
 
 class ClaudeRemote:
-    def __init__(self):
+    """ノート監視（ディスパッチャー）とジョブ実行（ワーカー）
+
+    role が 'all' なら1プロセスで両方を動かし、'dispatcher' / 'worker' なら
+    共有キューを介して別ノード・別プロセスに分けて動かす。notification_queue を渡すと
+    通知は自分では送らず、通知プロセスに渡す（PROCESS_MODE=multi）。
+    """
+    
+    def __init__(self, role: str = 'all', notification_queue=None):
         # 設定検証
         Config.validate()
+        self.role = role
         
         # コンポーネント初期化
-        self.file_watcher = HashFileWatcher(Config.GDRIVE_MOUNT_PATH)
-        self.project_manager = ProjectManager(Config.PROJECTS_DIR)
-        self.slack_notifier = SlackNotifier()
-        self.claude_executor = ClaudeExecutor(self.project_manager, self.slack_notifier, self.file_watcher)
-        
-        # 実行管理
-        self.executor_pool = ThreadPoolExecutor(max_workers=Config.MAX_CONCURRENT_EXECUTIONS)
-        self.running_tasks: Dict[str, asyncio.Task] = {}
+        self.job_queue = create_job_queue()
+        self.file_watcher = HashFileWatcher(Config.GDRIVE_MOUNT_PATH) if role != 'worker' else None
+        self.worker = None
+        if role != 'dispatcher':
+            self.project_manager = ProjectManager(Config.PROJECTS_DIR, Config.ARCHIVE_DIR)
+            if notification_queue is not None:
+                self.slack_notifier = SlackNotifier(dispatcher=QueueForwarder(notification_queue))
+            else:
+                self.slack_notifier = SlackNotifier()
+            # ワーカー専用ノードではノートへの書き込みをキュー経由でディスパッチャーに伝える
+            system_writes = self.file_watcher or SystemWriteRecorder(self.job_queue)
+            self.claude_executor = ClaudeExecutor(self.project_manager, self.slack_notifier, system_writes)
+            self.worker = Worker(self.job_queue, self.claude_executor)
+        
+        self.status_server = StatusServer(self) if Config.STATUS_ENABLED else None
         self.shutdown_event = asyncio.Event()
         
     async def process_file_changes(self):
+        last_maintenance = time.monotonic()
+        last_report = time.time()
         while not self.shutdown_event.is_set():
             try:
+                # 期限切れリースの回収とワーカーからの結果報告
+                if time.monotonic() - last_maintenance >= Config.HEARTBEAT_INTERVAL:
+                    last_maintenance = time.monotonic()
+                    reclaimed = self.job_queue.reclaim_expired()
+                    if reclaimed:
+                        print(f"Reclaimed {reclaimed} job(s) with expired leases")
+                    if self.worker is None:
+                        last_report = self._report_results(last_report)
+                
                 # ファイル変更を監視（タイムアウト付き）
                 change = await asyncio.wait_for(
                     self.file_watcher.watch_files(),
@@ -39,74 +77,328 @@ class ClaudeRemote:
                 
                 if change is None:
                     continue
-                    
-                # 実行タスクを作成
-                file_path = change['file_path']
-                task_key = str(file_path)
-                
-                # 既存のタスクが実行中の場合はスキップ
-                if task_key in self.running_tasks and not self.running_tasks[task_key].done():
-                    print(f"Task for {file_path} is already running, skipping...")
-                    continue
                 
-                print(f"Processing file change: {file_path}")
-                
-                # 新しいタスクを作成
-                task = asyncio.create_task(
-                    self.claude_executor.execute(
-                        file_path,
-                        change['content'],
-                        change.get('diff')
-                    )
-                )
-                
-                self.running_tasks[task_key] = task
-                
-                # タスク完了時のクリーンアップ
-                task.add_done_callback(lambda t: self.running_tasks.pop(task_key, None))
+                await self._accept_change(change)
                 
             except asyncio.TimeoutError:
                 # タイムアウトは正常（シャットダウンチェックのため）
                 continue
             except Exception as e:
                 print(f"Error processing file changes: {e}")
+                record_error('watcher', str(e))
                 await asyncio.sleep(1)  # エラー時は少し待機
     
+    async def _accept_change(self, change: Dict):
+        """変更をジョブとして永続化してから監視キャッシュに反映"""
+        file_path = change['file_path']
+        task_key = str(file_path)
+        
+        # ワーカーノードが書き込んだ内容（質問の追記など）は実行しない
+        if change.get('content_hash') and self.job_queue.is_system_write(file_path, change['content_hash']):
+            print(f"Skipping change written by a worker: {task_key}")
+            count('change_skipped', reason='system_write')
+            self._acknowledge(change)
+            return
+        
+        running_job = self.job_queue.running_job(file_path)
+        decision = None
+        if running_job is not None:
+            decision, reason = ClaudeExecutor.compare_prompts(running_job['content'], change['content'])
+            if decision == 'ignore':
+                print(f"Ignoring change for {task_key}: {reason}")
+                count('change_skipped', reason='unchanged')
+                self.job_queue.supersede_pending(file_path)
+                self._acknowledge(change)
+                return
+        
+        # ジョブがコミットされるまで変更は「検知済み」にしない
+        job_id = self.job_queue.enqueue(
+            file_path,
+            change['content'],
+            change.get('content_hash'),
+            change['timestamp'].timestamp()
+        )
+        self._acknowledge(change)
+        print(f"Queued job {job_id} for {file_path}")
+        
+        if running_job is None:
+            if self.worker is not None:
+                self.worker.fill_slots()
+        elif Config.PREEMPT_ENABLED and decision == 'preempt':
+            # 実行中のワーカーが次のハートビートでキャンセルする（完了間近なら保護される）
+            print(f"Requesting preemption of job {running_job['id']} for {task_key}: {reason}")
+            self.job_queue.request_cancel(running_job['id'])
+            if self.worker is not None:
+                await self.worker.heartbeat()
+        else:
+            # 実行完了後に最新の内容で実行する
+            print(f"Deferring change for {task_key}: {reason}")
+            count('change_deferred')
+    
+    def _acknowledge(self, change: Dict):
+        if hasattr(self.file_watcher, 'acknowledge'):
+            self.file_watcher.acknowledge(change)
+    
+    def _note_is_busy(self, source: str) -> bool:
+        return self.job_queue.running_job(Path(source)) is not None
+    
+    async def archive_periodically(self):
+        """使われていないプロジェクトを定期的にコールド層へ退避する
+        
+        同じ退避先を使うワーカーが複数ある場合（PROCESS_WORKERS>1 など）は、ロックを取れた
+        1プロセスだけが退避する（そのプロセスが終われば次の確認で他のプロセスが引き継ぐ）。
+        """
+        archiver_lock = None
+        try:
+            while not self.shutdown_event.is_set():
+                if archiver_lock is None:
+                    archiver_lock = try_lock_archiver(Config.ARCHIVE_DIR)
+                if archiver_lock is not None:
+                    try:
+                        report = await asyncio.to_thread(
+                            self.project_manager.archive_idle_projects, Config.ARCHIVE_IDLE_DAYS, self._note_is_busy
+                        )
+                        if report.archived or report.skipped:
+                            print(report.format())
+                    except Exception as e:
+                        print(f"Error archiving idle projects: {e}")
+                try:
+                    await asyncio.wait_for(self.shutdown_event.wait(), timeout=Config.ARCHIVE_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if archiver_lock is not None:
+                archiver_lock.close()
+    
+    def _report_results(self, since: float) -> float:
+        """ワーカーから報告された実行結果を表示し、最新の報告時刻を返す"""
+        for job in self.job_queue.finished_since(since):
+            print(f"Job {job['id']} {job['state']} on {job['lease_owner']}: {job['file_path']}")
+            count('job_result', state=job['state'])
+            since = max(since, job['updated_at'])
+        return since
+    
     async def run(self):
-        print(f"Claude Remote started")
-        print(f"Watching: {Config.GDRIVE_MOUNT_PATH}")
-        print(f"Projects: {Config.PROJECTS_DIR}")
+        print(f"Claude Remote started ({self.role})")
+        if self.file_watcher is not None:
+            print(f"Watching: {Config.GDRIVE_MOUNT_PATH}")
+        if self.worker is not None:
+            print(f"Worker: {self.worker.worker_id}")
+            print(f"Projects: {Config.PROJECTS_DIR}")
+        print(f"Queue: {Config.QUEUE_BACKEND}")
+        print(f"Metrics: {Config.METRICS_FILE}")
         print("Press Ctrl+C to stop")
         
+        # kill -USR1 でスレッド・タスクのスタック（とプロファイル）を書き出す
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, dump_diagnostics, self.role)
+        start_profiling(self.role)
+        
+        # メトリクスファイルを定期的に書き出す
+        metrics_task = asyncio.create_task(
+            flush_periodically(Config.METRICS_FILE, Config.METRICS_FLUSH_INTERVAL, self.shutdown_event)
+        )
+        
+        # 前回中断したジョブを再投入
+        if self.worker is not None:
+            recovered = self.worker.recover()
+            if recovered:
+                print(f"Recovered {recovered} interrupted job(s)")
+        
         try:
-            # ファイル監視を開始
-            self.file_watcher.start()
-            # ファイル変更処理を開始
-            await self.process_file_changes()
+            loops = []
+            if self.status_server is not None:
+                await self.status_server.start()
+                loops.append(self.status_server.refresh_periodically(self.shutdown_event))
+            if self.file_watcher is not None:
+                # ファイル監視を開始
+                self.file_watcher.start()
+                loops.append(self.process_file_changes())
+            if self.worker is not None:
+                loops.append(self.worker.run(self.shutdown_event))
+                if Config.ARCHIVE_AUTO:
+                    loops.append(self.archive_periodically())
+            await asyncio.gather(*loops)
         except asyncio.CancelledError:
             pass
         finally:
             print("\nShutting down...")
             # クリーンアップ
-            self.file_watcher.stop()
+            if self.file_watcher is not None:
+                self.file_watcher.stop()
+            
+            # 実行中のタスクをキャンセル（ジョブは再投入される）
+            self.shutdown_event.set()
+            if self.worker is not None:
+                await self.worker.stop()
+                # 未送信の通知を送り切る
+                await asyncio.to_thread(self.slack_notifier.close)
             
-            # 実行中のタスクをキャンセル
-            if self.running_tasks:
-                print("Cancelling running tasks...")
-                for task in self.running_tasks.values():
-                    if not task.done():
-                        task.cancel()
-                # キャンセル完了を待機
-                await asyncio.gather(*self.running_tasks.values(), return_exceptions=True)
+            if self.status_server is not None:
+                await self.status_server.close()
             
-            self.executor_pool.shutdown(wait=False)
+            # 最終的なメトリクスを書き出す
+            await asyncio.gather(metrics_task, return_exceptions=True)
+            self.job_queue.close()
+            stop_profiling()
     
     def shutdown(self):
         print("\nShutting down Claude Remote...")
         self.shutdown_event.set()
-        self.file_watcher.stop()
+        if self.file_watcher is not None:
+            self.file_watcher.stop()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='claude-remote', description='Obsidianのメモを元にClaude Codeを自動実行')
+    parser.add_argument('--profile', action='store_true',
+                        help=f'走査と実行をプロファイルして {Config.DIAGNOSTICS_DIR} に書き出す（PROFILE_ENABLED）')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('run', help='ノート監視とジョブ実行を1プロセスで行う（既定）')
+    subparsers.add_parser('dispatcher', help='ノートを監視して共有キューにジョブを登録する')
+    subparsers.add_parser('worker', help='共有キューからジョブをリースして実行する')
+    archive_parser = subparsers.add_parser('archive', help='使われていないプロジェクトをコールド層に退避する')
+    archive_parser.add_argument('--idle-days', type=float, default=Config.ARCHIVE_IDLE_DAYS,
+                                help='最後の実行からこの日数が経ったプロジェクトを退避する')
+    archive_parser.add_argument('--dry-run', action='store_true', help='退避せずに対象と削減量を表示する')
+    archive_parser.add_argument('--list', action='store_true', help='退避済みのプロジェクトを表示する')
+    archive_parser.add_argument('--restore', metavar='SOURCE', help='指定したノートのプロジェクトを展開して戻す')
+    startup_parser = subparsers.add_parser('startup-time', help='起動時間（モジュール読み込みと初期化）を計測する')
+    startup_parser.add_argument('--role', choices=['all', 'dispatcher', 'worker'], default='all', help='計測する起動モード')
+    startup_parser.add_argument('--runs', type=int, default=5, help='計測回数（中央値を採用）')
+    startup_parser.add_argument('--budget-ms', type=float, default=Config.STARTUP_BUDGET_MS,
+                                help='この時間を超えたら終了コード1')
+    startup_parser.add_argument('--top', type=int, default=10, help='表示する読み込みの遅いモジュール数')
+    return parser
+
+# 新しいインタプリタで計測する（読み込み済みモジュールの影響を受けないように）
+STARTUP_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import claude_remote.main as main
+imported = time.perf_counter()
+error = None
+try:
+    app = main.ClaudeRemote(sys.argv[1])
+    app.job_queue.close()
+except Exception as e:
+    error = str(e)
+print(json.dumps({"import_ms": (imported - started) * 1000,
+                  "init_ms": (time.perf_counter() - imported) * 1000, "error": error}))
+'''
+
+def measure_startup(role: str) -> Dict:
+    """インタプリタ起動から初期化完了までの時間と、モジュールごとの読み込み時間を返す
+    
+    計測用のプロセスは一時ディレクトリを使う（稼働中のサービスのアウトボックスを読み込んで
+    未送信の通知を送ったり、ジョブDB・プロジェクトを作ったりしないように）。
+    """
+    with tempfile.TemporaryDirectory(prefix='claude-remote-startup-') as tmp:
+        env = dict(
+            os.environ,
+            HOME=tmp,
+            SLACK_OUTBOX_PATH=os.path.join(tmp, 'outbox.jsonl'),
+            JOB_DB_PATH=os.path.join(tmp, 'jobs.db'),
+            QUEUE_PATH=os.path.join(tmp, 'queue'),
+            PROJECTS_DIR=os.path.join(tmp, 'projects'),
+            ARCHIVE_DIR=os.path.join(tmp, 'projects', '.archive'),
+        )
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_PROBE, role],
+            capture_output=True, text=True, timeout=60, env=env
+        )
+        total_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'probe failed')
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    # "import time: self [us] | cumulative | module" の木構造（子が親より先に出力される）から、
+    # このパッケージの各モジュール自身の時間と、それが読み込む外部モジュールの累積時間を集める
+    imports = []
+    children: Dict[int, List] = {}
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0].split(':')[1]), int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2].strip()
+        depth = (len(parts[2]) - len(parts[2].lstrip()) - 1) // 2
+        own_children = children.pop(depth + 1, [])
+        if name.startswith('claude_remote'):
+            imports.append((name, self_us / 1000))
+            imports += [(child, us / 1000) for child, us in own_children if not child.startswith('claude_remote')]
+        children.setdefault(depth, []).append((name, cumulative_us))
+    result.update(total_ms=total_ms, imports=imports)
+    return result
+
+def run_startup_time(args: argparse.Namespace):
+    """`startup-time` サブコマンド"""
+    samples = [measure_startup(args.role) for _ in range(max(1, args.runs))]
+    samples.sort(key=lambda sample: sample['total_ms'])
+    median = samples[len(samples) // 2]
+    
+    print(f"Startup ({args.role}, median of {len(samples)}): {median['total_ms']:.0f}ms total, "
+          f"{median['import_ms']:.0f}ms imports, {median['init_ms']:.0f}ms initialization")
+    print("Slowest imports:")
+    for module, ms in sorted(median['imports'], key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:7.1f}ms  {module}")
+    
+    errors = {sample['error'] for sample in samples if sample['error']}
+    if errors:
+        # 初期化が途中で失敗した時間は起動時間として当てにならない
+        for error in errors:
+            print(f"Initialization failed: {error}")
+        sys.exit(1)
+    if median['total_ms'] > args.budget_ms:
+        print(f"Over budget: {median['total_ms']:.0f}ms > {args.budget_ms:.0f}ms")
+        sys.exit(1)
+    print(f"Within budget ({args.budget_ms:.0f}ms)")
+
+def run_archive(args: argparse.Namespace):
+    """`archive` サブコマンド"""
+    project_manager = ProjectManager(Config.PROJECTS_DIR, Config.ARCHIVE_DIR)
+    if args.list:
+        records = project_manager.archived_projects()
+        for record in records:
+            archived_at = time.strftime('%Y-%m-%d', time.localtime(record.archived_at))
+            print(f"{record.name}  {format_bytes(record.original_bytes)} -> {format_bytes(record.archived_bytes)}"
+                  f"  {archived_at}  {record.source_file}")
+        total = sum(record.reclaimed_bytes for record in records)
+        print(f"{len(records)} archived project(s), {format_bytes(total)} reclaimed")
+        return
+    if args.restore:
+        source = Path(args.restore).expanduser().resolve()
+        project_path = project_manager.get_project_by_source(source)
+        if project_path is None:
+            print(f"No project for {source}")
+            sys.exit(1)
+        print(f"Project: {project_path}")
+        return
+    
+    job_queue = create_job_queue()
+    try:
+        report = project_manager.archive_idle_projects(
+            args.idle_days, lambda source: job_queue.running_job(Path(source)) is not None, dry_run=args.dry_run
+        )
+    finally:
+        job_queue.close()
+    print(report.format(dry_run=args.dry_run))
 
 def main():
+    args = build_parser().parse_args()
+    if args.command == 'archive':
+        run_archive(args)
+        return
+    if args.command == 'startup-time':
+        run_startup_time(args)
+        return
+    role = {'dispatcher': 'dispatcher', 'worker': 'worker'}.get(args.command, 'all')
+    if args.profile:
+        # 別プロセスモードの子プロセスにも環境変数で伝える
+        os.environ['PROFILE_ENABLED'] = 'true'
+        Config.PROFILE_ENABLED = True
+    
     # 初回実行時の設定
     if not Path('.env').exists() and Path('.env.example').exists():
         print("First run detected. Creating .env file from .env.example")
@@ -137,8 +429,14 @@ def main():
         print("Especially set your SLACK_WEBHOOK_URL")
         return
     
+    # 監視・実行・通知を別プロセスで動かす
+    if role == 'all' and Config.PROCESS_MODE == 'multi':
+        from .supervisor import Supervisor
+        Supervisor().run()
+        return
+    
     # シグナルハンドリング
-    app = ClaudeRemote()
+    app = ClaudeRemote(role)
     
     def signal_handler(signum, frame):
         print(f"\nReceived signal {signum}, shutting down...")
@@ -0,0 +1,190 @@
+import asyncio
+import bisect
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# 秒単位のレイテンシ用バケット（スキャンの数msからClaude実行の30分まで）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ''
+    escaped = (
+        '{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in items
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Counter:
+    """単調増加カウンタ"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in self.values.items():
+                lines.append(f'{self.name}{_format_labels(key)} {value}')
+        return lines
+
+
+class Histogram:
+    """累積バケット方式のヒストグラム"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [各バケットの件数..., 合計値, 件数]
+        self.values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.setdefault(key, [0] * (len(self.buckets) + 2))
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_format_labels(key, ("le", repr(float(bound))))} {cumulative}')
+                lines.append(f'{self.name}_bucket{_format_labels(key, ("le", "+Inf"))} {series[-1]}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {series[-2]}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {series[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスを保持し、Prometheusテキスト形式で出力する"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = Counter(name, help_text)
+            return self.metrics[name]
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, help_text, buckets)
+            return self.metrics[name]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Path):
+        """メトリクスファイルをアトミックに書き出す（node_exporterのtextfile collector互換）"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+SPAN_DURATION = REGISTRY.histogram(
+    'claude_remote_span_duration_seconds',
+    'Duration of pipeline stages (scan, dispatch, execution, question check, notification)'
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    'claude_remote_stage_latency_seconds',
+    'Latency from change detection to each pipeline milestone'
+)
+EVENTS = REGISTRY.counter('claude_remote_events_total', 'Pipeline events by kind and outcome')
+PROMPT_TOKENS = REGISTRY.histogram(
+    'claude_remote_prompt_tokens',
+    'Estimated prompt size in tokens before and after compaction',
+    buckets=(100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """処理区間の所要時間を計測"""
+    start = time.monotonic()
+    status = 'ok'
+    try:
+        yield
+    except asyncio.CancelledError:
+        status = 'cancelled'
+        raise
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        SPAN_DURATION.observe(time.monotonic() - start, span=name, status=status)
+
+
+def record_stage(stage: str, detected_at: Optional[float]):
+    """変更検知時刻から各段階（開始・完了・通知）までの経過時間を記録"""
+    if detected_at is not None:
+        STAGE_LATENCY.observe(max(0.0, time.time() - detected_at), stage=stage)
+
+
+def record_prompt_tokens(original: int, compacted: int):
+    """ノートのトークン数（推定）と圧縮後のトークン数を記録"""
+    PROMPT_TOKENS.observe(original, stage='original')
+    PROMPT_TOKENS.observe(compacted, stage='compacted')
+
+
+def count(event: str, **labels):
+    """イベントの発生回数を記録"""
+    EVENTS.inc(event=event, **labels)
+
+
+async def flush_periodically(path: Path, interval: float, stop_event: asyncio.Event):
+    """停止されるまで一定間隔でメトリクスファイルを書き出す"""
+    while not stop_event.is_set():
+        try:
+            REGISTRY.write(path)
+        except Exception as e:
+            logger.warning(f"Failed to write metrics file {path}: {e}")
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+    REGISTRY.write(path)
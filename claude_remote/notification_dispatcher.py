@@ -0,0 +1,430 @@
+import collections
+import queue
+import random
+import threading
+import time
+import logging
+from dataclasses import asdict, dataclass, field
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .config import Config
+from .metrics import count, span
+from .outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+# 実行の終わりを表す通知（保留中の開始通知を取り消す）
+TERMINAL_KINDS = ('complete', 'cached', 'error')
+
+# 送信済みの行がこの件数を超えたらアウトボックスを書き直す
+OUTBOX_COMPACT_EVERY = 100
+
+
+@dataclass
+class Notification:
+    message: Dict
+    kind: str = 'message'
+    key: Optional[str] = None  # 同じ実行の通知をまとめるためのキー
+    summary: str = ''  # ダイジェストに載せる1行
+    id: int = 0
+    created_at: float = field(default_factory=time.time)
+    due: float = field(default_factory=time.monotonic, compare=False)
+
+    def to_record(self) -> Dict:
+        record = asdict(self)
+        del record['due']
+        return record
+
+
+class RateLimiter:
+    """トークンバケット（rate 件/秒、最大 burst 件まで連続送信）"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """次の1件を送れるまでの秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 or self.rate <= 0 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        """Retry-After の間は送信しない"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After（秒数またはHTTP日付）を秒数に変換"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class NotificationDispatcher:
+    """Webhookへの送信をバックグラウンドスレッドで行う
+
+    `submit` はキューに積むだけで戻るため、Webhookが遅い・応答しない場合でも
+    イベントループ（監視・実行）は止まらない。送信は1本のSessionで接続を使い回し、
+    接続エラー・5xx・429は指数バックオフ（429はRetry-After）で再試行する。
+
+    Webhookはチャンネルごとに発行されるため、1つのディスパッチャーが1チャンネルに対応し、
+    送信レートはここで制限する。制限で溜まった同じ種類の通知はダイジェストにまとめ、
+    `hold` 秒以内に同じ実行が終わった開始通知は送らない。
+
+    アウトボックスを指定すると通知はディスクにも保存され、ネットワークが使えない間は
+    送信を間隔を空けて試し続ける。再起動後は未送信の通知から順に送る。保存（fsync）は
+    送信スレッドで行い、保存し終えた通知から送信対象にする。
+    """
+
+    def __init__(self, webhook_url: str, max_queue: Optional[int] = None,
+                 timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 rate: Optional[float] = None, burst: Optional[int] = None,
+                 digest: Optional[Callable[[str, List[str]], Dict]] = None,
+                 outbox_path: Optional[Path] = None):
+        self.webhook_url = webhook_url
+        self.timeout = (Config.SLACK_CONNECT_TIMEOUT, timeout or Config.SLACK_TIMEOUT)
+        self.max_retries = Config.SLACK_MAX_RETRIES if max_retries is None else max_retries
+        self.max_queue = max_queue or Config.SLACK_QUEUE_SIZE
+        self.limiter = RateLimiter(
+            Config.SLACK_RATE_LIMIT if rate is None else rate,
+            Config.SLACK_RATE_BURST if burst is None else burst,
+        )
+        self.digest = digest
+        self._session = None
+
+        self._pending: Deque[Notification] = collections.deque()
+        self._held: Dict[str, Notification] = {}  # 送信を遅らせている開始通知
+        # アウトボックスへの書き込み待ち（通知と開始通知の保留時間）
+        self._unpersisted: List[Tuple[Notification, Optional[float]]] = []
+        self._sending = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._closed = threading.Event()
+        self._offline_failures = 0
+        self._next_id = 1
+
+        self.outbox = Outbox.open(outbox_path) if outbox_path else None
+        if self.outbox is not None:
+            self._restore_outbox()
+
+    def _restore_outbox(self):
+        """前回送れなかった通知を読み戻す（期限切れ・完了済みの実行の開始通知は捨てる）"""
+        records = self.outbox.load()
+        cutoff = time.time() - Config.SLACK_OUTBOX_MAX_AGE
+        stale = 0
+        for record in records:
+            self._next_id = max(self._next_id, record['id'] + 1)
+            if record['created_at'] < cutoff:
+                stale += 1
+                continue
+            notification = Notification(**record)
+            # 開始通知は後続の完了通知で取り消せるよう、保留扱いで読み込む
+            self._enqueue(notification, hold=0 if notification.kind == 'start' else None)
+        self.outbox.compact(self._queued_records())
+        restored = len(self._pending) + len(self._held)
+        if restored or stale:
+            logger.info(f"Restored {restored} unsent notification(s) from outbox, dropped {stale} stale")
+        if restored:
+            self._ensure_started()
+
+    def _queued_records(self) -> List[Dict]:
+        queued = list(self._pending) + list(self._held.values())
+        return [n.to_record() for n in sorted(queued, key=lambda n: n.id)]
+
+    @property
+    def session(self):
+        """最初の送信時に作る（requestsの読み込みを起動時に払わない）"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.headers['Content-Type'] = 'application/json'
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            self._session = session
+        return self._session
+
+    @property
+    def backlog(self) -> int:
+        """送信待ち（保留中の開始通知を含む）の件数"""
+        return len(self._pending) + len(self._held) + len(self._unpersisted)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='slack-dispatcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, message: Dict, kind: str = 'message', key: Optional[str] = None,
+               summary: str = '', hold: float = 0) -> bool:
+        """送信キューに積む（キューが満杯なら最も古い通知を捨てる）"""
+        with self._cond:
+            if self._closing:
+                return False
+            notification = Notification(message, kind, key, summary, id=self._next_id)
+            self._next_id += 1
+            if self.outbox is not None:
+                # 呼び出し元（イベントループ）ではfsyncしない
+                self._unpersisted.append((notification, hold if hold > 0 else None))
+            else:
+                self._enqueue(notification, hold if hold > 0 else None)
+            self._ensure_started()
+            self._cond.notify()
+        return True
+
+    def _persist(self):
+        """受け付けた通知をアウトボックスに書き込んでから送信キューに移す（送信スレッドで呼ぶ）"""
+        with self._cond:
+            incoming, self._unpersisted = self._unpersisted, []
+        if not incoming:
+            return
+        self.outbox.append([notification.to_record() for notification, _ in incoming])
+        with self._cond:
+            if self._closing:
+                # 保存済みなので次回起動時に送る
+                return
+            for notification, hold in incoming:
+                self._enqueue(notification, hold)
+            self._cond.notify_all()
+
+    def _enqueue(self, notification: Notification, hold: Optional[float]):
+        """ロック内で呼ぶ（hold が None でなければ開始通知として保留する）"""
+        key = notification.key
+        held = self._held.pop(key, None) if key else None
+        if held is not None:
+            if notification.kind in TERMINAL_KINDS:
+                # すぐに終わった実行の開始通知は送らない
+                count('notification', result='collapsed')
+                self._ack([held])
+            else:
+                self._pending.append(held)
+        while self._pending and len(self._pending) + len(self._held) >= self.max_queue:
+            logger.warning("Notification queue is full, dropping the oldest message")
+            count('notification', result='dropped')
+            self._ack([self._pending.popleft()])
+        if hold is not None and key:
+            notification.due = time.monotonic() + hold
+            self._held[key] = notification
+        else:
+            self._pending.append(notification)
+
+    def _ack(self, notifications: List[Notification]):
+        """送信済み（または破棄した）通知をアウトボックスから消す"""
+        if self.outbox is None:
+            return
+        self.outbox.ack(n.id for n in notifications)
+        if self.outbox.acked_since_compaction >= OUTBOX_COMPACT_EVERY:
+            self.outbox.compact(self._queued_records())
+
+    def _release_due(self, now: float):
+        released = False
+        for key, notification in list(self._held.items()):
+            if notification.due <= now or self._closing:
+                del self._held[key]
+                self._pending.append(notification)
+                released = True
+        if released:
+            # 保留していた開始通知を本来の順番に戻す
+            self._pending = collections.deque(sorted(self._pending, key=lambda n: n.id))
+
+    def _next_batch(self) -> Optional[List[Notification]]:
+        """送信できる通知を取り出す（ロック内で呼ぶ。終了時はNone、先に保存する通知があれば空）"""
+        while True:
+            if self._unpersisted:
+                return []
+            now = time.monotonic()
+            self._release_due(now)
+            wait = self.limiter.wait_time() if self._pending else None
+            if self._pending and wait <= 0:
+                break
+            if self._closing and not self._pending and not self._held:
+                return None
+            timeouts = [n.due - now for n in self._held.values()]
+            if wait is not None:
+                timeouts.append(wait)
+            self._cond.wait(max(0.01, min(timeouts)) if timeouts else None)
+
+        head = self._pending.popleft()
+        batch = [head]
+        if self.digest is not None and head.kind != 'message':
+            same = [n for n in self._pending if n.kind == head.kind]
+            if len(same) + 1 >= Config.SLACK_DIGEST_MIN:
+                batch += same
+                self._pending = collections.deque(n for n in self._pending if n.kind != head.kind)
+        self.limiter.acquire()
+        self._sending += 1
+        return batch
+
+    def _run(self):
+        while True:
+            if self.outbox is not None:
+                self._persist()
+            with self._cond:
+                batch = self._next_batch()
+            if batch is None:
+                return
+            if not batch:
+                continue
+            result = 'failed'
+            try:
+                if len(batch) == 1:
+                    result = self.deliver(batch[0].message)
+                else:
+                    count('notification_digest', kind=batch[0].kind)
+                    result = self.deliver(self.digest(batch[0].kind, [n.summary for n in batch]))
+            except Exception as e:
+                logger.error(f"Unexpected error in notification dispatcher: {e}")
+            finally:
+                with self._cond:
+                    self._sending -= 1
+                    self._finish_batch(batch, result)
+                    self._cond.notify_all()
+
+    def _finish_batch(self, batch: List[Notification], result: str):
+        """送信結果を反映（ロック内で呼ぶ）"""
+        if result != 'failed' or self.outbox is None:
+            self._offline_failures = 0
+            self._ack(batch)
+            return
+        if self._closing:
+            # 次回起動時にアウトボックスから送る
+            return
+        # オフラインの間は先頭に戻して、間隔を広げながら再送する
+        self._pending.extendleft(reversed(batch))
+        delay = min(Config.SLACK_OFFLINE_RETRY_MAX, 5 * 2 ** self._offline_failures)
+        self._offline_failures += 1
+        self.limiter.block(delay)
+        logger.warning(f"Webhook unreachable, keeping {len(self._pending)} notification(s) in outbox, "
+                       f"next attempt in {delay:.0f}s")
+
+    def deliver(self, message: Dict) -> str:
+        """1件を送信（失敗時は再試行）し、'sent' / 'rejected' / 'failed' を返す"""
+        from requests import RequestException
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                with span('slack_send'):
+                    response = self.session.post(self.webhook_url, json=message, timeout=self.timeout)
+                if response.status_code == 200:
+                    count('notification', result='sent')
+                    return 'sent'
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if retry_after is not None:
+                        self.limiter.block(retry_after)
+                    count('notification_rate_limited')
+                elif response.status_code < 500:
+                    logger.error(f"Slack rejected message: {response.status_code} {response.text[:200]}")
+                    count('notification', result='rejected')
+                    return 'rejected'
+                reason = f"HTTP {response.status_code}"
+            except RequestException as e:
+                reason = str(e)
+
+            if attempt == self.max_retries:
+                break
+            if retry_after is not None:
+                delay = retry_after
+            else:
+                delay = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+            logger.warning(f"Failed to send Slack message ({reason}), retrying in {delay:.1f}s")
+            count('notification_retry')
+            if self._closed.wait(delay):
+                break
+
+        print(f"Failed to send Slack message: {reason}")
+        count('notification', result='failed')
+        return 'failed'
+
+    def flush(self, timeout: float) -> bool:
+        """保留中の開始通知も含めて送り切るまで最大 timeout 秒待つ"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            for notification in self._held.values():
+                notification.due = 0
+            self._cond.notify_all()
+            while self._pending or self._held or self._sending or self._unpersisted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        """残りを送信してからスレッドを止める（時間切れの分はアウトボックスに残すか破棄）"""
+        timeout = Config.SLACK_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        if self._thread is not None and self._thread.is_alive():
+            if not self.flush(timeout):
+                with self._cond:
+                    unsent = self.backlog
+                if self.outbox is not None:
+                    logger.warning(f"Keeping {unsent} unsent notification(s) in outbox until next start")
+                else:
+                    logger.warning(f"Dropping {unsent} unsent notification(s) at shutdown")
+        with self._cond:
+            self._closing = True
+            self._pending.clear()
+            self._held.clear()
+            self._cond.notify_all()
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        if self.outbox is not None:
+            # 送信スレッドが保存し終えていない通知
+            with self._cond:
+                incoming, self._unpersisted = self._unpersisted, []
+            self.outbox.append([notification.to_record() for notification, _ in incoming])
+            self.outbox.close()
+        if self._session is not None:
+            self._session.close()
+
+
+class QueueForwarder:
+    """別プロセスの通知プロセスへプロセス間キューで通知を渡す（NotificationDispatcherと同じ呼び出し方）"""
+
+    def __init__(self, notification_queue):
+        self.notification_queue = notification_queue
+
+    @property
+    def backlog(self) -> int:
+        try:
+            return self.notification_queue.qsize()
+        except NotImplementedError:
+            return 0
+
+    def submit(self, message: Dict, kind: str = 'message', key: Optional[str] = None,
+               summary: str = '', hold: float = 0) -> bool:
+        try:
+            self.notification_queue.put_nowait(
+                {'message': message, 'kind': kind, 'key': key, 'summary': summary, 'hold': hold}
+            )
+        except queue.Full:
+            logger.warning("Notifier process is not keeping up, dropping message")
+            count('notification', result='dropped')
+            return False
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        pass
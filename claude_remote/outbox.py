@@ -0,0 +1,91 @@
+import fcntl
+import json
+import os
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """未送信の通知を保存する追記型のJSONLファイル
+
+    通知は1行ずつ追記してfsyncし（届いた分をまとめて1回）、送信できたものは `{"ack": [...]}` 行で記録する。
+    再起動時は未確認の通知を順番どおりに読み戻す。送信済み・期限切れの行は
+    `compact` で書き直して取り除く。同じファイルを使えるのは1プロセスだけで、
+    ロックが取れない場合は None を返す `open` を使う。
+    """
+
+    def __init__(self, path: Path, lock_file):
+        self.path = path
+        self._lock_file = lock_file
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.acked_since_compaction = 0
+
+    @classmethod
+    def open(cls, path: Path) -> Optional['Outbox']:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(path.with_name(path.name + '.lock'), 'w')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logger.warning(f"Notification outbox {path} is in use by another process, notifications will not persist")
+            return None
+        return cls(path, lock_file)
+
+    def load(self) -> List[Dict]:
+        """未確認の通知を追記順に返す（書きかけの末尾行は無視する）"""
+        records: Dict[int, Dict] = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'ack' in entry:
+                        for record_id in entry['ack']:
+                            records.pop(record_id, None)
+                    elif 'id' in entry:
+                        records[entry['id']] = entry
+        except FileNotFoundError:
+            pass
+        return sorted(records.values(), key=lambda r: r['id'])
+
+    def _write(self, *entries: Dict):
+        if self._file.closed:
+            # 終了後に届いた送信結果は記録しない（次回起動時に再送される）
+            return
+        self._file.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, records: List[Dict]):
+        """通知をまとめて追記する（fsyncは1回）"""
+        if records:
+            self._write(*records)
+
+    def ack(self, record_ids: Iterable[int]):
+        record_ids = list(record_ids)
+        if record_ids:
+            self._write({'ack': record_ids})
+            self.acked_since_compaction += len(record_ids)
+
+    def compact(self, records: List[Dict]):
+        """未送信の通知だけを残してファイルを書き直す"""
+        tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.acked_since_compaction = 0
+
+    def close(self):
+        self._file.close()
+        self._lock_file.close()
@@ -1,87 +1,374 @@
+import fcntl
+import hashlib
 import json
+import os
 import shutil
+import tarfile
+import threading
+import time
+import logging
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .project_metadata import ProjectInfo, ProjectMetadataStore, write_json_atomic
+from . import archive
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = '.project_index.json'
+LOCK_FILE_NAME = '.project_index.lock'
+INDEX_VERSION = 1
+
+
+def content_hash(content: str) -> str:
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
 
 class ProjectManager:
-    def __init__(self, projects_dir: Path):
+    """ノート（ソースファイル）ごとのプロジェクトを管理
+
+    ソースファイル → プロジェクトの対応は `.project_index.json` に保持し、
+    メモリ上のコピーで引く。索引が無い・壊れている・プロジェクトディレクトリの
+    構成と食い違う場合は各プロジェクトの `.project_info.json` から再構築する。
+    長期間使われていないプロジェクトはコールド層（archive_dir）にtar.gzで退避し、
+    索引には残したまま、次に参照されたときに展開して戻す。
+    """
+    
+    def __init__(self, projects_dir: Path, archive_dir: Optional[Path] = None):
         self.projects_dir = projects_dir
         self.projects_dir.mkdir(parents=True, exist_ok=True)
+        self.archive_dir = archive_dir or projects_dir / '.archive'
+        self.index_file = self.projects_dir / INDEX_FILE_NAME
+        # ソースファイル → {'project': ディレクトリ名, 'content_hash': 最後に実行した内容のハッシュ,
+        #                   'archived': コールド層に退避済みか}
+        self._index: Optional[Dict[str, Dict]] = None
+        self._index_dirs: Set[str] = set()
+        self._index_signature: Optional[Tuple[int, int]] = None
+        self.metadata = ProjectMetadataStore()
+        # 自動退避はスレッドで、実行は複数のプロセスで動くため、索引の参照・更新と退避・展開を直列化する
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+    
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """スレッド間はRLock、同じプロジェクトディレクトリを使うプロセス間はflockで排他する（入れ子可）"""
+        with self._lock:
+            if self._lock_depth == 0:
+                self._lock_file = open(self.projects_dir / LOCK_FILE_NAME, 'a')
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    # 閉じるとflockも外れる
+                    self._lock_file.close()
+                    self._lock_file = None
+    
+    def _project_dirs(self) -> Set[str]:
+        return {
+            entry.name for entry in os.scandir(self.projects_dir)
+            if entry.is_dir() and not entry.name.startswith('.')
+        }
     
-    def create_project(self, source_file: Path) -> Path:
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        # アトミックな置き換えのたびにinodeが変わるため、mtimeの分解能内の更新も検出できる
+        try:
+            stat = self.index_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def _ensure_index(self) -> Dict[str, Dict]:
+        """索引をメモリに読み込む（他のプロセスが更新していれば読み直す）"""
+        if self._index is None or self._signature() != self._index_signature:
+            if not self._load_index():
+                self._rebuild_index()
+        return self._index
+    
+    def _load_index(self) -> bool:
+        """保存済みの索引を読み込み、プロジェクト構成と一致すればTrue"""
+        signature = self._signature()
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != INDEX_VERSION:
+                return False
+            dirs = set(data['dirs'])
+            if dirs != self._project_dirs():
+                logger.info("Project index is stale, rebuilding")
+                return False
+            self._index = data['sources']
+            self._index_dirs = dirs
+            self._index_signature = signature
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to load project index {self.index_file}: {e}")
+            return False
+    
+    def _rebuild_index(self):
+        """各プロジェクトの情報ファイルから索引を作り直す"""
+        index: Dict[str, Dict] = {}
+        created: Dict[str, str] = {}
+        dirs = self._project_dirs()
+        for name in dirs:
+            info = self.get_project_info(self.projects_dir / name)
+            if info is None or not info.source_file:
+                continue
+            source = info.source_file
+            # 同じノートに複数のプロジェクトがある場合は新しい方を使う
+            if source in index and created[source] > info.created_at:
+                continue
+            index[source] = {'project': name, 'content_hash': None}
+            created[source] = info.created_at
+        # 退避済みのプロジェクト（作業中のディレクトリがあればそちらを優先）
+        for record in archive.list_archived(self.archive_dir):
+            if record.source_file and record.source_file not in index:
+                index[record.source_file] = {'project': record.name, 'content_hash': None, 'archived': True}
+        self._index = index
+        self._index_dirs = dirs
+        self._save_index()
+        logger.info(f"Rebuilt project index ({len(index)} projects)")
+    
+    def _save_index(self):
+        write_json_atomic(self.index_file, {
+            'version': INDEX_VERSION,
+            'dirs': sorted(self._index_dirs),
+            'sources': self._index,
+        })
+        self._index_signature = self._signature()
+    
+    def create_project(self, source_file: Path, content: Optional[str] = None) -> Path:
+        with self._locked():
+            return self._create_project(source_file, content)
+    
+    def _create_project(self, source_file: Path, content: Optional[str]) -> Path:
+        index = self._ensure_index()
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         temp_name = f"project_{timestamp}"
+        # 同じ秒に作成された別ノートのプロジェクトと衝突しないようにする
+        suffix = 1
+        while (self.projects_dir / temp_name).exists() or archive.tarball_path(self.archive_dir, temp_name).exists():
+            temp_name = f"project_{timestamp}_{suffix}"
+            suffix += 1
         project_path = self.projects_dir / temp_name
         
-        project_path.mkdir(parents=True, exist_ok=True)
+        project_path.mkdir(parents=True)
         (project_path / 'src').mkdir(exist_ok=True)
         (project_path / 'logs').mkdir(exist_ok=True)
         
         # プロジェクト情報を保存
-        info = {
-            'temp_name': temp_name,
-            'source_file': str(source_file),
-            'created_at': timestamp,
-            'official_name': None,
-            'working_directory': str(project_path / 'src')
-        }
+        self.metadata.save(project_path, ProjectInfo(
+            temp_name=temp_name,
+            source_file=str(source_file),
+            created_at=timestamp,
+            working_directory=str(project_path / 'src')
+        ))
         
-        with open(project_path / '.project_info.json', 'w') as f:
-            json.dump(info, f, indent=2)
+        # 索引に登録
+        index[str(source_file)] = {
+            'project': temp_name,
+            'content_hash': content_hash(content) if content is not None else None
+        }
+        self._index_dirs.add(temp_name)
+        self._save_index()
         
         return project_path
     
-    def get_project_by_source(self, source_file: Path) -> Optional[Path]:
-        for project_dir in self.projects_dir.iterdir():
-            if project_dir.is_dir():
-                info_file = project_dir / '.project_info.json'
-                if info_file.exists():
-                    with open(info_file, 'r') as f:
-                        info = json.load(f)
-                    if info['source_file'] == str(source_file):
-                        return project_dir
-        return None
+    def get_project_by_source(self, source_file: Path, content: Optional[str] = None) -> Optional[Path]:
+        """ノートに対応するプロジェクトを索引から引く
+
+        見つからず内容が渡された場合は、移動・改名されたノートの既存プロジェクトを探して引き継ぐ。
+        退避済み（退避中を含む）のプロジェクトは展開してから返すため、イベントループからは
+        スレッドで呼ぶ。
+        """
+        with self._locked():
+            return self._get_project_by_source(source_file, content)
     
-    def update_project_name(self, project_path: Path, new_name: str):
-        info_file = project_path / '.project_info.json'
-        if info_file.exists():
-            with open(info_file, 'r') as f:
-                info = json.load(f)
-            
-            info['official_name'] = new_name
+    def _get_project_by_source(self, source_file: Path, content: Optional[str]) -> Optional[Path]:
+        index = self._ensure_index()
+        entry = index.get(str(source_file))
+        if entry is not None and not entry.get('archived') and not (self.projects_dir / entry['project']).is_dir():
+            # 索引作成後にディレクトリが消えた
+            self._rebuild_index()
+            entry = self._index.get(str(source_file))
+        
+        if entry is None and content is not None:
+            entry = self._relink_moved_note(source_file, content)
+        if entry is None:
+            return None
+        if entry.get('archived') and not self._restore(entry):
+            return None
+        
+        if content is not None and entry.get('content_hash') != content_hash(content):
+            entry['content_hash'] = content_hash(content)
+            self._save_index()
+        return self.projects_dir / entry['project']
+    
+    def _relink_moved_note(self, source_file: Path, content: str) -> Optional[Dict]:
+        """最後に実行した内容が一致し、元のノートが存在しないプロジェクトを新しいパスに付け替える
+
+        ファイル名だけの一致では付け替えない（別のフォルダにある同名のノートを取り違えないため）。
+        """
+        digest = content_hash(content)
+        # 内容が一致した候補だけstatする
+        match = next(
+            ((s, e) for s, e in self._index.items() if e.get('content_hash') == digest and not Path(s).exists()),
+            None
+        )
+        if match is None:
+            return None
+        
+        old_source, entry = match
+        print(f"Note moved: {old_source} -> {source_file}, reusing project {entry['project']}")
+        if entry.get('archived') and not self._restore(entry):
+            return None
+        
+        def relink(info: ProjectInfo):
+            info.source_file = str(source_file)
+            info.previous_sources.append(old_source)
+        self.metadata.update(self.projects_dir / entry['project'], relink)
+        
+        del self._index[old_source]
+        self._index[str(source_file)] = entry
+        self._save_index()
+        return entry
+    
+    def _restore(self, entry: Dict) -> bool:
+        """退避済みのプロジェクトをコールド層から展開して戻す（展開できなければ索引から外す）"""
+        name = entry['project']
+        started = time.monotonic()
+        with self._locked():
+            if not entry.get('archived'):
+                return True
+            try:
+                archive.unpack(self.archive_dir, name, self.projects_dir)
+            except (OSError, tarfile.TarError) as e:
+                logger.error(f"Failed to restore archived project {name}: {e}")
+                for source in [s for s, other in self._index.items() if other is entry]:
+                    del self._index[source]
+                self._save_index()
+                return False
+            entry.pop('archived', None)
+            self._index_dirs.add(name)
+            self._save_index()
+        print(f"Restored archived project {name} in {time.monotonic() - started:.1f}s")
+        return True
+    
+    def archive_project(self, project_path: Path) -> archive.ArchivedProject:
+        """プロジェクトをコールド層に退避し、索引には退避済みとして残す"""
+        with self._locked():
+            entries = [entry for entry in self._ensure_index().values() if entry['project'] == project_path.name]
+            # 退避中に参照されたら、完了を待ってから展開する
+            for entry in entries:
+                entry['archived'] = True
+            try:
+                info = self.get_project_info(project_path)
+                record = archive.pack(project_path, self.archive_dir, info.to_dict() if info else {})
+            except Exception:
+                for entry in entries:
+                    entry.pop('archived', None)
+                raise
             
-            with open(info_file, 'w') as f:
-                json.dump(info, f, indent=2)
+            # 途中で落ちても展開できるよう、ディレクトリを消す前に索引を保存する
+            self._index_dirs.discard(project_path.name)
+            self._save_index()
+            shutil.rmtree(project_path)
+            self.metadata.forget(project_path)
+            return record
+    
+    def archive_idle_projects(self, idle_days: float, is_busy: Optional[Callable[[str], bool]] = None,
+                              dry_run: bool = False) -> archive.ArchiveReport:
+        """最後の実行から idle_days 日以上経ったプロジェクトを退避する（is_busy が真のノートは除く）"""
+        report = archive.ArchiveReport()
+        cutoff = time.time() - idle_days * 86400
+        with self._locked():
+            sources = list(self._ensure_index())
+        for source in sources:
+            # 確認してから退避し終えるまでの間に、このノートの実行がプロジェクトを使い始めないようにする
+            with self._locked():
+                entry = self._ensure_index().get(source)
+                if entry is None:
+                    continue
+                project_path = self.projects_dir / entry['project']
+                if entry.get('archived') or not project_path.is_dir():
+                    continue
+                info = self.get_project_info(project_path)
+                last_used = (info.last_run_at if info else None) or project_path.stat().st_mtime
+                if last_used > cutoff:
+                    continue
+                if is_busy is not None and is_busy(source):
+                    report.skipped.append((entry['project'], 'job is running'))
+                    continue
+                if dry_run:
+                    size = archive.directory_size(project_path)
+                    report.archived.append(archive.ArchivedProject(entry['project'], source, size, 0, time.time()))
+                    continue
+                try:
+                    report.archived.append(self.archive_project(project_path))
+                except Exception as e:
+                    logger.error(f"Failed to archive {project_path}: {e}")
+                    report.skipped.append((entry['project'], str(e)))
+        return report
+    
+    @property
+    def indexed_sources(self) -> Optional[int]:
+        """索引に載っているノートの数（未読み込みならNone）"""
+        return len(self._index) if self._index is not None else None
+    
+    def archived_projects(self) -> List[archive.ArchivedProject]:
+        return archive.list_archived(self.archive_dir)
+    
+    def update_project_name(self, project_path: Path, new_name: str):
+        def rename(info: ProjectInfo):
+            info.official_name = new_name
+        self.metadata.update(project_path, rename)
     
     def rename_project_directory(self, old_path: Path, new_name: str) -> Path:
+        with self._locked():
+            return self._rename_project_directory(old_path, new_name)
+    
+    def _rename_project_directory(self, old_path: Path, new_name: str) -> Path:
         new_path = self.projects_dir / new_name
         if new_path.exists():
             raise ValueError(f"Project {new_name} already exists")
         
+        index = self._ensure_index()
         shutil.move(str(old_path), str(new_path))
+        self.metadata.forget(old_path)
         
         # プロジェクト情報を更新
-        info_file = new_path / '.project_info.json'
-        if info_file.exists():
-            with open(info_file, 'r') as f:
-                info = json.load(f)
-            
-            info['official_name'] = new_name
-            info['working_directory'] = str(new_path / 'src')
-            
-            with open(info_file, 'w') as f:
-                json.dump(info, f, indent=2)
+        def rename(info: ProjectInfo):
+            info.official_name = new_name
+            info.working_directory = str(new_path / 'src')
+        self.metadata.update(new_path, rename)
+        
+        # 索引のディレクトリ名を付け替える
+        for entry in index.values():
+            if entry['project'] == old_path.name:
+                entry['project'] = new_name
+        self._index_dirs.discard(old_path.name)
+        self._index_dirs.add(new_name)
+        self._save_index()
         
         return new_path
     
-    def get_project_info(self, project_path: Path) -> Dict:
-        info_file = project_path / '.project_info.json'
-        if info_file.exists():
-            with open(info_file, 'r') as f:
-                return json.load(f)
-        return {}
+    def get_project_info(self, project_path: Path) -> Optional[ProjectInfo]:
+        return self.metadata.load(project_path)
     
     def get_project_name(self, project_path: Path) -> str:
         info = self.get_project_info(project_path)
-        return info.get('official_name') or info.get('temp_name', project_path.name)
\ No newline at end of file
+        return info.name if info else project_path.name
+    
+    def record_run(self, project_path: Path, status: str, duration: float):
+        """プロジェクトの実行統計を更新"""
+        try:
+            self.metadata.record_run(project_path, status, duration)
+        except OSError as e:
+            logger.warning(f"Failed to record run stats for {project_path}: {e}")
@@ -0,0 +1,126 @@
+import copy
+import json
+import os
+import threading
+import time
+import logging
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INFO_FILE_NAME = '.project_info.json'
+
+
+def write_json_atomic(path: Path, data: Dict):
+    """一時ファイルからのrenameでアトミックに書き込む（読み手が書きかけのJSONを見ない）"""
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class ProjectInfo:
+    """`.project_info.json` の内容"""
+    temp_name: str
+    source_file: str
+    created_at: str
+    working_directory: str
+    official_name: Optional[str] = None
+    previous_sources: List[str] = field(default_factory=list)
+    # 実行統計
+    run_count: int = 0
+    total_runtime: float = 0.0
+    last_status: Optional[str] = None
+    last_run_at: Optional[float] = None
+    # 未知のキーは書き戻し時に保持する
+    extra: Dict = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return self.official_name or self.temp_name
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProjectInfo':
+        known = {f.name for f in fields(cls)} - {'extra'}
+        values = {k: v for k, v in data.items() if k in known}
+        values.setdefault('working_directory', '')
+        values.setdefault('created_at', '')
+        values.setdefault('source_file', '')
+        values.setdefault('temp_name', '')
+        return cls(**values, extra={k: v for k, v in data.items() if k not in known})
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        extra = data.pop('extra')
+        return {**extra, **data}
+
+
+class ProjectMetadataStore:
+    """プロジェクト情報の読み書き
+
+    読み込んだ情報はプロセス内にキャッシュし、ファイルのinodeとmtimeが
+    変わった（他のプロセスが書き換えた）ときだけ読み直す。
+    """
+
+    def __init__(self):
+        self._cache: Dict[Path, Tuple[Tuple[int, int], ProjectInfo]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(info_file: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = info_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def load(self, project_path: Path) -> Optional[ProjectInfo]:
+        """プロジェクト情報を返す（呼び出し側で変更してもキャッシュには影響しない）"""
+        info_file = project_path / INFO_FILE_NAME
+        with self._lock:
+            signature = self._signature(info_file)
+            if signature is None:
+                self._cache.pop(project_path, None)
+                return None
+            cached = self._cache.get(project_path)
+            if cached is None or cached[0] != signature:
+                try:
+                    with open(info_file, 'r', encoding='utf-8') as f:
+                        info = ProjectInfo.from_dict(json.load(f))
+                except (OSError, ValueError, TypeError) as e:
+                    logger.warning(f"Failed to load project info {info_file}: {e}")
+                    return None
+                cached = (signature, info)
+                self._cache[project_path] = cached
+            return copy.deepcopy(cached[1])
+
+    def save(self, project_path: Path, info: ProjectInfo):
+        info_file = project_path / INFO_FILE_NAME
+        with self._lock:
+            write_json_atomic(info_file, info.to_dict())
+            self._cache[project_path] = (self._signature(info_file), copy.deepcopy(info))
+
+    def update(self, project_path: Path, change: Callable[[ProjectInfo], None]) -> Optional[ProjectInfo]:
+        """最新の情報を読み込んで変更を適用し、書き戻す"""
+        info = self.load(project_path)
+        if info is None:
+            return None
+        change(info)
+        self.save(project_path, info)
+        return info
+
+    def forget(self, project_path: Path):
+        with self._lock:
+            self._cache.pop(project_path, None)
+
+    def record_run(self, project_path: Path, status: str, duration: float) -> Optional[ProjectInfo]:
+        """実行回数・累計実行時間・最終ステータスを更新"""
+        def change(info: ProjectInfo):
+            info.run_count += 1
+            info.total_runtime += duration
+            info.last_status = status
+            info.last_run_at = time.time()
+        return self.update(project_path, change)
@@ -0,0 +1,224 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import Config
+
+# 適用できる圧縮ルール（PROMPT_COMPACTION_RULES で選ぶ）
+RULES = ('frontmatter', 'comments', 'embeds', 'questions', 'task_results')
+
+FRONTMATTER_PATTERN = re.compile(r'\A﻿?---[ \t]*\n.*?\n(?:---|\.\.\.)[ \t]*(?:\n|\Z)', re.DOTALL)
+COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.DOTALL)
+# Obsidianの埋め込み（![[ノート]] / ![[画像.png]]）
+EMBED_PATTERN = re.compile(r'!\[\[[^\]\n]*\]\]')
+
+QUESTION_HEADING = re.compile(r'^##\s*Claude からの質問')
+TASK_RESULT_HEADING = re.compile(r'^##\s*タスクの実行結果')
+SECTION_END = re.compile(r'^(?:#{1,2}\s|---\s*$)')
+NUMBERED_QUESTION = re.compile(r'^\d+\.\s+(.+)$')
+QUESTION_FOOTER = '*上記の質問に回答してファイルを更新してください*'
+
+FENCE_OPEN = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+INDENTED_CODE = re.compile(r'^(?: {4}|\t)')
+# 削った位置の印（空白・空行の整理はこの印のある行とその周りだけに行う）
+REMOVED = '\0'
+
+
+@dataclass
+class CompactedPrompt:
+    text: str
+    original_tokens: int
+    compacted_tokens: int
+    removed: Dict[str, int] = field(default_factory=dict)  # ルールごとに削った文字数
+
+    def stats(self) -> Dict:
+        """実行ログのインデックスに記録する項目"""
+        return {
+            'prompt_tokens_original': self.original_tokens,
+            'prompt_tokens_compacted': self.compacted_tokens,
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算（ASCIIは4文字で1トークン、日本語などそれ以外は1文字1トークン）"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii + 3) // 4 + non_ascii
+
+
+def _split_code(lines: List[str]) -> List[Tuple[bool, List[str]]]:
+    """フェンス（```/~~~）とインデント（空行の後の4スペース・タブ）のコードブロックと、それ以外に分ける"""
+    segments: List[Tuple[bool, List[str]]] = []
+
+    def append(is_code: bool, line: str):
+        if segments and segments[-1][0] == is_code:
+            segments[-1][1].append(line)
+        else:
+            segments.append((is_code, [line]))
+
+    fence: Optional[re.Pattern] = None
+    for i, line in enumerate(lines):
+        if fence is not None:
+            append(True, line)
+            if fence.match(line):
+                fence = None
+            continue
+        match = FENCE_OPEN.match(line)
+        if match:
+            marker = match.group(1)
+            fence = re.compile(rf'^ {{0,3}}{re.escape(marker[0])}{{{len(marker)},}}[ \t]*$')
+            append(True, line)
+        elif (line.strip() and INDENTED_CODE.match(line)
+              and (i == 0 or not lines[i - 1].strip() or (segments and segments[-1][0]))):
+            append(True, line)
+        else:
+            append(False, line)
+    return segments
+
+
+def _normalize_removed(text: str) -> str:
+    """削った位置に残った行末の空白と、連続する空行をまとめる（それ以外の行はそのまま）"""
+    result: List[str] = []
+    blank_run: List[str] = []
+    for line in text.split('\n') + [None]:
+        if line is not None and not line.replace(REMOVED, '').strip():
+            blank_run.append(line)
+            continue
+        if any(REMOVED in blank for blank in blank_run):
+            blank_run = ['']
+        result += blank_run
+        blank_run = []
+        if line is not None:
+            result.append(line.replace(REMOVED, '').rstrip(' \t') if REMOVED in line else line)
+    return '\n'.join(result)
+
+
+def _split_sections(lines: List[str]) -> List[Dict]:
+    """システムが追記したセクション（質問・タスク結果）とそれ以外に分ける
+
+    追記時の区切り線（`---`）はセクションに含める。セクションは次の区切り線か
+    レベル2以上の見出しで終わる（質問ブロックの定型文より後ろに書かれた回答も含む）。
+    """
+    sections: List[Dict] = []
+    plain: List[str] = []
+    i = 0
+    while i < len(lines):
+        # 直前の区切り線と空行は、続く見出しがシステムのものならセクションに含める
+        j = i
+        if lines[j].strip() == '---':
+            j += 1
+            while j < len(lines) and not lines[j].strip():
+                j += 1
+        if j < len(lines) and (j > i or lines[i].startswith('#')):
+            kind = ('questions' if QUESTION_HEADING.match(lines[j])
+                    else 'task_results' if TASK_RESULT_HEADING.match(lines[j]) else None)
+            if kind:
+                end = j + 1
+                while end < len(lines) and not SECTION_END.match(lines[end]):
+                    end += 1
+                if plain:
+                    sections.append({'kind': None, 'lines': plain})
+                    plain = []
+                sections.append({'kind': kind, 'lines': lines[i:end], 'body': lines[j + 1:end]})
+                i = end
+                continue
+        plain.append(lines[i])
+        i += 1
+    if plain:
+        sections.append({'kind': None, 'lines': plain})
+    return sections
+
+
+def _condense_questions(body: List[str]) -> Tuple[List[str], bool]:
+    """質問ブロックから定型文と空行を除き、回答が書き込まれているかを返す
+
+    質問の行と定型文以外はすべて回答として扱う（定型文の下に書かれたものも含む）。
+    """
+    kept, answered = [], False
+    for line in body:
+        stripped = line.strip()
+        if not stripped or stripped == QUESTION_FOOTER:
+            continue
+        match = NUMBERED_QUESTION.match(stripped)
+        if match:
+            kept.append(f'- 質問: {match.group(1)}')
+        else:
+            kept.append(f'  {stripped}')
+            answered = True
+    return kept, answered
+
+
+def _compact_sections(lines: List[str], rules: Sequence[str], removed: Dict[str, int]) -> List[str]:
+    sections = _split_sections(lines)
+    question_indexes = [i for i, s in enumerate(sections) if s['kind'] == 'questions']
+    latest_question = question_indexes[-1] if question_indexes else None
+    result: List[str] = []
+    for i, section in enumerate(sections):
+        kind = section['kind']
+        if kind is None or kind not in rules:
+            result += section['lines']
+            continue
+        original = '\n'.join(section['lines'])
+        if kind == 'questions':
+            condensed, answered = _condense_questions(section['body'])
+            if answered:
+                kept = ['', '## 以前の質問と回答', ''] + condensed
+            elif i == latest_question:
+                # 未回答の最新の質問は、何を聞いたかが分かるよう質問だけ残す
+                kept = ['', '## 未回答の質問', ''] + condensed
+            else:
+                kept = []
+        else:
+            # タスクの実行結果はノートの完了印で分かるため送らない
+            kept = []
+        removed[kind] = removed.get(kind, 0) + len(original) - len('\n'.join(kept))
+        result += [REMOVED] + kept
+    return result
+
+
+def compact_prompt(content: str, rules: Optional[Sequence[str]] = None) -> CompactedPrompt:
+    """ノートの内容からClaudeへの指示に関係のない部分を削る
+
+    - frontmatter: 先頭のYAML frontmatter
+    - comments: HTMLコメント（`claude-remote: no-cache` などの指定を含む）
+    - embeds: Obsidianの埋め込み（Claudeからは参照できない）
+    - questions: 過去の質問ブロック。回答済みのものは質問と回答だけに縮め、
+      未回答のものは最新の1件の質問だけを残す
+    - task_results: 並列実行したタスクの結果一覧
+
+    コメントと埋め込みはコードブロックの外だけで削り、空白と空行は削った位置だけ整える。
+    """
+    rules = Config.PROMPT_COMPACTION_RULES if rules is None else rules
+    removed: Dict[str, int] = {}
+    text = content.replace('\r\n', '\n')
+
+    def strip(rule: str, pattern: re.Pattern, value: str) -> str:
+        if rule not in rules:
+            return value
+        stripped, count = pattern.subn(REMOVED, value)
+        if count:
+            removed[rule] = removed.get(rule, 0) + len(value) - len(stripped) + count
+        return stripped
+
+    text = strip('frontmatter', FRONTMATTER_PATTERN, text)
+    chunks = []
+    for is_code, lines in _split_code(text.split('\n')):
+        chunk = '\n'.join(lines)
+        if not is_code:
+            chunk = strip('comments', COMMENT_PATTERN, chunk)
+            chunk = strip('embeds', EMBED_PATTERN, chunk)
+        chunks.append(chunk)
+    text = '\n'.join(chunks)
+    if 'questions' in rules or 'task_results' in rules:
+        text = '\n'.join(_compact_sections(text.split('\n'), rules, removed))
+
+    # 削除で生じた行末の空白と連続する空行をまとめる
+    text = re.sub(r'\A(?:[ \t]*\n)+', '', _normalize_removed(text)).rstrip()
+    if not text.strip():
+        # すべて削れてしまう場合は元の内容を送る
+        text = content
+    return CompactedPrompt(
+        text=text,
+        original_tokens=estimate_tokens(content),
+        compacted_tokens=estimate_tokens(text),
+        removed=removed,
+    )
@@ -0,0 +1,107 @@
+import io
+import re
+import unicodedata
+from typing import Iterable, Iterator, List, Optional, Set
+
+from .config import Config
+
+# Claudeの応答から質問を検出するパターン
+QUESTION_PATTERNS = [
+    r'(?:質問|Question|クエスチョン)[:：]?\s*(.+)',
+    r'(?:確認|Confirm|コンファーム)[:：]?\s*(.+)',
+    r'(?:詳細|Details|詳しく)[:：]?\s*(.+)',
+    r'(?:どの|Which|どちら).*[？?]',
+    r'(?:何|What|なに).*[？?]',
+    r'(?:いつ|When|どこ|Where|なぜ|Why|どうやって|How).*[？?]',
+    r'(?:してください|お聞かせください|教えてください|please|Please).*[？?]?',
+    r'(?:必要です|required|需要|ください).*(?:情報|information|詳細|details)',
+]
+
+# インポート時に一度だけコンパイルする
+COMPILED_PATTERNS = [re.compile(p, re.IGNORECASE) for p in QUESTION_PATTERNS]
+
+# 各パターン先頭のキーワードを1つにまとめた事前判定用の正規表現。
+# IGNORECASEはリテラル最適化が効かず遅いため、小文字化した行に対して照合する
+# （大半の行はここで除外される）
+KEYWORD_PATTERN = re.compile('|'.join(
+    re.escape(keyword.lower())
+    for p in QUESTION_PATTERNS
+    for keyword in re.match(r'\(\?:([^)]*)\)', p).group(1).split('|')
+))
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = '?？!！。.、,:： '
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """テキスト全体を分割せずに1行ずつ返す"""
+    return iter(io.StringIO(text))
+
+
+def normalize_question(question: str) -> str:
+    """重複判定用に質問文を正規化"""
+    question = unicodedata.normalize('NFKC', question).casefold()
+    return _WHITESPACE.sub(' ', question).strip(_TRAILING_PUNCTUATION)
+
+
+class QuestionDetector:
+    """行単位の1パスで質問を検出し、正規化ハッシュで重複を除去する"""
+
+    def __init__(self, max_questions: Optional[int] = None):
+        self.max_questions = max_questions if max_questions is not None else Config.MAX_QUESTIONS
+        self.questions: List[str] = []
+        self._seen: Set[str] = set()
+
+    @property
+    def full(self) -> bool:
+        return len(self.questions) >= self.max_questions
+
+    def _add(self, question: str, found: List[str]):
+        question = question.strip()
+        if len(question) <= 5 or self.full:
+            return
+        key = normalize_question(question)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self.questions.append(question)
+        found.append(question)
+
+    def feed_line(self, line: str) -> List[str]:
+        """1行を検査し、新たに見つかった質問を返す"""
+        found: List[str] = []
+        if self.full:
+            return found
+        line = line.strip()
+        if not line:
+            return found
+
+        if KEYWORD_PATTERN.search(line.lower()):
+            for pattern in COMPILED_PATTERNS:
+                for match in pattern.finditer(line):
+                    self._add(match.group(1) if pattern.groups else match.group(0), found)
+
+        # 質問らしい行を直接検出
+        if (line.endswith('?') or line.endswith('？')) and 10 < len(line) < 200:
+            self._add(line, found)
+        return found
+
+    def feed_lines(self, lines: Iterable[str]) -> List[str]:
+        """行イテレータを順に検査し、新たに見つかった質問を返す"""
+        found: List[str] = []
+        for line in lines:
+            if self.full:
+                break
+            found.extend(self.feed_line(line))
+        return found
+
+    def feed_text(self, text: str) -> List[str]:
+        """テキストを行単位で検査し、新たに見つかった質問を返す"""
+        return self.feed_lines(iter_lines(text))
+
+
+def detect_questions(lines: Iterable[str], max_questions: Optional[int] = None) -> List[str]:
+    """行イテレータ（ファイルオブジェクト等）から質問を検出"""
+    detector = QuestionDetector(max_questions)
+    detector.feed_lines(lines)
+    return detector.questions
@@ -0,0 +1,161 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .config import Config
+from .project_metadata import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# ノート内にこの指定があればキャッシュを使わない（HTMLコメントやfrontmatterで記述可）
+NO_CACHE_DIRECTIVE = re.compile(r'claude-remote\s*:\s*no-cache', re.IGNORECASE)
+
+# ワークスペース状態の計算で無視するディレクトリ
+IGNORED_DIRS = {'.git', 'node_modules', '__pycache__', '.venv', 'venv', '.mypy_cache', '.pytest_cache'}
+
+
+class ResultCache:
+    """正規化したプロンプトとワークスペース状態をキーにした実行結果キャッシュ
+
+    キーは「実行後」のワークスペース状態で記録する。同じ指示が同じ状態の
+    ワークスペースに対して再度届いた場合（編集の取り消しやDriveによる
+    同一内容の書き戻し）、前回の結果を返して実行をスキップできる。
+
+    キャッシュファイルは同じホストの実行プロセスで共有する。更新はflockを取ってから
+    ファイルを読み直して反映するため、他のプロセスが保存したエントリを上書きしない。
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None,
+                 max_entries: Optional[int] = None, max_age: Optional[int] = None):
+        self.cache_file = cache_file or Path.home() / '.claude-remote' / 'cache' / 'result_cache.json'
+        self.max_entries = max_entries if max_entries is not None else Config.RESULT_CACHE_MAX_ENTRIES
+        self.max_age = max_age if max_age is not None else Config.RESULT_CACHE_MAX_AGE
+        self.lock_file = self.cache_file.with_name(self.cache_file.name + '.lock')
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._load()
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.cache_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self):
+        """キャッシュファイルを読み込み"""
+        try:
+            self._signature = self._file_signature()
+            if self._signature is not None:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = OrderedDict(json.load(f))
+                self._evict()
+        except Exception as e:
+            logger.warning(f"Failed to load result cache: {e}")
+            self.entries = OrderedDict()
+
+    def _refresh(self):
+        """他のプロセスが保存していれば読み直す"""
+        if self._file_signature() != self._signature:
+            self._load()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _update(self, change: Callable[[], None]):
+        """最新のファイルに変更を加えてアトミックに保存する"""
+        try:
+            with self._locked():
+                self._refresh()
+                change()
+                self._evict()
+                write_json_atomic(self.cache_file, self.entries)
+                self._signature = self._file_signature()
+        except Exception as e:
+            logger.error(f"Failed to save result cache: {e}")
+
+    def _evict(self):
+        """期限切れのエントリと上限を超えた古いエントリを削除"""
+        now = time.time()
+        for key in [k for k, v in self.entries.items() if now - v.get('stored_at', 0) > self.max_age]:
+            del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def normalize_prompt(content: str) -> str:
+        """改行コード・末尾空白・Unicode表記揺れを正規化"""
+        content = unicodedata.normalize('NFC', content)
+        lines = content.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        return '\n'.join(line.rstrip() for line in lines).strip()
+
+    @staticmethod
+    def workspace_fingerprint(working_dir: Path) -> str:
+        """ワークスペースのファイル構成（パス・サイズ・mtime）からフィンガープリントを計算"""
+        digest = hashlib.sha256()
+        if not working_dir.exists():
+            return digest.hexdigest()
+        for root, dirs, files in os.walk(working_dir):
+            dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                rel_path = os.path.relpath(path, working_dir)
+                digest.update(f"{rel_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def is_opted_out(content: str) -> bool:
+        """ノートがキャッシュ無効化を指定しているか"""
+        return bool(NO_CACHE_DIRECTIVE.search(content))
+
+    def make_key(self, content: str, working_dir: Path, fingerprint: Optional[str] = None) -> str:
+        """プロンプトとワークスペース状態からキャッシュキーを生成
+
+        fingerprint（ワークスペースのマニフェストから計算したもの）があれば、
+        ワークスペースを走査し直さずにそれを使う。
+        """
+        digest = hashlib.sha256()
+        digest.update(self.normalize_prompt(content).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update((fingerprint or self.workspace_fingerprint(working_dir)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """キャッシュを検索（ヒット時はLRU順を更新）"""
+        self._refresh()
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.max_age:
+            self._update(lambda: self.entries.pop(key, None))
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, summary: str, project_name: str):
+        """実行結果をキャッシュに保存"""
+        def store():
+            self.entries[key] = {
+                'summary': summary,
+                'project_name': project_name,
+                'stored_at': time.time(),
+            }
+            self.entries.move_to_end(key)
+        self._update(store)
@@ -1,24 +1,72 @@
-import requests
-import json
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from .config import Config
+from .notification_dispatcher import NotificationDispatcher
+
+# ダイジェストの見出し（通知の種類ごと）
+DIGEST_TITLES = {
+    'start': '🚀 {n}件の実行を開始',
+    'complete': '✅ {n}件の実行が完了',
+    'cached': '♻️ {n}件の実行済み結果を再利用',
+    'error': '❌ {n}件のエラー',
+    'token_retry': '⏳ {n}件がトークン制限により待機中',
+}
+DIGEST_MAX_LINES = 20
 
 class SlackNotifier:
-    def __init__(self, webhook_url: str = None):
+    """Slack通知のメッセージを組み立てる（送信はバックグラウンドで行い、呼び出し元は待たない）"""
+    
+    def __init__(self, webhook_url: str = None, dispatcher: Optional[NotificationDispatcher] = None):
         self.webhook_url = webhook_url or Config.SLACK_WEBHOOK_URL
+        self.dispatcher = dispatcher or NotificationDispatcher(
+            self.webhook_url,
+            digest=self.build_digest,
+            outbox_path=Config.SLACK_OUTBOX_PATH if Config.SLACK_OUTBOX_ENABLED else None,
+        )
         
-    def send_message(self, message: Dict) -> bool:
-        try:
-            response = requests.post(
-                self.webhook_url,
-                json=message,
-                headers={'Content-Type': 'application/json'}
-            )
-            return response.status_code == 200
-        except Exception as e:
-            print(f"Failed to send Slack message: {e}")
-            return False
+    def send_message(self, message: Dict, kind: str = 'message', key: Optional[str] = None,
+                     summary: str = '', hold: float = 0) -> bool:
+        """送信キューに積めたらTrue（key は実行ごとのキー、summary はダイジェスト用の1行）"""
+        return self.dispatcher.submit(message, kind=kind, key=key, summary=summary, hold=hold)
+    
+    @staticmethod
+    def build_digest(kind: str, summaries: List[str]) -> Dict:
+        """送信が追いつかずに溜まった同じ種類の通知を1件にまとめる"""
+        lines = [f"• {summary}" for summary in summaries[:DIGEST_MAX_LINES]]
+        if len(summaries) > DIGEST_MAX_LINES:
+            lines.append(f"…他 {len(summaries) - DIGEST_MAX_LINES}件")
+        title = DIGEST_TITLES.get(kind, '🔔 {n}件の通知').format(n=len(summaries))
+        return {
+            "blocks": [
+                {
+                    "type": "header",
+                    "text": {
+                        "type": "plain_text",
+                        "text": title
+                    }
+                },
+                {
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": '\n'.join(lines)[:2900]
+                    }
+                },
+                {
+                    "type": "context",
+                    "elements": [
+                        {
+                            "type": "mrkdwn",
+                            "text": f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                        }
+                    ]
+                }
+            ]
+        }
+    
+    def close(self, timeout: Optional[float] = None):
+        """未送信の通知を送り切ってから終了する"""
+        self.dispatcher.close(timeout)
     
     def notify_start(self, project_name: str, task_summary: str, source_file: str = None):
         fields = [
@@ -62,9 +110,12 @@ class SlackNotifier:
                 }
             ]
         }
-        return self.send_message(message)
+        # すぐに完了した実行では開始通知を送らない
+        return self.send_message(message, 'start', project_name, self._digest_line(project_name, source_file),
+                                 hold=Config.SLACK_START_HOLD)
     
-    def notify_complete(self, project_name: str, result_summary: str, source_file: str = None):
+    def notify_complete(self, project_name: str, result_summary: str, source_file: str = None,
+                        stats: Optional[str] = None, changes: Optional[str] = None):
         fields = [
             {
                 "type": "mrkdwn",
@@ -106,7 +157,66 @@ class SlackNotifier:
                 }
             ]
         }
-        return self.send_message(message)
+        
+        if changes:
+            message["blocks"].insert(2, {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*変更したファイル:*\n```{changes[:2800]}```"
+                }
+            })
+        
+        if stats:
+            message["blocks"][-1]["elements"].append({
+                "type": "mrkdwn",
+                "text": stats
+            })
+        return self.send_message(message, 'complete', project_name, self._digest_line(project_name, source_file))
+    
+    def notify_cached(self, project_name: str, result_summary: str, source_file: str = None):
+        fields = [
+            {
+                "type": "mrkdwn",
+                "text": f"*プロジェクト:*\n{project_name}"
+            },
+            {
+                "type": "mrkdwn",
+                "text": f"*前回の結果:*\n{result_summary[:200]}..."
+            }
+        ]
+        
+        if source_file:
+            fields.insert(0, {
+                "type": "mrkdwn",
+                "text": f"*ファイル:*\n{source_file}"
+            })
+        
+        message = {
+            "blocks": [
+                {
+                    "type": "header",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "♻️ 実行済みの結果を再利用"
+                    }
+                },
+                {
+                    "type": "section",
+                    "fields": fields
+                },
+                {
+                    "type": "context",
+                    "elements": [
+                        {
+                            "type": "mrkdwn",
+                            "text": f"内容とワークスペースに変更がないため実行をスキップしました ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})"
+                        }
+                    ]
+                }
+            ]
+        }
+        return self.send_message(message, 'cached', project_name, self._digest_line(project_name, source_file))
     
     def notify_error(self, project_name: str, error_level: str, 
                     error_summary: str, error_detail: Optional[str] = None,
@@ -168,7 +278,11 @@ class SlackNotifier:
             ]
         })
         
-        return self.send_message({"blocks": blocks})
+        return self.send_message({"blocks": blocks}, 'error', project_name, f"{emoji} {project_name}: {error_summary[:100]}")
+    
+    @staticmethod
+    def _digest_line(project_name: str, source_file: Optional[str]) -> str:
+        return f"{project_name} ({source_file})" if source_file else project_name
     
     def notify_token_retry(self, project_name: str, retry_count: int):
         message = {
@@ -182,4 +296,5 @@ class SlackNotifier:
                 }
             ]
         }
-        return self.send_message(message)
\ No newline at end of file
+        return self.send_message(message, 'token_retry', project_name,
+                                 f"{project_name} ({retry_count}/{Config.MAX_TOKEN_RETRIES})")
\ No newline at end of file
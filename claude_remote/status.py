@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import json
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Deque, Dict, Optional
+
+from .config import Config
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# 直近のエラー（/status で返す）
+RECENT_ERRORS: Deque[Dict] = collections.deque(maxlen=20)
+
+
+def record_error(source: str, message: str):
+    RECENT_ERRORS.append({'at': time.time(), 'source': source, 'message': str(message)[:500]})
+
+
+class RecentErrorHandler(logging.Handler):
+    """claude_remote 配下のロガーが出したエラーを記録する"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord):
+        record_error(record.name, record.getMessage())
+
+
+class StatusServer:
+    """ローカルの状態取得用HTTPエンドポイント
+
+    `/status` は各コンポーネントが処理のたびに更新しているカウンタを集めるだけで、
+    ファイルシステムの走査やキューの集計は行わない（キュー長のみ一定間隔で更新した値を返す）。
+    `/health` は死活確認、`/metrics` はPrometheusテキスト形式のメトリクス。
+    STATUS_SOCKET を設定するとTCPの代わりにUnixソケットで待ち受ける。
+    """
+
+    def __init__(self, app, host: Optional[str] = None, port: Optional[int] = None,
+                 socket_path: Optional[Path] = None):
+        self.app = app
+        self.host = host or Config.STATUS_HOST
+        self.port = Config.STATUS_PORT if port is None else port
+        self.socket_path = socket_path if socket_path is not None else Config.STATUS_SOCKET
+        self.started_at = time.time()
+        self.queue_depth: Optional[int] = None
+        self.queue_depth_at: Optional[float] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._error_handler = RecentErrorHandler()
+
+    async def start(self):
+        if self.socket_path:
+            self.socket_path.unlink(missing_ok=True)
+            self.server = await asyncio.start_unix_server(self._handle, path=str(self.socket_path))
+            print(f"Status: unix:{self.socket_path}")
+        else:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self.server.sockets[0].getsockname()[1]
+            print(f"Status: http://{self.host}:{self.port}/status")
+        logging.getLogger('claude_remote').addHandler(self._error_handler)
+
+    async def close(self):
+        logging.getLogger('claude_remote').removeHandler(self._error_handler)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.socket_path:
+            self.socket_path.unlink(missing_ok=True)
+
+    async def refresh_periodically(self, stop_event: asyncio.Event):
+        """キュー長を一定間隔で集計しておく（リクエストごとには問い合わせない）"""
+        while not stop_event.is_set():
+            try:
+                self.queue_depth = await asyncio.to_thread(self.app.job_queue.pending_count)
+                self.queue_depth_at = time.time()
+            except Exception as e:
+                logger.warning(f"Failed to refresh queue depth: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=Config.STATUS_REFRESH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def snapshot(self) -> Dict:
+        app = self.app
+        status = {
+            'role': app.role,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'uptime': time.time() - self.started_at,
+            'queue': {
+                'backend': Config.QUEUE_BACKEND,
+                'pending': self.queue_depth,
+                'updated_at': self.queue_depth_at,
+            },
+            'recent_errors': list(RECENT_ERRORS),
+        }
+        if app.file_watcher is not None:
+            status['watcher'] = app.file_watcher.get_status()
+
+        worker = app.worker
+        if worker is not None:
+            executor = app.claude_executor
+            running = []
+            for job_id, (file_path, _) in list(worker.running.items()):
+                handle = executor.active_runs.get(str(file_path))
+                running.append({
+                    'job_id': job_id,
+                    'file': str(file_path),
+                    'elapsed': handle.elapsed if handle else None,
+                })
+            status['worker'] = {
+                'id': worker.worker_id,
+                'slots': worker.slots.size,
+                'slots_in_use': worker.slots.in_use,
+                'admission': worker.admission.status() if worker.admission else None,
+                'running': running,
+            }
+            status['caches'] = {
+                'result_cache': len(executor.result_cache.entries) if executor.result_cache else None,
+                'project_index': app.project_manager.indexed_sources,
+                'file_hashes': len(app.file_watcher.file_hashes) if app.file_watcher is not None else None,
+            }
+            status['notifications'] = {'backlog': app.slack_notifier.dispatcher.backlog}
+        return status
+
+    def _respond(self, path: str):
+        if path == '/status':
+            return 200, 'application/json', json.dumps(self.snapshot(), ensure_ascii=False, default=str)
+        if path == '/health':
+            return 200, 'application/json', json.dumps({'status': 'ok', 'role': self.app.role})
+        if path == '/metrics':
+            return 200, 'text/plain; version=0.0.4', REGISTRY.render()
+        return 404, 'text/plain', 'not found\n'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # ヘッダーは読み捨てる
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?')[0] if len(parts) >= 2 else '/'
+            if parts and parts[0] not in ('GET', 'HEAD'):
+                status, content_type, body = 405, 'text/plain', 'method not allowed\n'
+            else:
+                status, content_type, body = self._respond(path)
+            payload = body.encode('utf-8')
+            reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}[status]
+            writer.write(
+                f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode('latin-1')
+            )
+            if parts and parts[0] != 'HEAD':
+                writer.write(payload)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.warning(f"Status request failed: {e}")
+        finally:
+            writer.close()
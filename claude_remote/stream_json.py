@@ -0,0 +1,98 @@
+import json
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+
+class StreamJsonParser:
+    """Claude CLIの `--output-format stream-json` 出力を逐次解析するパーサー
+
+    1行ずつ `feed()` に渡すと、ツール呼び出し・アシスタントメッセージ・
+    最終結果・トークン使用量・コストを到着順に集計する。
+    JSONとして解釈できない行（CLI自体のエラー出力など）はプレーンテキストとして保持する。
+    """
+
+    def __init__(self, question_detector: Optional[Callable[[str], List[str]]] = None,
+                 tail_lines: int = 50):
+        # アシスタントのテキストが届くたびに呼ばれ、検出した質問を返す
+        self.question_detector = question_detector
+        self.questions: List[str] = []
+        self.session_id: Optional[str] = None
+        self.model: Optional[str] = None
+        self.assistant_texts: List[str] = []
+        self.tool_calls: List[Dict] = []
+        self.result_text: Optional[str] = None
+        self.is_error = False
+        self.num_turns = 0
+        self.duration_ms = 0
+        self.cost_usd = 0.0
+        self.usage: Dict[str, int] = {}
+        self.plain_lines: Deque[str] = deque(maxlen=tail_lines)
+
+    def feed(self, line: str) -> Optional[Dict]:
+        """1行を解析し、JSONイベントであればそれを返す"""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.plain_lines.append(line)
+            return None
+        if not isinstance(event, dict):
+            self.plain_lines.append(line)
+            return None
+
+        event_type = event.get('type')
+        if event_type == 'system':
+            self.session_id = event.get('session_id', self.session_id)
+            self.model = event.get('model', self.model)
+        elif event_type == 'assistant':
+            self._handle_assistant(event.get('message') or {})
+        elif event_type == 'result':
+            self._handle_result(event)
+        return event
+
+    def _handle_assistant(self, message: Dict):
+        for block in message.get('content') or []:
+            if block.get('type') == 'text':
+                text = block.get('text', '')
+                self.assistant_texts.append(text)
+                if self.question_detector:
+                    self.questions.extend(self.question_detector(text))
+            elif block.get('type') == 'tool_use':
+                self.tool_calls.append({
+                    'name': block.get('name'),
+                    'input': block.get('input', {}),
+                })
+
+    def _handle_result(self, event: Dict):
+        self.result_text = event.get('result')
+        self.is_error = bool(event.get('is_error', False))
+        self.num_turns = event.get('num_turns', self.num_turns)
+        self.duration_ms = event.get('duration_ms', self.duration_ms)
+        self.cost_usd = event.get('total_cost_usd', event.get('cost_usd', self.cost_usd)) or 0.0
+        usage = event.get('usage') or {}
+        self.usage = {k: v for k, v in usage.items() if isinstance(v, int)}
+
+    @property
+    def has_result(self) -> bool:
+        return self.result_text is not None
+
+    @property
+    def text(self) -> str:
+        """アシスタントの発言とプレーンテキスト出力を連結したテキスト"""
+        return '\n'.join(self.assistant_texts + list(self.plain_lines))
+
+    def stats(self) -> Dict:
+        """実行ごとのトークン・コスト集計"""
+        return {
+            'session_id': self.session_id,
+            'num_turns': self.num_turns,
+            'duration_ms': self.duration_ms,
+            'cost_usd': self.cost_usd,
+            'input_tokens': self.usage.get('input_tokens', 0),
+            'output_tokens': self.usage.get('output_tokens', 0),
+            'cache_read_input_tokens': self.usage.get('cache_read_input_tokens', 0),
+            'cache_creation_input_tokens': self.usage.get('cache_creation_input_tokens', 0),
+            'tool_calls': len(self.tool_calls),
+        }
@@ -0,0 +1,186 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from .config import Config
+from .job_queue import default_worker_id
+
+logger = logging.getLogger(__name__)
+
+# 子プロセスが正常に動いていたとみなす時間（これより長く動いていれば再起動の待ち時間を戻す）
+STABLE_AFTER = 60.0
+
+
+def _isolate(name: str):
+    """子プロセスごとにメトリクスの出力先を分ける"""
+    metrics_file = Config.METRICS_FILE
+    Config.METRICS_FILE = metrics_file.with_name(f'{metrics_file.stem}-{name}{metrics_file.suffix}')
+
+
+def run_role(name: str, role: str, notification_queue=None, worker_id: Optional[str] = None):
+    """監視（dispatcher）または実行（worker）の子プロセス"""
+    from .main import ClaudeRemote
+
+    _isolate(name)
+    if worker_id:
+        Config.WORKER_ID = worker_id
+    if role == 'worker':
+        # 状態取得エンドポイントは監視プロセスだけが持つ
+        Config.STATUS_ENABLED = False
+
+    async def run():
+        app = ClaudeRemote(role, notification_queue=notification_queue)
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, app.shutdown_event.set)
+        await app.run()
+
+    asyncio.run(run())
+
+
+def run_notifier(name: str, notification_queue):
+    """ワーカーから受け取った通知を送信する子プロセス（アウトボックスはここだけが持つ）"""
+    from .notification_dispatcher import NotificationDispatcher
+    from .slack_notifier import SlackNotifier
+
+    _isolate(name)
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+    dispatcher = NotificationDispatcher(
+        Config.SLACK_WEBHOOK_URL,
+        digest=SlackNotifier.build_digest,
+        outbox_path=Config.SLACK_OUTBOX_PATH if Config.SLACK_OUTBOX_ENABLED else None,
+    )
+    print(f"Notifier started (pid {multiprocessing.current_process().pid})")
+    while not stopping:
+        try:
+            item = notification_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        except (EOFError, OSError):
+            break
+        dispatcher.submit(**item)
+
+    # 停止前に届いていた通知も送る
+    while True:
+        try:
+            dispatcher.submit(**notification_queue.get_nowait())
+        except (queue.Empty, EOFError, OSError):
+            break
+    dispatcher.close()
+
+
+@dataclass
+class Child:
+    name: str
+    target: Callable
+    args: Tuple
+    process: Optional[multiprocessing.Process] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    backoff: float = 1.0
+    restart_at: Optional[float] = None
+    history: List[int] = field(default_factory=list)  # 異常終了時の終了コード
+
+
+class Supervisor:
+    """監視・実行・通知を別々のプロセスで動かし、異常終了したものを再起動する
+
+    監視プロセスはノートの走査とジョブ登録だけを行い、ジョブは共有キュー（SQLite/ファイル）を
+    介して実行プロセスに渡る。実行プロセスの通知はプロセス間キューで通知プロセスに送られる。
+    実行プロセスが落ちても、同じワーカーIDで再起動したときにリース中のジョブを回収する。
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.ctx = multiprocessing.get_context('spawn')
+        self.notification_queue = self.ctx.Queue(maxsize=Config.SLACK_QUEUE_SIZE)
+        base_id = default_worker_id()
+        self.children = [Child('watcher', run_role, ('watcher', 'dispatcher'))]
+        for i in range(1, (workers or Config.PROCESS_WORKERS) + 1):
+            name = f'worker-{i}'
+            self.children.append(Child(name, run_role, (name, 'worker', self.notification_queue, f'{base_id}-w{i}')))
+        # 通知プロセスは最後に止める（ワーカーの最後の通知を受け取るため）
+        self.children.append(Child('notifier', run_notifier, ('notifier', self.notification_queue)))
+        self.stopping = False
+
+    def _start(self, child: Child):
+        child.process = self.ctx.Process(target=child.target, args=child.args, name=f'claude-remote-{child.name}')
+        child.process.start()
+        child.started_at = time.monotonic()
+        child.restart_at = None
+        print(f"Started {child.name} (pid {child.process.pid})")
+
+    def check(self):
+        """終了した子プロセスを、待ち時間を空けて再起動する"""
+        now = time.monotonic()
+        for child in self.children:
+            if child.restart_at is not None:
+                if now >= child.restart_at:
+                    child.restarts += 1
+                    self._start(child)
+                continue
+            if child.process is None or child.process.is_alive():
+                continue
+            exitcode = child.process.exitcode
+            child.history.append(exitcode)
+            if now - child.started_at >= STABLE_AFTER:
+                child.backoff = 1.0
+            print(f"{child.name} exited with code {exitcode}, restarting in {child.backoff:.0f}s")
+            child.restart_at = now + child.backoff
+            child.backoff = min(Config.PROCESS_RESTART_BACKOFF_MAX, child.backoff * 2)
+
+    def stop(self, timeout: float = 30):
+        """監視→実行→通知の順にSIGTERMで止め、応答しなければ強制終了する"""
+        self.stopping = True
+        for child in self.children:
+            process = child.process
+            if process is None or not process.is_alive():
+                continue
+            process.terminate()
+            process.join(timeout)
+            if process.is_alive():
+                print(f"{child.name} did not stop in {timeout:.0f}s, killing")
+                process.kill()
+                process.join()
+        self.notification_queue.close()
+
+    def run(self):
+        Config.validate()
+        print(f"Claude Remote supervisor started ({len(self.children)} processes)")
+
+        def request_stop(signum, frame):
+            self.stopping = True
+
+        def forward_dump(signum, frame):
+            # 診断情報は監視・実行プロセスがそれぞれ書き出す
+            for child in self.children:
+                if child.target is run_role and child.process is not None and child.process.is_alive():
+                    os.kill(child.process.pid, signal.SIGUSR1)
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGUSR1, forward_dump)
+
+        for child in self.children:
+            self._start(child)
+        try:
+            while not self.stopping:
+                self.check()
+                time.sleep(0.5)
+        finally:
+            print("\nShutting down processes...")
+            self.stop()
@@ -0,0 +1,170 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .config import Config
+
+# ノート内にこの指定があれば、トップレベルのタスクを互いに独立したものとして並列実行する
+PARALLEL_DIRECTIVE = re.compile(r'claude-remote\s*:\s*parallel', re.IGNORECASE)
+DIRECTIVE_LINE = re.compile(r'^\s*(?:<!--\s*)?claude-remote\s*:\s*parallel\s*(?:-->)?\s*$', re.IGNORECASE)
+
+CHECKBOX_PATTERN = re.compile(r'^[-*+] \[([ xX])\] (.+)$')
+HEADING_PATTERN = re.compile(r'^(#{1,6}) (.+?)\s*$')
+
+# 見出しタスクの完了印（付いている見出しは次回以降実行しない）
+DONE_MARK = '✅'
+
+# このシステムが追記する見出し（タスクとして扱わない）
+REPORT_HEADING = 'タスクの実行結果'
+SYSTEM_HEADINGS = (REPORT_HEADING, 'Claude からの質問')
+
+TASK_INSTRUCTION = (
+    "このノートには互いに独立した複数のタスクがあり、それぞれ別の作業ディレクトリで並行して実行されています。"
+    "次のタスクだけを、現在の作業ディレクトリで実行してください。"
+)
+
+
+@dataclass
+class NoteTask:
+    """ノート内の1タスク（チェックボックス項目または見出しセクション）"""
+    number: int
+    kind: str  # 'checkbox' / 'heading'
+    title: str
+    line: str  # 元の先頭行（書き戻し時の照合用）
+    body: str
+
+    @property
+    def workspace(self) -> str:
+        """タスクの作業ディレクトリ名（並び順が変わっても同じタスクは同じ場所になるよう見出しから決める）"""
+        slug = re.sub(r'[^a-z0-9]+', '-', self.title.lower()).strip('-')[:40] or 'task'
+        return f"{slug}-{hashlib.md5(self.title.encode('utf-8')).hexdigest()[:6]}"
+
+
+@dataclass
+class TaskPlan:
+    context: str  # タスク以外の記述（全タスク共通の前提として渡す）
+    tasks: List[NoteTask]
+
+    def prompt(self, task: NoteTask) -> str:
+        parts = [self.context] if self.context else []
+        parts += [TASK_INSTRUCTION, task.body]
+        return '\n\n'.join(parts)
+
+
+def _checkbox_blocks(lines: List[str]) -> Optional[List[Dict]]:
+    """トップレベルのチェックボックス項目を、インデントされた続きの行ごとに切り出す"""
+    blocks, current = [], None
+    for i, line in enumerate(lines):
+        match = CHECKBOX_PATTERN.match(line)
+        if match:
+            current = {'start': i, 'end': i + 1, 'done': match.group(1) != ' ', 'title': match.group(2).strip()}
+            blocks.append(current)
+        elif current is not None and (line.startswith((' ', '\t')) or (not line.strip() and i + 1 < len(lines)
+                                                                       and lines[i + 1].startswith((' ', '\t')))):
+            current['end'] = i + 1
+        else:
+            current = None
+    return blocks or None
+
+
+def _heading_blocks(lines: List[str]) -> Optional[List[Dict]]:
+    """2つ以上ある見出しのうち最も浅いレベルで、ノートをセクションに分ける"""
+    headings = [(i, len(m.group(1)), m.group(2)) for i, m in
+                ((i, HEADING_PATTERN.match(line)) for i, line in enumerate(lines)) if m]
+    levels = [level for _, level, _ in headings]
+    candidates = [level for level in sorted(set(levels)) if levels.count(level) >= 2]
+    if not candidates:
+        return None
+    level = candidates[0]
+    blocks = []
+    for i, heading_level, title in headings:
+        if heading_level < level or title.startswith(SYSTEM_HEADINGS):
+            if blocks and blocks[-1]['end'] is None:
+                blocks[-1]['end'] = i
+            continue
+        if heading_level == level:
+            if blocks and blocks[-1]['end'] is None:
+                blocks[-1]['end'] = i
+            done = title.endswith(DONE_MARK)
+            blocks.append({'start': i, 'end': None, 'done': done, 'title': title.rstrip(DONE_MARK).strip()})
+    if blocks and blocks[-1]['end'] is None:
+        blocks[-1]['end'] = len(lines)
+    return blocks or None
+
+
+def split_tasks(content: str, max_tasks: Optional[int] = None) -> Optional[TaskPlan]:
+    """並列実行が指定されたノートをタスクに分ける
+
+    トップレベルのチェックボックス（なければ見出しセクション）を独立したタスクとし、
+    それ以外の記述は共通の前提として各タスクのプロンプトに含める。完了済みの項目
+    （`[x]` や完了印付きの見出し）は実行しない。指定がない・未完了のタスクが2つ未満・
+    上限を超える場合は None（ノート全体を1回で実行する）。
+    """
+    if not PARALLEL_DIRECTIVE.search(content):
+        return None
+    max_tasks = max_tasks or Config.TASK_SPLIT_MAX_TASKS
+    lines = content.replace('\r\n', '\n').split('\n')
+    kind = 'checkbox'
+    blocks = _checkbox_blocks(lines)
+    if blocks is None:
+        kind = 'heading'
+        blocks = _heading_blocks(lines)
+    if not blocks:
+        return None
+
+    in_task = set()
+    for block in blocks:
+        in_task.update(range(block['start'], block['end']))
+    context = '\n'.join(
+        line for i, line in enumerate(lines) if i not in in_task and not DIRECTIVE_LINE.match(line)
+    ).strip()
+
+    tasks = []
+    for block in blocks:
+        if block['done']:
+            continue
+        tasks.append(NoteTask(
+            number=len(tasks) + 1,
+            kind=kind,
+            title=block['title'],
+            line=lines[block['start']],
+            body='\n'.join(lines[block['start']:block['end']]).strip(),
+        ))
+    if len(tasks) < 2:
+        return None
+    if len(tasks) > max_tasks:
+        print(f"Note has {len(tasks)} parallel tasks (limit {max_tasks}), running it as a single task")
+        return None
+    return TaskPlan(context=context, tasks=tasks)
+
+
+def _mark_done(task: NoteTask) -> str:
+    if task.kind == 'checkbox':
+        return re.sub(r'\[ \]', '[x]', task.line, count=1)
+    return f"{task.line.rstrip()} {DONE_MARK}"
+
+
+def apply_statuses(content: str, outcomes: List[Dict]) -> str:
+    """タスクごとの結果をノートに書き戻す
+
+    成功したタスクは完了印を付け（チェックボックスは `[x]`、見出しは末尾に完了印）、
+    全タスクの結果を末尾の一覧に追記する。outcomes は `{'task', 'success', 'message'}` のリスト。
+    """
+    lines = content.replace('\r\n', '\n').split('\n')
+    for outcome in outcomes:
+        if not outcome['success']:
+            continue
+        task = outcome['task']
+        # 実行中にノートが編集されていても、元の行が残っていれば書き換える
+        if task.line in lines:
+            lines[lines.index(task.line)] = _mark_done(task)
+
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    report = ['', '---', f'## {REPORT_HEADING} ({timestamp})', '']
+    for outcome in outcomes:
+        mark = DONE_MARK if outcome['success'] else '❌'
+        message = ' '.join(outcome['message'].split())[:200]
+        report.append(f"- {mark} {outcome['task'].title}: {message}")
+    return '\n'.join(lines).rstrip('\n') + '\n' + '\n'.join(report) + '\n'
@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import hashlib
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from .admission import AdmissionController
+from .config import Config
+from .job_queue import QueueBackend, default_worker_id
+from .metrics import count, span
+from .status import record_error
+
+
+class SystemWriteRecorder:
+    """ワーカーがノートに書き込んだ内容をキュー経由でディスパッチャーに伝える
+
+    ワーカーノードにはファイル監視がないため、質問の追記などで変わったノートの
+    ハッシュをキューに記録し、ディスパッチャーがその変更を再実行しないようにする。
+    """
+
+    def __init__(self, job_queue: QueueBackend):
+        self.job_queue = job_queue
+
+    def mark_file_as_system_modified(self, file_path: Path):
+        try:
+            with open(file_path, 'rb') as f:
+                content_hash = hashlib.md5(f.read()).hexdigest()
+            self.job_queue.record_system_write(file_path, content_hash)
+        except Exception as e:
+            print(f"Failed to record system write for {file_path}: {e}")
+
+
+class SlotPool:
+    """ジョブとノート内の分割タスクで共有する同時実行枠
+
+    ジョブは開始時に1枠を取り（取れなければ開始しない）、並列実行するノートは
+    追加のタスク用に枠を待つ。空いた枠は待っているタスクに先に渡すため、
+    実行中のノートのタスクが新しいジョブより優先される。枠の数は resize で
+    変えられ、減らしたときは使用中の枠が返されるのを待って減らす。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.in_use = 0
+        self._waiters: "collections.deque[asyncio.Future]" = collections.deque()
+
+    def try_acquire(self) -> bool:
+        if self.in_use >= self.size or self._waiters:
+            return False
+        self.in_use += 1
+        return True
+
+    async def acquire(self):
+        if self.in_use < self.size and not self._waiters:
+            self.in_use += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 枠を受け取った直後に取り消された
+                self.release()
+            elif waiter in self._waiters:
+                # 取り消し後、ここに戻るまでに release / resize が取り出していることがある
+                self._waiters.remove(waiter)
+            raise
+
+    def resize(self, size: int):
+        self.size = size
+        # 増えた枠は待っているタスクに渡す
+        while self.in_use < self.size and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_use += 1
+                waiter.set_result(None)
+
+    def release(self):
+        # 枠を減らした直後でなければ、待っているタスクに枠をそのまま引き渡す
+        while self._waiters and self.in_use <= self.size:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_use -= 1
+
+
+class Worker:
+    """共有キューからジョブをリースして実行する
+
+    実行中のジョブはハートビートでリースを延長し、キャンセル要求（プリエンプション）を受け取る。
+    リースを失った（期限切れで他のワーカーに再割り当てされた）ジョブはローカルで停止する。
+    """
+
+    def __init__(self, job_queue: QueueBackend, claude_executor, worker_id: Optional[str] = None,
+                 max_concurrent: Optional[int] = None):
+        self.job_queue = job_queue
+        self.claude_executor = claude_executor
+        self.worker_id = worker_id or default_worker_id()
+        self.max_concurrent = max_concurrent or Config.MAX_CONCURRENT_EXECUTIONS
+        # ホストの負荷に応じて同時実行数を上下させる（無効なら max_concurrent で固定）
+        self.admission = AdmissionController(self.max_concurrent) if Config.ADMISSION_CONTROL_ENABLED else None
+        self.slots = SlotPool(self.admission.limit if self.admission else self.max_concurrent)
+        self.running: Dict[int, Tuple[Path, asyncio.Task]] = {}
+        self.preempted_jobs: Set[int] = set()
+        self.lost_jobs: Set[int] = set()
+        self.stopping = False
+
+    def recover(self) -> int:
+        """このワーカーIDで前回中断したジョブを再投入"""
+        return self.job_queue.recover(self.worker_id)
+
+    def fill_slots(self):
+        """同時実行数の上限までジョブをリースして開始"""
+        if self.admission is not None and not self.stopping:
+            admitted = self.admission.update(self.slots.in_use)
+            self.slots.resize(self.admission.limit)
+            if not admitted:
+                # 負荷が高い間は新しい実行を始めない
+                count('launch_deferred')
+                return
+        while not self.stopping and self.slots.try_acquire():
+            job = self.job_queue.lease(self.worker_id)
+            if job is None:
+                self.slots.release()
+                return
+            self._start_task(job)
+
+    def _start_task(self, job: Dict):
+        """リースしたジョブの実行タスクを開始"""
+        file_path = Path(job['file_path'])
+        print(f"Processing file change: {file_path} (job {job['id']}, worker {self.worker_id})")
+
+        with span('dispatch'):
+            task = asyncio.create_task(
+                self.claude_executor.execute(
+                    file_path,
+                    job['content'],
+                    None,
+                    detected_at=job['detected_at'],
+                    slots=self.slots
+                )
+            )
+            self.running[job['id']] = (file_path, task)
+
+            # タスク完了時の結果報告と次のジョブの開始
+            task.add_done_callback(lambda t: self._on_task_done(job['id'], t))
+
+    def _on_task_done(self, job_id: int, task: asyncio.Task):
+        self.running.pop(job_id, None)
+        self.slots.release()
+
+        if task.cancelled():
+            if job_id in self.preempted_jobs:
+                self.preempted_jobs.discard(job_id)
+                self.job_queue.cancel(job_id)
+            elif job_id in self.lost_jobs:
+                # 他のワーカーに再割り当て済みなので報告しない
+                self.lost_jobs.discard(job_id)
+            else:
+                # シャットダウンによる中断は再実行できるよう未実行に戻す
+                self.job_queue.release(job_id, self.worker_id)
+        elif task.exception() is not None:
+            record_error('job', f"Job {job_id} raised: {task.exception()}")
+            self.job_queue.complete(job_id, self.worker_id, False, str(task.exception()))
+        else:
+            success, summary = task.result()
+            if not success:
+                record_error('job', f"Job {job_id} failed: {summary}")
+            self.job_queue.complete(job_id, self.worker_id, success, summary)
+
+        if not self.stopping:
+            self.fill_slots()
+
+    async def heartbeat(self):
+        """実行中のジョブのリースを延長し、キャンセル要求・リース喪失に対応"""
+        for job_id, (file_path, task) in list(self.running.items()):
+            status = self.job_queue.heartbeat(job_id, self.worker_id)
+            if status == 'cancel':
+                await self._handle_cancel_request(job_id, file_path, task)
+            elif status == 'lost':
+                print(f"Lease lost for job {job_id} ({file_path}), stopping local run")
+                count('lease_lost')
+                self.lost_jobs.add(job_id)
+                await self._stop_task(file_path, task)
+
+    async def _handle_cancel_request(self, job_id: int, file_path: Path, task: asyncio.Task):
+        # 完了間近のランは保護し、新しいジョブは完了後に実行する
+        protected = self.claude_executor.protection_reason(file_path)
+        if protected:
+            print(f"Deferring change for {file_path}: {protected}")
+            count('change_deferred')
+            self.job_queue.clear_cancel(job_id)
+            return
+
+        print(f"Preempting running task for {file_path} (job {job_id})")
+        count('run_preempted')
+        self.preempted_jobs.add(job_id)
+        await self._stop_task(file_path, task)
+
+    async def _stop_task(self, file_path: Path, task: asyncio.Task):
+        await self.claude_executor.cancel_run(file_path)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def run(self, shutdown_event: asyncio.Event):
+        """停止されるまでジョブのリース・ハートビート・期限切れリースの回収を繰り返す"""
+        last_heartbeat = 0.0
+        while not shutdown_event.is_set():
+            try:
+                if time.monotonic() - last_heartbeat >= Config.HEARTBEAT_INTERVAL:
+                    last_heartbeat = time.monotonic()
+                    await self.heartbeat()
+                    reclaimed = self.job_queue.reclaim_expired()
+                    if reclaimed:
+                        print(f"Reclaimed {reclaimed} job(s) with expired leases")
+                self.fill_slots()
+            except Exception as e:
+                print(f"Worker error: {e}")
+                record_error('worker', str(e))
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=Config.QUEUE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """実行中のタスクをキャンセル（ジョブは未実行に戻る）"""
+        self.stopping = True
+        if self.running:
+            print("Cancelling running tasks...")
+            tasks = [task for _, task in self.running.values()]
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # キャンセル完了を待機
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,213 @@
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import time
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# 実行ログのインデックスに記録するパスの上限
+MAX_LOGGED_PATHS = 50
+
+# 記録時刻からこの範囲内に更新されたファイルは、statが同じでも次回ハッシュし直す
+# （同じmtimeのまま書き換えられた変更を見逃さないため）
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+@dataclass
+class ManifestDiff:
+    """2回の記録の間に追加・変更・削除されたファイル"""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    bytes_added: int = 0  # 追加されたファイルのサイズと、変更で増えた分
+    bytes_removed: int = 0  # 削除されたファイルのサイズと、変更で減った分
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.modified or self.deleted)
+
+    def paths(self) -> List[str]:
+        return ([f'+ {p}' for p in self.added] + [f'~ {p}' for p in self.modified]
+                + [f'- {p}' for p in self.deleted])
+
+    def describe(self) -> str:
+        """`+2 ~1 -0 files (+3.4KB / -120B)` の形式の1行"""
+        return (f"+{len(self.added)} ~{len(self.modified)} -{len(self.deleted)} files "
+                f"(+{format_bytes(self.bytes_added)} / -{format_bytes(self.bytes_removed)})")
+
+    def summary(self, limit: int = 10) -> str:
+        """Slack通知用の変更一覧（先頭 limit 件まで）"""
+        paths = self.paths()
+        lines = [self.describe()] + paths[:limit]
+        if len(paths) > limit:
+            lines.append(f'… 他 {len(paths) - limit} 件')
+        return '\n'.join(lines)
+
+    def stats(self) -> Dict:
+        """実行ログのインデックスに記録する項目"""
+        return {
+            'files_added': len(self.added),
+            'files_modified': len(self.modified),
+            'files_deleted': len(self.deleted),
+            'bytes_added': self.bytes_added,
+            'bytes_removed': self.bytes_removed,
+            'changed_files': self.paths()[:MAX_LOGGED_PATHS],
+        }
+
+
+class WorkspaceManifest:
+    """プロジェクトのワークスペースにあるファイルのパス・サイズ・mtime・ハッシュの記録
+
+    実行の前後に refresh() で差分更新し、実行中に変わったファイルを求める。
+    サイズとmtimeが前回と同じファイルは読まずに前回のハッシュを使うため、2回目以降は
+    ディレクトリの走査とstatだけで済む。WORKSPACE_MANIFEST_IGNORE に一致するファイル・
+    ディレクトリ（node_modules など）は中に入らない。
+    """
+
+    def __init__(self, root: Path, manifest_file: Path, ignore: Optional[Sequence[str]] = None,
+                 max_hash_bytes: Optional[int] = None):
+        self.root = root
+        self.manifest_file = manifest_file
+        ignore = Config.WORKSPACE_MANIFEST_IGNORE if ignore is None else ignore
+        # `/` を含むパターンはワークスペースからの相対パス、それ以外は名前に一致させる
+        self._name_pattern = self._compile([p for p in ignore if '/' not in p])
+        self._path_pattern = self._compile([p.strip('/') for p in ignore if '/' in p])
+        self.max_hash_bytes = max_hash_bytes if max_hash_bytes is not None else Config.WORKSPACE_MANIFEST_MAX_HASH_BYTES
+        self.files: Dict[str, List] = {}  # 相対パス -> [size, mtime_ns, digest]
+        self.recorded_at_ns = 0
+        self.hashed = 0  # 直近の refresh でハッシュを計算したファイル数
+        self._load()
+
+    @staticmethod
+    def _compile(patterns: List[str]) -> Optional[re.Pattern]:
+        if not patterns:
+            return None
+        return re.compile('|'.join(fnmatch.translate(p) for p in patterns))
+
+    def _load(self):
+        try:
+            if self.manifest_file.exists():
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.files = data['files']
+                    self.recorded_at_ns = data.get('recorded_at_ns', 0)
+        except Exception as e:
+            logger.warning(f"Failed to load workspace manifest {self.manifest_file}: {e}")
+            self.files = {}
+
+    def _save(self):
+        """マニフェストをアトミックに保存"""
+        try:
+            self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.manifest_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'recorded_at_ns': self.recorded_at_ns,
+                           'files': self.files}, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_file, self.manifest_file)
+        except Exception as e:
+            logger.error(f"Failed to save workspace manifest {self.manifest_file}: {e}")
+
+    def _ignored(self, name: str, rel_path: str) -> bool:
+        return bool((self._name_pattern and self._name_pattern.match(name))
+                    or (self._path_pattern and self._path_pattern.match(rel_path)))
+
+    def _walk(self) -> Iterator[Tuple[str, os.stat_result]]:
+        """無視するディレクトリの中には入らずに、通常ファイルの相対パスとstatを返す"""
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            try:
+                entries = os.scandir(os.path.join(self.root, rel_dir))
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if self._ignored(entry.name, rel_path):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(rel_path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield rel_path, entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+
+    def _hash(self, rel_path: str, stat: os.stat_result) -> str:
+        if stat.st_size > self.max_hash_bytes:
+            # 大きなファイルは内容を読まずにサイズとmtimeで比較する
+            return f"stat:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.md5()
+        with open(os.path.join(self.root, rel_path), 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def refresh(self) -> ManifestDiff:
+        """ワークスペースを走査してマニフェストを更新し、前回からの差分を返す"""
+        scanned_at_ns = time.time_ns()
+        racy_after = self.recorded_at_ns - RACY_WINDOW_NS
+        previous = self.files
+        files: Dict[str, List] = {}
+        diff = ManifestDiff()
+        self.hashed = 0
+        for rel_path, stat in self._walk():
+            old = previous.get(rel_path)
+            if (old is not None and old[0] == stat.st_size and old[1] == stat.st_mtime_ns
+                    and stat.st_mtime_ns < racy_after):
+                files[rel_path] = old
+                continue
+            try:
+                digest = self._hash(rel_path, stat)
+            except OSError:
+                continue
+            self.hashed += 1
+            files[rel_path] = [stat.st_size, stat.st_mtime_ns, digest]
+            if old is None:
+                diff.added.append(rel_path)
+                diff.bytes_added += stat.st_size
+            elif old[2] != digest:
+                diff.modified.append(rel_path)
+                delta = stat.st_size - old[0]
+                if delta >= 0:
+                    diff.bytes_added += delta
+                else:
+                    diff.bytes_removed -= delta
+        for rel_path, old in previous.items():
+            if rel_path not in files:
+                diff.deleted.append(rel_path)
+                diff.bytes_removed += old[0]
+        for paths in (diff.added, diff.modified, diff.deleted):
+            paths.sort()
+
+        self.files = files
+        self.recorded_at_ns = scanned_at_ns
+        self._save()
+        return diff
+
+    def fingerprint(self) -> str:
+        """ファイル構成と内容のハッシュからワークスペース状態のフィンガープリントを計算"""
+        digest = hashlib.sha256()
+        for rel_path in sorted(self.files):
+            size, _, file_digest = self.files[rel_path]
+            digest.update(f"{rel_path}\0{size}\0{file_digest}\n".encode('utf-8'))
+        return digest.hexdigest()
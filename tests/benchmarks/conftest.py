@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from claude_remote.project_manager import ProjectManager
+from claude_remote.project_metadata import ProjectInfo
+
+SAMPLE_QUESTIONS = (
+    "I need some clarification before I continue:\n"
+    "1. What specific arithmetic operations should it support?\n"
+    "2. Should this be a command-line interface or a GUI application?\n"
+    "3. Do you need error handling for invalid inputs?\n"
+)
+
+
+def pytest_collection_modifyitems(config, items):
+    """ベンチマークは `make bench`（--benchmark-only）のときだけ実行する"""
+    if config.getoption('benchmark_only', default=False):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with `make bench`")
+    benchmarks_dir = Path(__file__).parent
+    for item in items:
+        if benchmarks_dir in item.path.parents:
+            item.add_marker(skip)
+
+
+def build_stream_log(size_bytes: int) -> str:
+    """ツール出力が大半で、ときどき質問を含む stream-json ログを作る"""
+    tool_output = ('Wrote 42 lines to src/calculator/operations.py (build step ok)\n' * 200)
+    events = [
+        json.dumps({'type': 'assistant', 'message': {'content': [{'type': 'text', 'text': 'Working on the next step.'}]}}),
+        json.dumps({'type': 'user', 'message': {'content': [{'type': 'tool_result', 'content': tool_output}]}}),
+        json.dumps({'type': 'assistant', 'message': {'content': [{'type': 'text', 'text': SAMPLE_QUESTIONS}]}}),
+    ]
+    chunk = '\n'.join(events) + '\n'
+    return chunk * max(1, size_bytes // len(chunk))
+
+
+@pytest.fixture(scope='session')
+def stream_logs():
+    return {size: build_stream_log(size * 1024 * 1024) for size in (1, 10)}
+
+
+@pytest.fixture(scope='session')
+def projects_factory(tmp_path_factory):
+    """指定数のプロジェクトを持つディレクトリを作る（同じ数は使い回す）"""
+    created = {}
+
+    def make(count: int):
+        if count not in created:
+            projects_dir = tmp_path_factory.mktemp(f'projects_{count}')
+            manager = ProjectManager(projects_dir)
+            for i in range(count):
+                project_path = projects_dir / f'project_{i:05d}'
+                (project_path / 'src').mkdir(parents=True)
+                manager.metadata.save(project_path, ProjectInfo(
+                    temp_name=project_path.name,
+                    source_file=f'/notes/note_{i:05d}.md',
+                    created_at='20260101_000000',
+                    working_directory=str(project_path / 'src'),
+                ))
+            created[count] = projects_dir
+        return created[count]
+
+    return make
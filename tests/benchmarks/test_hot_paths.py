@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""ホットパスのマイクロベンチマーク（`make bench` でベースラインと比較する）"""
+
+import asyncio
+import hashlib
+
+import pytest
+
+from claude_remote.claude_executor import ClaudeExecutor
+from claude_remote.hash_file_watcher import HashFileWatcher
+from claude_remote.project_manager import ProjectManager
+from claude_remote.slack_notifier import SlackNotifier
+
+
+class RecordingDispatcher:
+    """組み立てたSlackのペイロードを送らずに受け取る"""
+
+    def __init__(self):
+        self.messages = []
+
+    def submit(self, message, **kwargs):
+        self.messages.append(message)
+        return True
+
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    notes_dir = tmp_path / 'notes'
+    notes_dir.mkdir()
+    return HashFileWatcher(notes_dir)
+
+
+@pytest.fixture
+def executor():
+    return ClaudeExecutor(None, SlackNotifier(dispatcher=RecordingDispatcher()))
+
+
+def fill_hashes(watcher, entries):
+    watcher.file_hashes = {
+        str(watcher.watch_path / f'note_{i:06d}.md'): hashlib.md5(str(i).encode()).hexdigest()
+        for i in range(entries)
+    }
+
+
+@pytest.mark.parametrize('entries', [1_000, 10_000, 100_000])
+def test_has_content_changed(benchmark, watcher, entries):
+    fill_hashes(watcher, entries)
+    note = watcher.watch_path / f'note_{entries // 2:06d}.md'
+    note.write_text('# note\n' + 'line\n' * 200, encoding='utf-8')
+    assert benchmark(watcher._has_content_changed, note)
+
+
+@pytest.mark.parametrize('entries', [1_000, 10_000, 100_000])
+def test_save_cache(benchmark, watcher, entries):
+    fill_hashes(watcher, entries)
+    benchmark(watcher._save_cache)
+    assert watcher.cache_file.exists()
+
+
+@pytest.mark.parametrize('projects', [10, 1_000, 10_000])
+def test_get_project_by_source(benchmark, projects_factory, projects):
+    manager = ProjectManager(projects_factory(projects))
+    source = f'/notes/note_{projects // 2:05d}.md'
+    # 索引の構築は初回だけなので計測から外す
+    assert manager.get_project_by_source(source) is not None
+    assert benchmark(manager.get_project_by_source, source) is not None
+
+
+@pytest.mark.parametrize('size_mb', [1, 10])
+def test_check_and_append_questions(benchmark, executor, stream_logs, tmp_path, size_mb):
+    """ログを解析して質問を検出し、ノートに追記するまで"""
+    log = stream_logs[size_mb]
+    note = tmp_path / 'note.md'
+
+    def reset():
+        note.write_text('# note\nBuild a calculator\n', encoding='utf-8')
+
+    def run():
+        parser = executor._create_parser()
+        for line in log.splitlines():
+            parser.feed(line)
+        asyncio.run(executor._check_and_append_questions(note, parser.questions))
+        return parser.questions
+
+    questions = benchmark.pedantic(run, setup=reset, rounds=3 if size_mb >= 10 else 5)
+    assert any('GUI application' in q for q in questions)
+    assert 'Claude からの質問' in note.read_text(encoding='utf-8')
+
+
+def test_extract_summary(benchmark, executor, stream_logs):
+    assert benchmark(executor._extract_summary, stream_logs[1])
+
+
+def test_slack_payload_construction(benchmark):
+    dispatcher = RecordingDispatcher()
+    notifier = SlackNotifier(dispatcher=dispatcher)
+    summary = 'Implemented the calculator with tests. ' * 50
+    stats = 'ターン: 12 / ツール呼び出し: 30 / トークン: 12000→3400 / コスト: $0.1234'
+
+    def build():
+        notifier.notify_start('calculator', 'Build a calculator ' * 20, '/notes/calculator.md')
+        notifier.notify_complete('calculator', summary, '/notes/calculator.md', stats=stats)
+        notifier.notify_error('calculator', 'major', 'Claude Code実行エラー', summary, 'ログを確認してください')
+        return SlackNotifier.build_digest('complete', [f'project_{i}: done' for i in range(50)])
+
+    assert benchmark(build)['blocks']
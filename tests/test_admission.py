@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import json
+
+from claude_remote.admission import AdmissionController, HostSignals
+
+BUSY = HostSignals(load_per_cpu=0.2, memory_available=0.5, cpu_pressure=0.0, memory_pressure=25.0, io_pressure=0.0)
+IDLE = HostSignals(load_per_cpu=0.2, memory_available=0.5, cpu_pressure=0.0, memory_pressure=0.0, io_pressure=0.0)
+
+
+def test_controller_lowers_under_pressure_and_raises_when_saturated(tmp_path):
+    """Pressure lowers the limit and defers launches; an idle host with all slots busy raises it"""
+    signals = [BUSY]
+    log_file = tmp_path / 'admission.jsonl'
+    controller = AdmissionController(3, min_limit=1, max_limit=4, interval=0, log_file=log_file,
+                                     read_signals=lambda: signals[0])
+
+    assert controller.update(in_use=3) is False
+    assert controller.limit == 2
+    controller.update(in_use=3)
+    assert controller.update(in_use=3) is False
+    assert controller.limit == 1
+    assert controller.last_decision.action == 'defer'
+    assert 'memory pressure 25.0%' in controller.last_decision.reason
+
+    signals[0] = IDLE
+    assert controller.update(in_use=0) is True
+    assert controller.limit == 1
+    controller.update(in_use=1)
+    assert controller.limit == 2
+
+    decisions = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [d['action'] for d in decisions] == ['lower', 'lower', 'defer', 'hold', 'raise']
+    assert decisions[0]['signals']['memory_pressure'] == 25.0
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import time
+
+from claude_remote import diagnostics
+from claude_remote.diagnostics import Profiler, dump_diagnostics, profile_region
+
+
+def busy(seconds):
+    end = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < end:
+        total += sum(range(100))
+    return total
+
+
+def test_profile_region_is_a_shared_noop_when_disabled():
+    assert diagnostics.PROFILER is None
+    assert profile_region('scan') is profile_region('execute')
+
+
+def test_profiler_samples_only_inside_regions_and_writes_reports(tmp_path, monkeypatch):
+    """Samples taken inside a region are written as folded stacks and a per-function report"""
+    monkeypatch.setattr(diagnostics.Config, 'DIAGNOSTICS_DIR', tmp_path)
+    profiler = Profiler(tmp_path, 'test', sample_interval=0.002, dump_interval=3600, memory_frames=5)
+    monkeypatch.setattr(diagnostics, 'PROFILER', profiler)
+    profiler.start()
+    try:
+        busy(0.1)
+        assert not profiler.stacks
+        with profile_region('scan'):
+            busy(0.2)
+        assert profiler.region_stats['scan'][0] == 1
+        dump = dump_diagnostics('test')
+    finally:
+        profiler.stop()
+
+    assert 'Thread MainThread' in dump.read_text(encoding='utf-8')
+    report = next(tmp_path.glob('profile-signal-*.txt')).read_text(encoding='utf-8')
+    assert 'busy (test_diagnostics.py' in report
+    assert 'Traced memory' in report
+    folded = next(tmp_path.glob('profile-signal-*.folded')).read_text(encoding='utf-8')
+    assert all(line.startswith('scan;') for line in folded.splitlines())
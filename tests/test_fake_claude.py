@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from claude_remote import fake_claude
+from claude_remote.question_detector import QuestionDetector
+from claude_remote.stream_json import StreamJsonParser
+
+
+def run_fake(prompt, tmp_path, **env):
+    environ = {'FAKE_CLAUDE_LATENCY': '0', **{k: str(v) for k, v in env.items()}}
+    return subprocess.run(
+        [sys.executable, fake_claude.__file__, '--output-format', 'stream-json', '--print', prompt],
+        cwd=tmp_path, env=environ, capture_output=True, text=True, timeout=30
+    )
+
+
+def test_fake_claude_emits_stream_json(tmp_path):
+    """The stand-in produces events the executor's parser understands"""
+    proc = run_fake('build it', tmp_path, FAKE_CLAUDE_OUTPUT_BYTES=1000, FAKE_CLAUDE_QUESTIONS=2)
+    detector = QuestionDetector()
+    parser = StreamJsonParser(question_detector=detector.feed_text)
+    for line in proc.stdout.splitlines():
+        parser.feed(line)
+
+    assert proc.returncode == 0
+    assert parser.has_result and not parser.is_error
+    assert parser.stats()['tool_calls'] == 3
+    assert "Which framework should I use for module 1?" in parser.questions
+    assert "What should happen when input 2 is invalid?" in parser.questions
+    assert (tmp_path / 'fake_output_0.txt').exists()
+
+
+def test_fake_claude_prompt_directive_overrides_env(tmp_path):
+    """A `fake-claude:` line in the note selects the token-limit exit code"""
+    proc = run_fake('build it\nfake-claude: exit=129 tools=0', tmp_path, FAKE_CLAUDE_EXIT_CODE=1)
+    result = json.loads(proc.stdout.splitlines()[-1])
+    assert proc.returncode == 129
+    assert result['is_error'] is True
+
+
+@pytest.mark.integration
+def test_loadgen_runs_pipeline_end_to_end(tmp_path):
+    """A short load run completes jobs and sends notifications through the stub webhook"""
+    proc = subprocess.run(
+        [sys.executable, '-m', 'claude_remote.loadgen', '--json', '--notes', '3', '--rate', '2',
+         '--duration', '2', '--latency', '0.2', '--slots', '2', '--drain-timeout', '20',
+         '--workdir', str(tmp_path)],
+        cwd=Path(__file__).parent.parent, capture_output=True, text=True, timeout=120
+    )
+    assert proc.returncode == 0, proc.stderr
+    report = json.loads(proc.stdout)
+    assert report['states'].get('finished', 0) >= 1
+    assert report['notifications'] >= 2
+    assert report['queue_wait_s']['max'] is not None
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+
+import pytest
+
+from claude_remote.job_queue import FileSystemJobQueue, SQLiteJobQueue
+
+
+@pytest.fixture(params=['sqlite', 'filesystem'])
+def job_queue(request, tmp_path):
+    queue = SQLiteJobQueue(tmp_path / 'jobs.db') if request.param == 'sqlite' else FileSystemJobQueue(tmp_path / 'queue')
+    yield queue
+    queue.close()
+
+
+def test_preempted_note_is_run_once_with_the_newest_content(job_queue):
+    """A change that preempts a running job starts exactly one new run, after the old one is cancelled"""
+    note = Path('/notes/todo.md')
+    job_queue.enqueue(note, 'v1')
+    running = job_queue.lease('w1')
+
+    job_queue.enqueue(note, 'v2')
+    job_queue.enqueue(note, 'v3')
+    job_queue.request_cancel(running['id'])
+    # 実行中のノートの新しいジョブは、どのワーカーにもリースされない
+    assert job_queue.lease('w1') is None
+    assert job_queue.lease('w2') is None
+    assert job_queue.heartbeat(running['id'], 'w1') == 'cancel'
+
+    job_queue.cancel(running['id'])
+    rerun = job_queue.lease('w2')
+    assert rerun['content'] == 'v3'
+    # どちらのバックエンドもリース後の状態を返す
+    assert (rerun['state'], rerun['lease_owner'], rerun['attempts']) == ('running', 'w2', 1)
+    assert job_queue.lease('w1') is None
+
+
+def test_running_job_without_lease_expiry_is_reclaimed(tmp_path):
+    """Running rows from databases created before leases existed are reclaimed like the filesystem backend does"""
+    queue = SQLiteJobQueue(tmp_path / 'jobs.db')
+    job_id = queue.enqueue(Path('/notes/todo.md'), 'v1')
+    queue.conn.execute("UPDATE jobs SET state = 'running', lease_owner = 'old', lease_expires_at = NULL WHERE id = ?",
+                       (job_id,))
+    assert queue.reclaim_expired() == 1
+    assert queue.lease('w1')['id'] == job_id
+    queue.close()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import gzip
+import os
+import time
+
+from claude_remote.config import Config
+from claude_remote.log_store import LogStore
+
+
+def test_start_run_interrupts_runs_left_running_by_a_crash(tmp_path, monkeypatch):
+    """Runs still 'running' after CLAUDE_TIMEOUT are closed, compressed and become prunable"""
+    monkeypatch.setattr(Config, 'CLAUDE_TIMEOUT', 60)
+    monkeypatch.setattr(Config, 'LOG_COMPRESSION', 'gzip')
+    store = LogStore(tmp_path / 'logs')
+    crashed_id, crashed_log = store.start_run()
+    crashed_log.write_text('partial output\n', encoding='utf-8')
+    live_id, _ = store.start_run()
+
+    # 異常終了したランは1時間前に始まり、その後ログも更新されていない
+    entries = store._load_index()
+    entries[0]['started_at'] -= 3600
+    store._save_index(entries)
+    os.utime(crashed_log, (time.time() - 3600, time.time() - 3600))
+
+    store.start_run()
+    runs = {run['run_id']: run for run in store.list_runs()}
+    assert runs[crashed_id]['status'] == 'interrupted'
+    assert runs[live_id]['status'] == 'running'
+    with gzip.open(tmp_path / 'logs' / runs[crashed_id]['file'], 'rt', encoding='utf-8') as f:
+        assert f.read() == 'partial output\n'
+
+    store.finish_run(live_id, 'success', summary='done')
+    assert {run['run_id']: run for run in store.list_runs()}[live_id]['file'].endswith('.gz')
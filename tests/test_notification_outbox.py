@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from claude_remote.notification_dispatcher import NotificationDispatcher
+from claude_remote.outbox import Outbox
+
+
+class _Webhook(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.received.append(body['text'])
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_webhook(port):
+    server = ThreadingHTTPServer(('127.0.0.1', port), _Webhook)
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_dispatcher(port, outbox_path):
+    return NotificationDispatcher(
+        f'http://127.0.0.1:{port}/', max_retries=0, rate=100, burst=100, outbox_path=outbox_path
+    )
+
+
+def test_outbox_keeps_notifications_while_offline_and_flushes_in_order(tmp_path):
+    """Notifications sent while the webhook is down are delivered in order after a restart"""
+    port = free_port()
+    outbox_path = tmp_path / 'outbox.jsonl'
+
+    offline = make_dispatcher(port, outbox_path)
+    for i in range(3):
+        assert offline.submit({'text': f'message {i}'})
+    offline.close(timeout=1)
+    assert [r['message']['text'] for r in Outbox.open(outbox_path).load()] == [
+        'message 0', 'message 1', 'message 2'
+    ]
+
+    server = start_webhook(port)
+    try:
+        online = make_dispatcher(port, outbox_path)
+        online.submit({'text': 'message 3'})
+        assert online.flush(timeout=10)
+        online.close(timeout=1)
+    finally:
+        server.shutdown()
+
+    assert server.received == ['message 0', 'message 1', 'message 2', 'message 3']
+    assert Outbox.open(outbox_path).load() == []
+
+
+def test_outbox_drops_start_of_run_that_finished_offline(tmp_path):
+    """A start message followed by the run's completion is compacted away on restart"""
+    port = free_port()
+    outbox_path = tmp_path / 'outbox.jsonl'
+
+    offline = make_dispatcher(port, outbox_path)
+    offline.submit({'text': 'started'}, kind='start', key='project_a')
+    offline.close(timeout=1)
+    # 前回の終了後に完了した実行（開始通知は送れていない）
+    offline = make_dispatcher(port, outbox_path)
+    offline.submit({'text': 'completed'}, kind='complete', key='project_a')
+    offline.close(timeout=1)
+
+    server = start_webhook(port)
+    try:
+        online = make_dispatcher(port, outbox_path)
+        assert online.flush(timeout=10)
+        online.close(timeout=1)
+    finally:
+        server.shutdown()
+
+    assert server.received == ['completed']
+
+
+def test_submit_leaves_outbox_writes_to_the_dispatcher_thread(tmp_path, monkeypatch):
+    """submit does not fsync on the caller's thread; notifications are persisted before they are sent"""
+    port = free_port()
+    outbox_path = tmp_path / 'outbox.jsonl'
+    writers = []
+    append = Outbox.append
+
+    def recording_append(self, records):
+        if records:
+            writers.append(threading.current_thread().name)
+        append(self, records)
+
+    monkeypatch.setattr(Outbox, 'append', recording_append)
+    server = start_webhook(port)
+    try:
+        dispatcher = make_dispatcher(port, outbox_path)
+        for i in range(3):
+            dispatcher.submit({'text': f'message {i}'})
+        assert dispatcher.flush(timeout=10)
+        dispatcher.close(timeout=1)
+    finally:
+        server.shutdown()
+
+    assert writers and set(writers) == {'slack-dispatcher'}
+    assert server.received == ['message 0', 'message 1', 'message 2']
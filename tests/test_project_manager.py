@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import threading
+
+from claude_remote import archive
+from claude_remote.project_manager import ProjectManager
+
+
+def test_lookup_during_archive_waits_and_restores(tmp_path, monkeypatch):
+    """A note looked up while its project is being archived gets the restored project, not a deleted one"""
+    manager = ProjectManager(tmp_path / 'projects')
+    note = tmp_path / 'note.md'
+    note.write_text('build it\n')
+    project_path = manager.create_project(note, 'build it\n')
+    (project_path / 'src' / 'main.py').write_text('print(1)\n')
+
+    packing = threading.Event()
+    resume = threading.Event()
+    pack = archive.pack
+
+    def slow_pack(*args, **kwargs):
+        packing.set()
+        resume.wait(5)
+        return pack(*args, **kwargs)
+
+    monkeypatch.setattr(archive, 'pack', slow_pack)
+    archiver = threading.Thread(target=manager.archive_project, args=(project_path,))
+    archiver.start()
+    assert packing.wait(5)
+
+    result = {}
+    lookup = threading.Thread(target=lambda: result.update(path=manager.get_project_by_source(note, 'build it\n')))
+    lookup.start()
+    lookup.join(0.2)
+    assert lookup.is_alive()
+
+    resume.set()
+    archiver.join(5)
+    lookup.join(5)
+    assert result['path'] == project_path
+    assert (project_path / 'src' / 'main.py').read_text() == 'print(1)\n'
+
+
+def test_failed_archive_keeps_project_active(tmp_path, monkeypatch):
+    manager = ProjectManager(tmp_path / 'projects')
+    note = tmp_path / 'note.md'
+    project_path = manager.create_project(note, 'x')
+
+    def broken_pack(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(archive, 'pack', broken_pack)
+    report = manager.archive_idle_projects(idle_days=0)
+    assert report.skipped == [(project_path.name, 'disk full')]
+    assert manager.get_project_by_source(note) == project_path
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+from claude_remote.prompt_compactor import compact_prompt
+
+NOTE = """---
+tags: [todo]
+---
+# Web app
+<!-- claude-remote: no-cache -->
+Build a todo app ![[mockup.png]]
+
+---
+## Claude からの質問 (2026-10-01 10:00:00)
+
+1. Which framework should I use?
+
+*上記の質問に回答してファイルを更新してください*
+
+---
+## Claude からの質問 (2026-10-02 10:00:00)
+
+1. Which framework should I use?
+FastAPI
+2. What database?
+
+*上記の質問に回答してファイルを更新してください*
+
+Add login as well
+
+---
+## Claude からの質問 (2026-10-03 10:00:00)
+
+1. Which login method?
+
+*上記の質問に回答してファイルを更新してください*
+"""
+
+
+def test_compact_prompt_condenses_question_blocks_and_strips_metadata():
+    """Answered blocks keep only questions and answers, stale unanswered blocks are dropped"""
+    compacted = compact_prompt(NOTE)
+    assert compacted.text == (
+        "# Web app\n\nBuild a todo app\n\n"
+        "## 以前の質問と回答\n\n- 質問: Which framework should I use?\n  FastAPI\n- 質問: What database?\n"
+        "  Add login as well\n\n"
+        "## 未回答の質問\n\n- 質問: Which login method?"
+    )
+    assert set(compacted.removed) == {'frontmatter', 'comments', 'embeds', 'questions'}
+    assert compacted.compacted_tokens < compacted.original_tokens
+
+    assert compact_prompt(NOTE, rules=[]).text == NOTE.strip()
+
+
+def test_compact_prompt_keeps_answers_written_below_the_footer():
+    """Text after a block's footer is that block's answer, so the block is kept as answered"""
+    note = (
+        "# Calculator\n\nBuild a calculator\n\n"
+        "---\n## Claude からの質問 (2026-10-01 10:00:00)\n\n1. Which operations?\n2. GUI or CLI?\n\n"
+        "*上記の質問に回答してファイルを更新してください*\n\n四則演算だけ、CLIで\n\n"
+        "---\n## Claude からの質問 (2026-10-02 10:00:00)\n\n1. Which Python version?\n\n"
+        "*上記の質問に回答してファイルを更新してください*\n\n3.12\n"
+    )
+    assert compact_prompt(note).text == (
+        "# Calculator\n\nBuild a calculator\n\n"
+        "## 以前の質問と回答\n\n- 質問: Which operations?\n- 質問: GUI or CLI?\n  四則演算だけ、CLIで\n\n"
+        "## 以前の質問と回答\n\n- 質問: Which Python version?\n  3.12"
+    )
+
+
+def test_compact_prompt_leaves_code_blocks_untouched():
+    """Comments, embeds and whitespace inside fenced or indented code are kept as written"""
+    fenced = "```python\nimport os\n\n\ndef f():\n    HTML = '<!-- keep -->'\nline = 'a'  \n```"
+    indented = "    x = '![[not an embed]]'  \n    y = 1"
+    note = f"Fix this <!-- note to self -->\n\n{fenced}\n\nAnd this ![[diagram.png]]\n\n{indented}\n"
+    assert compact_prompt(note).text == f"Fix this\n\n{fenced}\n\nAnd this\n\n{indented}"
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import io
+import sys
+import time
+
+import pytest
+
+from claude_remote.question_detector import QuestionDetector, detect_questions, iter_lines
+
+# Sample Claude response with questions
+SAMPLE_LOGS = """
+I'd be happy to help you create a Python calculator! However, I need some clarification to make sure I build exactly what you need:
+
+1. What specific arithmetic operations should it support? (addition, subtraction, multiplication, division, or more advanced operations like exponents, square roots?)
+
+2. Should this be a command-line interface or a GUI application?
+
+3. Do you need error handling for invalid inputs?
+
+Let me know your preferences and I'll create the calculator accordingly.
+"""
+
+
+def build_synthetic_log(size_bytes: int) -> str:
+    """Build a large log made mostly of tool output with occasional questions"""
+    filler = "Wrote 42 lines to src/calculator/operations.py (build step ok)\n"
+    chunk = filler * 200 + SAMPLE_LOGS
+    repeat = max(1, size_bytes // len(chunk))
+    return chunk * repeat
+
+
+def test_question_detection():
+    """Test the question detection logic"""
+    questions = detect_questions(iter_lines(SAMPLE_LOGS))
+
+    print(f"Detected {len(questions)} questions:")
+    for i, q in enumerate(questions, 1):
+        print(f"{i}. {q}")
+
+    assert len(questions) == 3
+    assert any("command-line interface or a GUI application?" in q for q in questions)
+    assert any("error handling for invalid inputs?" in q for q in questions)
+
+
+def test_question_detection_dedup_is_normalized():
+    """Whitespace and case variations are treated as the same question"""
+    detector = QuestionDetector()
+    detector.feed_text("Which database should I use?\n")
+    assert detector.feed_text("  which   database should I use ? \n") == []
+    assert len(detector.questions) == 1
+
+
+def test_question_detection_cap():
+    """No more than max_questions are collected"""
+    log = build_synthetic_log(200_000)
+    questions = detect_questions(io.StringIO(log), max_questions=3)
+    assert len(questions) == 3
+
+
+@pytest.mark.slow
+def test_question_detection_large_log():
+    """A 10MB log is scanned in a single pass and repeated questions collapse"""
+    elapsed, questions = benchmark_question_detection(10)
+    assert len(questions) == len(detect_questions(iter_lines(SAMPLE_LOGS), max_questions=sys.maxsize))
+    assert elapsed < 10
+
+
+def benchmark_question_detection(size_mb: int = 10):
+    """Time detection over a synthetic log of the given size"""
+    log = build_synthetic_log(size_mb * 1024 * 1024)
+    start = time.perf_counter()
+    questions = detect_questions(iter_lines(log), max_questions=sys.maxsize)
+    elapsed = time.perf_counter() - start
+    print(f"{size_mb}MB: {elapsed:.3f}s ({size_mb / elapsed:.1f} MB/s), {len(questions)} unique questions")
+    return elapsed, questions
+
+
+if __name__ == "__main__":
+    test_question_detection()
+    for size in (1, 10):
+        benchmark_question_detection(size)
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+
+from claude_remote.result_cache import ResultCache
+
+
+def test_caches_sharing_a_file_keep_each_others_entries(tmp_path):
+    """Worker processes sharing the cache file merge their saves instead of overwriting each other"""
+    cache_file = tmp_path / 'result_cache.json'
+    first, second = ResultCache(cache_file), ResultCache(cache_file)
+    workspace = Path(tmp_path)
+
+    first.put(first.make_key('note a', workspace, 'state'), 'did a', 'a')
+    second.put(second.make_key('note b', workspace, 'state'), 'did b', 'b')
+
+    assert first.get(first.make_key('note b', workspace, 'state'))['summary'] == 'did b'
+    assert len(ResultCache(cache_file).entries) == 2
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+from claude_remote.claude_executor import ClaudeExecutor
+from claude_remote.task_splitter import apply_statuses, split_tasks
+
+NOTE = """<!-- claude-remote: parallel -->
+Use Python 3.11.
+
+- [ ] Fix typos in README
+- [ ] Write a CSV loader
+  - take column names from the first row
+- [x] Add a license
+"""
+
+
+def test_split_tasks_uses_top_level_checkboxes_and_shares_context():
+    """Unchecked top-level items become tasks; other text is passed to every task"""
+    plan = split_tasks(NOTE)
+    assert [task.title for task in plan.tasks] == ['Fix typos in README', 'Write a CSV loader']
+    assert plan.context == 'Use Python 3.11.'
+    assert 'take column names from the first row' in plan.tasks[1].body
+    assert plan.prompt(plan.tasks[0]).startswith('Use Python 3.11.')
+    assert plan.tasks[0].workspace != plan.tasks[1].workspace
+
+    assert split_tasks(NOTE.replace('claude-remote: parallel', '')) is None
+    assert split_tasks(NOTE, max_tasks=1) is None
+
+
+def test_split_tasks_falls_back_to_headings_and_writes_back_statuses():
+    """Heading sections are split when there are no checkboxes, and finished ones are skipped next time"""
+    note = "# Chores\nclaude-remote: parallel\n\n## Backup script\nsave ~/notes\n\n## Blog draft\nabout caching\n"
+    plan = split_tasks(note)
+    assert [task.title for task in plan.tasks] == ['Backup script', 'Blog draft']
+    assert plan.context == '# Chores'
+
+    updated = apply_statuses(note, [
+        {'task': plan.tasks[0], 'success': True, 'message': 'done'},
+        {'task': plan.tasks[1], 'success': False, 'message': 'Exit code: 1'},
+    ])
+    assert '## Backup script ✅' in updated
+    assert '- ❌ Blog draft: Exit code: 1' in updated
+    # 完了したタスクと結果の一覧は次回のタスクにならない
+    assert split_tasks(updated) is None
+
+
+def test_merged_outcomes_report_token_limit_only_when_every_failure_hit_it():
+    """A split run is retried as a token-limit error only if all failed tasks ran out of tokens"""
+    plan = split_tasks(NOTE)
+    done = {'task': plan.tasks[0], 'success': True, 'message': 'ok', 'result': {'success': True}}
+    limited = {'task': plan.tasks[1], 'success': False, 'message': 'limit',
+               'result': {'success': False, 'error': 'token_limit', 'exit_code': 129}}
+    crashed = dict(limited, result={'success': False, 'error': 'Exit code: 1', 'exit_code': 1})
+
+    merged = ClaudeExecutor._merge_task_outcomes([done, limited])
+    assert (merged['success'], merged['error'], merged['exit_code']) == (False, 'token_limit', 129)
+    assert ClaudeExecutor._merge_task_outcomes([done, crashed])['error'] == '1/2 tasks failed'
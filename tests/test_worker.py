@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import asyncio
+
+import pytest
+
+from claude_remote.worker import SlotPool
+
+
+def test_slot_pool_resize_waits_for_running_slots():
+    async def scenario():
+        pool = SlotPool(2)
+        assert pool.try_acquire() and pool.try_acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+
+        pool.resize(1)
+        # 減らした分は待っているタスクに渡さず返却で減らす
+        pool.release()
+        await asyncio.sleep(0)
+        assert not waiter.done() and pool.in_use == 1
+
+        pool.resize(2)
+        await asyncio.sleep(0)
+        assert waiter.done() and pool.in_use == 2
+
+    asyncio.run(scenario())
+
+
+def test_slot_pool_waiter_cancelled_after_release_popped_it():
+    async def scenario():
+        pool = SlotPool(1)
+        assert pool.try_acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+
+        # 取り消された待機を、タスクが戻る前に release が取り出す
+        waiter.cancel()
+        pool.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert pool.in_use == 0 and not pool._waiters
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import os
+
+from claude_remote.workspace_manifest import WorkspaceManifest
+
+
+def test_refresh_reports_changes_and_skips_ignored_and_unchanged_files(tmp_path):
+    """Only files whose size or mtime changed are re-read, and ignored directories are not walked"""
+    src = tmp_path / 'src'
+    (src / 'node_modules' / 'left-pad').mkdir(parents=True)
+    (src / 'node_modules' / 'left-pad' / 'index.js').write_text('module.exports = 1\n')
+    (src / 'keep.txt').write_text('unchanged\n')
+    (src / 'main.py').write_text('print("hi")\n')
+    (src / 'old.txt').write_text('remove me\n')
+    manifest = WorkspaceManifest(src, tmp_path / 'manifest.json', ignore=['node_modules', 'build/*'])
+
+    initial = manifest.refresh()
+    assert initial.added == ['keep.txt', 'main.py', 'old.txt']
+
+    # 記録から十分時間が経ったことにする（statが同じファイルは読まない）
+    manifest.recorded_at_ns += 10_000_000_000
+    (src / 'main.py').write_text('print("hello")\n')
+    (src / 'old.txt').unlink()
+    (src / 'pkg').mkdir()
+    (src / 'pkg' / 'util.py').write_text('x = 1\n')
+    (src / 'build').mkdir()
+    (src / 'build' / 'out.bin').write_bytes(b'\0' * 100)
+    (src / 'node_modules' / 'left-pad' / 'index.js').write_text('changed\n')
+
+    changes = manifest.refresh()
+    assert (changes.added, changes.modified, changes.deleted) == (['pkg/util.py'], ['main.py'], ['old.txt'])
+    assert manifest.hashed == 2
+    assert changes.bytes_added == len('x = 1\n') + 3
+    assert changes.bytes_removed == len('remove me\n')
+    assert changes.describe().startswith('+1 ~1 -1 files')
+
+    # 内容が同じならmtimeだけ変わっても変更として扱わない
+    manifest = WorkspaceManifest(src, tmp_path / 'manifest.json', ignore=['node_modules', 'build/*'])
+    manifest.recorded_at_ns += 10_000_000_000
+    stat = (src / 'main.py').stat()
+    os.utime(src / 'main.py', ns=(stat.st_atime_ns, stat.st_mtime_ns - 5_000_000_000))
+    fingerprint = manifest.fingerprint()
+    assert manifest.refresh().empty
+    assert manifest.hashed == 1
+    assert manifest.fingerprint() == fingerprint